@@ -0,0 +1,265 @@
+"""
+Headless batch histogram stretching
+Runs grayscale stretch, per-channel color stretch or channel separation over
+many files in parallel and writes the results to a mirrored directory tree.
+
+usage example:
+    python batch_stretch.py photos/ "scans/**/*.tif" -o out/ --mode color --workers 4
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PIL import Image
+
+from helper_functions import compute_histogram, load_image, stretch_channels
+
+
+MODES = ('gray', 'color', 'channels')
+
+# Extensions picked up when a directory is given as input
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ppm', '.pgm', '.tif', '.tiff', '.npy'}
+
+CHANNEL_NAMES = ('red', 'green', 'blue')
+
+
+def _glob_root(pattern):
+    """Deepest directory of a glob pattern that contains no wildcards"""
+    parts = []
+    for part in os.path.normpath(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    root = os.sep.join(parts) or '.'
+    return root if os.path.isdir(root) else os.path.dirname(root) or '.'
+
+
+def iter_inputs(specs):
+    """
+    Expand input directories and glob patterns into files
+
+    Args:
+        specs: List of directories, files or glob patterns
+
+    Yields:
+        tuple: (file_path, root) where root is the directory the file's
+        output path is made relative to
+    """
+    seen = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            root = spec
+            candidates = (os.path.join(dirpath, name)
+                          for dirpath, _, names in sorted(os.walk(spec))
+                          for name in sorted(names))
+            candidates = (path for path in candidates
+                          if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS)
+        elif glob.has_magic(spec):
+            root = _glob_root(spec)
+            candidates = (path for path in sorted(glob.glob(spec, recursive=True))
+                          if os.path.isfile(path))
+        else:
+            root = os.path.dirname(spec) or '.'
+            candidates = [spec]
+
+        for path in candidates:
+            key = os.path.abspath(path)
+            if key not in seen:
+                seen.add(key)
+                yield path, root
+
+
+def output_base(input_path, root, output_dir):
+    """
+    Output path (without extension) mirroring input_path's position under root
+
+    The source extension is part of the name (photo.png -> photo_png), so
+    files that differ only in their extension get separate outputs.
+    """
+    stem, ext = os.path.splitext(os.path.relpath(input_path, root))
+    return os.path.join(output_dir, f"{stem}_{ext[1:]}" if ext else stem)
+
+
+def _save_array(img_array, base, ext):
+    """Save an array next to base, keeping the source format where Pillow can write it"""
+    if ext == '.npy':
+        path = base + ext
+        np.save(path, img_array)
+        return path
+    path = base + (ext if ext in {'.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.pgm', '.tif', '.tiff'} else '.png')
+    # PPM holds color and PGM grayscale only; use whichever matches the array
+    if ext in {'.ppm', '.pgm'}:
+        path = base + ('.pgm' if img_array.ndim == 2 else '.ppm')
+    Image.fromarray(img_array).save(path)
+    return path
+
+
+def _channel_histograms(img_array):
+    """Histogram of each channel, keyed by channel name"""
+    if img_array.ndim == 2:
+        return {'gray': compute_histogram(img_array)}
+    return {name: compute_histogram(img_array[:, :, c]) for c, name in enumerate(CHANNEL_NAMES)}
+
+
+def process_file(input_path, base, mode, histograms=False):
+    """
+    Process one file (runs inside a worker process)
+
+    Args:
+        input_path: Source image
+        base: Output path without extension
+        mode: 'gray', 'color' or 'channels'
+        histograms: Also write the original/stretched histograms to <base>_hist.json
+
+    Returns:
+        tuple: (input_path, list of written paths, megapixels, seconds, error message or None)
+    """
+    start = time.perf_counter()
+    ext = os.path.splitext(input_path)[1].lower()
+    img_array = load_image(input_path, mode='L' if mode == 'gray' else 'RGB', as_array=True)
+    if img_array is None:
+        return input_path, [], 0.0, time.perf_counter() - start, 'could not read image'
+    if img_array.dtype != np.uint8:
+        return input_path, [], 0.0, time.perf_counter() - start, 'only 8-bit images are supported'
+
+    os.makedirs(os.path.dirname(base) or '.', exist_ok=True)
+    megapixels = img_array.shape[0] * img_array.shape[1] / 1e6
+
+    if mode == 'channels':
+        result = None
+        outputs = [_save_array(np.ascontiguousarray(img_array[:, :, c]), f"{base}_{name}", ext)
+                   for c, name in enumerate(CHANNEL_NAMES)]
+    else:
+        result = stretch_channels(img_array)
+        outputs = [_save_array(result, f"{base}_stretched", ext)]
+
+    if histograms:
+        hist = {'original': _channel_histograms(img_array)}
+        if result is not None:
+            hist['stretched'] = _channel_histograms(result)
+        hist_path = f"{base}_hist.json"
+        with open(hist_path, 'w') as f:
+            json.dump(hist, f)
+        outputs.append(hist_path)
+
+    return input_path, outputs, megapixels, time.perf_counter() - start, None
+
+
+def collect_result(future, input_path):
+    """
+    Result tuple of a process_file future, with a failure of the worker itself
+    (write error, full disk, a worker killed for running out of memory)
+    reported as the file's error instead of raised
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        return input_path, [], 0.0, 0.0, f"{type(e).__name__}: {e}"
+
+
+def run_batch(specs, output_dir, mode='color', workers=None, prefetch=2, verbose=True,
+              histograms=False):
+    """
+    Process all inputs across a process pool
+
+    At most workers * prefetch files are submitted (and therefore decoded)
+    ahead of the results being consumed, so memory stays bounded however
+    many files match.
+
+    Args:
+        specs: Directories, files or glob patterns
+        output_dir: Root of the mirrored output tree
+        mode: 'gray', 'color' or 'channels'
+        workers: Number of worker processes (default: CPU count)
+        prefetch: In-flight files per worker
+        verbose: Print a line per file
+        histograms: Also write a histogram JSON file per input
+
+    Returns:
+        dict: Summary with file/failure counts, megapixels, seconds and throughput
+    """
+    workers = workers or os.cpu_count() or 1
+    window = max(1, workers * prefetch)
+    summary = {'files': 0, 'failed': 0, 'megapixels': 0.0}
+    start = time.perf_counter()
+
+    def report(future, input_path):
+        input_path, outputs, megapixels, seconds, error = collect_result(future, input_path)
+        if error:
+            summary['failed'] += 1
+            print(f"FAILED {input_path}: {error}", file=sys.stderr)
+            return
+        summary['files'] += 1
+        summary['megapixels'] += megapixels
+        if verbose:
+            print(f"{seconds * 1000:8.1f} ms  {megapixels:7.2f} MP  {input_path} -> {', '.join(outputs)}")
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    used_bases = set()
+    try:
+        pending = {}
+        for input_path, root in iter_inputs(specs):
+            # Files from different inputs can still mirror to the same place (a/x.png and b/x.png
+            # given as separate directories); later ones get a numbered name instead of overwriting
+            base = candidate = output_base(input_path, root, output_dir)
+            number = 1
+            while os.path.normcase(os.path.abspath(base)) in used_bases:
+                number += 1
+                base = f"{candidate}_{number}"
+            used_bases.add(os.path.normcase(os.path.abspath(base)))
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report(future, pending.pop(future))
+            job = (process_file, input_path, base, mode, histograms)
+            try:
+                future = pool.submit(*job)
+            except BrokenProcessPool:
+                # A worker died; its files are reported as failed, the rest go to a fresh pool
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers)
+                future = pool.submit(*job)
+            pending[future] = input_path
+        for future, input_path in pending.items():
+            report(future, input_path)
+    finally:
+        pool.shutdown()
+
+    summary['seconds'] = time.perf_counter() - start
+    elapsed = summary['seconds'] or 1e-9
+    summary['files_per_second'] = summary['files'] / elapsed
+    summary['megapixels_per_second'] = summary['megapixels'] / elapsed
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch histogram stretching / channel separation')
+    parser.add_argument('inputs', nargs='+', help='Input directories, files or glob patterns')
+    parser.add_argument('-o', '--output', required=True, help='Output directory (mirrors the input tree)')
+    parser.add_argument('--mode', choices=MODES, default='color',
+                        help='gray: grayscale stretch, color: per-channel stretch, channels: split R/G/B')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--prefetch', type=int, default=2, help='Files in flight per worker')
+    parser.add_argument('--histograms', action='store_true', help='Also write <name>_hist.json files')
+    parser.add_argument('--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.inputs, args.output, mode=args.mode, workers=args.workers,
+                        prefetch=args.prefetch, verbose=not args.quiet, histograms=args.histograms)
+
+    print(f"\nProcessed {summary['files']} files ({summary['failed']} failed) "
+          f"in {summary['seconds']:.2f} s")
+    print(f"Throughput: {summary['files_per_second']:.1f} files/s, "
+          f"{summary['megapixels_per_second']:.1f} MP/s")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
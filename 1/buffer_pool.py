@@ -0,0 +1,101 @@
+"""Per-process pool of reusable image-sized numpy buffers"""
+
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# Maximum number of idle buffers kept for each (shape, dtype) pair
+MAX_BUFFERS_PER_SHAPE = 4
+
+# Upper bound on the total bytes held by idle buffers
+MAX_POOL_BYTES = 256 * 1024 * 1024
+
+_lock = threading.Lock()
+_free_buffers = {}
+_stats = {'hits': 0, 'misses': 0, 'released': 0, 'dropped': 0}
+
+
+def _pool_bytes():
+    """Total size in bytes of the idle buffers currently held by the pool"""
+    return sum(buf.nbytes for buffers in _free_buffers.values() for buf in buffers)
+
+
+def acquire_buffer(shape, dtype=np.uint8):
+    """
+    Get an uninitialized buffer from the pool, allocating one if none is free
+
+    Args:
+        shape: Tuple with the required array shape
+        dtype: numpy dtype of the buffer
+
+    Returns:
+        numpy array: Buffer with the requested shape and dtype (contents undefined)
+    """
+    key = (tuple(shape), np.dtype(dtype).str)
+    with _lock:
+        buffers = _free_buffers.get(key)
+        if buffers:
+            _stats['hits'] += 1
+            return buffers.pop()
+        _stats['misses'] += 1
+    return np.empty(shape, dtype=dtype)
+
+
+def release_buffer(buffer):
+    """
+    Return a buffer obtained from acquire_buffer to the pool
+
+    The caller must not keep any reference (or view) to the buffer afterwards.
+
+    Args:
+        buffer: numpy array previously returned by acquire_buffer
+    """
+    key = (buffer.shape, buffer.dtype.str)
+    with _lock:
+        buffers = _free_buffers.setdefault(key, [])
+        if len(buffers) >= MAX_BUFFERS_PER_SHAPE or _pool_bytes() + buffer.nbytes > MAX_POOL_BYTES:
+            _stats['dropped'] += 1
+            return
+        buffers.append(buffer)
+        _stats['released'] += 1
+
+
+@contextmanager
+def pooled_buffer(shape, dtype=np.uint8):
+    """
+    Context manager that acquires a buffer and releases it on exit
+
+    Args:
+        shape: Tuple with the required array shape
+        dtype: numpy dtype of the buffer
+
+    Yields:
+        numpy array: Pooled buffer valid until the block exits
+    """
+    buffer = acquire_buffer(shape, dtype)
+    try:
+        yield buffer
+    finally:
+        release_buffer(buffer)
+
+
+def pool_stats():
+    """
+    Report pool usage counters
+
+    Returns:
+        dict: Hit/miss/release counters plus idle buffer count and bytes
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['idle_buffers'] = sum(len(buffers) for buffers in _free_buffers.values())
+        stats['idle_bytes'] = _pool_bytes()
+    return stats
+
+
+def clear_pool():
+    """Drop all idle buffers held by the pool"""
+    with _lock:
+        _free_buffers.clear()
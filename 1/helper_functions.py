@@ -1,8 +1,16 @@
 """Helper functions for image processing exercises"""
 
+import hashlib
+
 import numpy as np
 from PIL import Image
 
+from mapped_io import map_image, array_mode, open_mapped_output
+
+
+# Number of elements processed per block by the out= code paths
+BLOCK_ELEMENTS = 1 << 16
+
 
 def compute_histogram(channel_data):
     """
@@ -18,17 +26,23 @@ def compute_histogram(channel_data):
     if isinstance(channel_data, Image.Image):
         channel_data = np.array(channel_data)
     
+    # 8-bit data: count values directly (ravel only copies non-contiguous views)
+    if channel_data.dtype == np.uint8:
+        return np.bincount(channel_data.ravel(), minlength=256).tolist()
+    
     # Use numpy for fast histogram computation
     histogram, _ = np.histogram(channel_data.flatten(), bins=256, range=(0, 256))
     return histogram.tolist()
 
 
-def histogram_stretching(channel_data):
+def histogram_stretching(channel_data, out=None):
     """
     Perform histogram stretching on a single channel
     
     Args:
         channel_data: numpy array of pixel values
+        out: Optional uint8 array of the same shape to write the result into.
+             When given, no full-size temporaries are allocated for uint8 input.
         
     Returns:
         numpy array: Stretched channel data with values in range 0-255
@@ -39,11 +53,47 @@ def histogram_stretching(channel_data):
     
     # Avoid division by zero
     if max_val == min_val:
-        return channel_data
+        if out is None:
+            return channel_data
+        np.copyto(out, channel_data, casting='unsafe')
+        return out
+    
+    if out is None:
+        # Apply histogram stretching formula: new_val = (old_val - min) * 255 / (max - min)
+        stretched = ((channel_data - min_val) * 255.0 / (max_val - min_val)).astype(np.uint8)
+        return stretched
+    
+    # Work in row blocks so index/float temporaries stay small
+    rows_per_block = max(1, BLOCK_ELEMENTS // max(1, channel_data[0].size))
+    
+    if channel_data.dtype == np.uint8:
+        # Same formula evaluated once per possible value, then applied as a lookup table
+        lut = stretch_lut(min_val, max_val)
+        for start in range(0, channel_data.shape[0], rows_per_block):
+            stop = start + rows_per_block
+            np.take(lut, channel_data[start:stop], out=out[start:stop], mode='clip')
+        return out
+    
+    for start in range(0, channel_data.shape[0], rows_per_block):
+        stop = start + rows_per_block
+        out[start:stop] = (channel_data[start:stop] - min_val) * 255.0 / (max_val - min_val)
+    return out
+
+
+def stretch_lut(min_val, max_val):
+    """
+    Build the 256-entry lookup table equivalent to histogram_stretching for uint8 data
     
-    # Apply histogram stretching formula: new_val = (old_val - min) * 255 / (max - min)
-    stretched = ((channel_data - min_val) * 255.0 / (max_val - min_val)).astype(np.uint8)
-    return stretched
+    Args:
+        min_val: Minimum pixel value of the channel
+        max_val: Maximum pixel value of the channel (must differ from min_val)
+        
+    Returns:
+        numpy array: uint8 table mapping each input value to its stretched value
+    """
+    values = np.arange(256, dtype=np.float64)
+    lut = np.clip((values - int(min_val)) * 255.0 / (int(max_val) - int(min_val)), 0, 255)
+    return lut.astype(np.uint8)
 
 
 def stretch_histogram(image):
@@ -66,25 +116,99 @@ def stretch_histogram(image):
     return Image.fromarray(stretched_array, 'L')
 
 
-def load_image(image_path, mode=None):
+def stretch_channels(img_array, out=None):
+    """
+    Perform histogram stretching on each channel of a gray or color image separately
+    
+    Args:
+        img_array: numpy array of shape (H, W) or (H, W, C)
+        out: Optional uint8 array of the same shape to write the result into
+        
+    Returns:
+        numpy array: Stretched image data
+    """
+    if out is None:
+        out = np.empty(img_array.shape, dtype=np.uint8)
+    if img_array.ndim == 2:
+        return histogram_stretching(img_array, out=out)
+    for c in range(img_array.shape[2]):
+        histogram_stretching(img_array[:, :, c], out=out[:, :, c])
+    return out
+
+
+def stretch_image_file(input_path, output_path):
+    """
+    Stretch an uncompressed image file into a memory-mapped output file
+    
+    Both files are accessed through memory maps, so frames much larger than
+    RAM can be processed with little resident memory.
+    
+    Args:
+        input_path: Uncompressed source image (NPY, PPM/PGM, BMP or TIFF)
+        output_path: Destination ending in .npy, .ppm or .pgm
+        
+    Returns:
+        bool: True on success, False if the input could not be mapped
+    """
+    src = map_image(input_path)
+    if src is None:
+        print(f"Error: '{input_path}' is not an uncompressed image that can be mapped")
+        return False
+    
+    dst = open_mapped_output(output_path, src.shape)
+    stretch_channels(src, out=dst)
+    dst.flush()
+    del dst
+    return True
+
+
+def load_image(image_path, mode=None, as_array=False):
     """
     Load an image file with error handling
     
     Args:
         image_path: Path to the image file
         mode: Optional conversion mode ('RGB', 'L', etc.)
+        as_array: Return a numpy array instead of a PIL Image. Uncompressed
+                  files (NPY, PPM/PGM, BMP, TIFF) already in the requested
+                  mode are returned as read-only memory-mapped views.
         
     Returns:
-        PIL Image object or None if error
+        PIL Image object (or numpy array if as_array) or None if error
     """
     try:
+        if as_array:
+            mapped = map_image(image_path)
+            if mapped is not None:
+                if mode is None or array_mode(mapped) == mode:
+                    return mapped
+                return np.asarray(Image.fromarray(np.asarray(mapped)).convert(mode))
+        
         img = Image.open(image_path)
         if mode:
             img = img.convert(mode)
-        return img
+        return np.asarray(img) if as_array else img
     except FileNotFoundError:
         print(f"Error: File '{image_path}' not found")
         return None
     except Exception as e:
         print(f"Error loading image: {e}")
         return None
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents, read in chunks
+    
+    Args:
+        path: File to hash
+        chunk_size: Bytes read at a time
+        
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,219 @@
+"""
+Optional JIT-compiled pixel kernels
+
+Loop-shaped kernels compiled with Numba when it is installed (and not
+disabled with JIT_KERNELS=0):
+
+    channel_histograms  256-bin histogram of every channel in one pass
+    apply_tables        per-channel lookup tables in one pass
+    gradient            ex2_01.create_gradient_image without the Python loop
+    color_spaces        RGB -> HSV/HSL/YCrCb per pixel (color_models.convert_color_spaces)
+
+pixel_backends registers the first two as its 'numba' backend, so autotuning
+only uses them where they beat OpenCV/NumPy/Pillow on this machine.
+gradient_image and convert_color_spaces fall back to NumPy. This module is
+the one place that detects Numba (JIT_AVAILABLE). Compiled code is cached on
+disk; the first call in a fresh environment pays the compilation.
+
+`python jit_kernels.py` benchmarks the compiled kernels against the NumPy
+paths and checks that the outputs are identical.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+JIT_AVAILABLE = numba is not None and os.environ.get('JIT_KERNELS', '1') != '0'
+
+
+def planes(img):
+    """(H, W, C) view of a (H, W) or (H, W, C) image"""
+    return img[:, :, np.newaxis] if img.ndim == 2 else img
+
+
+if JIT_AVAILABLE:
+
+    @numba.njit(cache=True, nogil=True)
+    def channel_histograms(img):
+        """int64 (C, 256) histograms of a uint8 (H, W, C) image (any strides)"""
+        height, width, channels = img.shape
+        # Four partial histograms, so consecutive equal values do not wait on each other's increment
+        part = np.zeros((4, channels, 256), dtype=np.uint32)
+        for y in range(height):
+            row = img[y]
+            for c in range(channels):
+                p0, p1, p2, p3 = part[0, c], part[1, c], part[2, c], part[3, c]
+                plane = row[:, c]
+                x = 0
+                while x + 4 <= width:
+                    p0[plane[x]] += 1
+                    p1[plane[x + 1]] += 1
+                    p2[plane[x + 2]] += 1
+                    p3[plane[x + 3]] += 1
+                    x += 4
+                while x < width:
+                    p0[plane[x]] += 1
+                    x += 1
+        hist = np.zeros((channels, 256), dtype=np.int64)
+        for k in range(4):
+            hist += part[k]
+        return hist
+
+    @numba.njit(cache=True, nogil=True)
+    def apply_tables(img, tables, out):
+        """out[..., c] = tables[c][img[..., c]] for uint8 (H, W, C) arrays and (C, 256) tables"""
+        height, width, channels = img.shape
+        for y in range(height):
+            src, dst = img[y], out[y]
+            if channels == 3:
+                # Interleaved RGB in one sweep over the row
+                t0, t1, t2 = tables[0], tables[1], tables[2]
+                for x in range(width):
+                    dst[x, 0] = t0[src[x, 0]]
+                    dst[x, 1] = t1[src[x, 1]]
+                    dst[x, 2] = t2[src[x, 2]]
+            else:
+                for c in range(channels):
+                    table, s, d = tables[c], src[:, c], dst[:, c]
+                    for x in range(width):
+                        d[x] = table[s[x]]
+        return out
+
+    @numba.njit(cache=True, nogil=True)
+    def gradient(height, width):
+        img = np.empty((height, width), dtype=np.uint8)
+        denominator = max(1, height - 1 + width - 1)
+        for y in range(height):
+            for x in range(width):
+                img[y, x] = int((x + y) * 255 / denominator)
+        return img
+
+    @numba.njit(cache=True, nogil=True)
+    def color_spaces(rgb, hsv, hsl, ycrcb, want_hsv, want_hsl, want_ycrcb):
+        """
+        Per-pixel version of color_models.convert_color_spaces over (N, 3) arrays
+
+        The arithmetic follows the color_models *_manual functions operation by
+        operation, so the results are bit-identical to the NumPy path.
+        """
+        for i in range(rgb.shape[0]):
+            red, green, blue = float(rgb[i, 0]), float(rgb[i, 1]), float(rgb[i, 2])
+            if want_ycrcb:
+                y = 0.299 * red + 0.587 * green + 0.114 * blue
+                ycrcb[i, 0] = y
+                ycrcb[i, 1] = (red - y) * 0.713 + 128
+                ycrcb[i, 2] = (blue - y) * 0.564 + 128
+            if not (want_hsv or want_hsl):
+                continue
+
+            r, g, b = red / 255, green / 255, blue / 255
+            cmax, cmin = max(r, g, b), min(r, g, b)
+            delta = cmax - cmin
+            if delta == 0:
+                h = 0.0
+            elif cmax == r:
+                h = 60 * (((g - b) / delta) % 6)
+            elif cmax == g:
+                h = 60 * (((b - r) / delta) + 2)
+            else:
+                h = 60 * (((r - g) / delta) + 4)
+
+            if want_hsv:
+                hsv[i, 0] = h
+                hsv[i, 1] = 0.0 if cmax == 0 else delta / cmax
+                hsv[i, 2] = cmax
+            if want_hsl:
+                l = (cmax + cmin) / 2
+                hsl[i, 0] = h
+                hsl[i, 1] = 0.0 if delta == 0 else delta / (1 - abs(2 * l - 1))
+                hsl[i, 2] = l
+
+
+def gradient_image(height, width, jit=None):
+    """
+    Diagonal grayscale gradient, identical to ex2_01.create_gradient_image
+
+    Args:
+        height: Image height
+        width: Image width
+        jit: True/False to force the compiled or NumPy path (None = compiled when available)
+
+    Returns:
+        numpy array: uint8 (height, width) image, 0 at (0, 0) and 255 at the far corner
+    """
+    if jit and not JIT_AVAILABLE:
+        raise RuntimeError('Numba is not available (or disabled with JIT_KERNELS=0)')
+    if JIT_AVAILABLE if jit is None else jit:
+        return gradient(height, width)
+    y = np.arange(height, dtype=np.float64)[:, np.newaxis]
+    x = np.arange(width, dtype=np.float64)[np.newaxis, :]
+    return ((x + y) * 255 / max(1, height - 1 + width - 1)).astype(np.uint8)
+
+
+# ============ Benchmark ============
+
+def _best_time(func, repeats):
+    func()  # warm-up (and compilation)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _identical(a, b):
+    if isinstance(a, tuple):
+        return all(np.array_equal(x, y) for x, y in zip(a, b))
+    return np.array_equal(a, b)
+
+
+def benchmark(shape=(2160, 3840), repeats=5, seed=0):
+    """
+    Time the compiled and NumPy versions of each kernel and compare their outputs
+
+    The pixel_backends operations with a 'numba' implementation are compared
+    with their 'numpy' implementation on a color and a grayscale image.
+
+    Returns:
+        dict: kernel -> {'numpy': seconds, 'jit': seconds, 'identical': bool}
+    """
+    import pixel_backends
+
+    rng = np.random.default_rng(seed)
+    color = rng.integers(40, 200, shape + (3,), dtype=np.uint8)
+    cases = {'gradient_image': lambda jit: gradient_image(shape[0], shape[1], jit=jit)}
+    for op in pixel_backends.OPERATIONS:
+        if 'numba' not in pixel_backends.available_backends(op):
+            continue
+        for label, img in (('color', color), ('gray', color[:, :, 0].copy())):
+            args = pixel_backends._benchmark_args(op, img)
+            implementations = pixel_backends._implementations[op]
+            cases[f'{op} ({label})'] = (lambda jit, impls=implementations, args=args:
+                                        impls['numba' if jit else 'numpy'](*args))
+
+    results = {}
+    for name, run in cases.items():
+        results[name] = {'numpy': _best_time(lambda: run(False), repeats),
+                         'jit': _best_time(lambda: run(True), repeats),
+                         'identical': _identical(run(True), run(False))}
+    return results
+
+
+if __name__ == "__main__":
+    if not JIT_AVAILABLE:
+        print('Numba is not installed (or JIT_KERNELS=0): only the NumPy paths are available')
+        sys.exit(0)
+    results = benchmark()
+    for name, entry in results.items():
+        print(f"{name:30s} numpy={entry['numpy'] * 1000:8.2f}ms  jit={entry['jit'] * 1000:8.2f}ms  "
+              f"speedup={entry['numpy'] / entry['jit']:6.2f}x  identical={entry['identical']}")
+    sys.exit(0 if all(entry['identical'] for entry in results.values()) else 1)
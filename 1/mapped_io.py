@@ -0,0 +1,171 @@
+"""Memory-mapped access to uncompressed image files"""
+
+import os
+
+import numpy as np
+from PIL import Image
+
+
+# Pillow raw modes that can be viewed directly: raw mode -> (dtype, channels, reversed channel order)
+MAPPABLE_RAWMODES = {
+    'L': (np.uint8, 1, False),
+    'RGB': (np.uint8, 3, False),
+    'BGR': (np.uint8, 3, True),
+    'I;16': (np.dtype('<u2'), 1, False),
+    'I;16B': (np.dtype('>u2'), 1, False),
+}
+
+# Extensions that open_mapped_output knows how to create
+MAPPED_OUTPUT_EXTENSIONS = {'.npy', '.ppm', '.pgm'}
+
+
+def _tile_layout(tile):
+    """Split a Pillow tile into (codec, extents, offset, rawmode, stride, orientation)"""
+    codec, extents, offset, args = tile
+    if isinstance(args, str):
+        rawmode, stride, orientation = args, 0, 1
+    else:
+        rawmode = args[0]
+        stride = args[1] if len(args) > 1 else 0
+        orientation = args[2] if len(args) > 2 else 1
+    return codec, extents, offset, rawmode, stride, orientation
+
+
+def _map_pillow_image(image_path):
+    """
+    Map an image whose pixel data Pillow would read with the plain 'raw' decoder
+
+    Covers binary PPM/PGM, uncompressed BMP and uncompressed (striped) TIFF.
+
+    Returns:
+        numpy array: Read-only view onto the file, or None if the layout is not mappable
+    """
+    with Image.open(image_path) as img:
+        width, height = img.size
+        tiles = list(img.tile)
+    if not tiles:
+        return None
+
+    codec, _, base_offset, rawmode, stride, orientation = _tile_layout(tiles[0])
+    if codec != 'raw' or rawmode not in MAPPABLE_RAWMODES:
+        return None
+    dtype, channels, reverse_channels = MAPPABLE_RAWMODES[rawmode]
+    dtype = np.dtype(dtype)
+    row_bytes = width * channels * dtype.itemsize
+    stride = stride or row_bytes
+    if stride < row_bytes:
+        return None
+
+    # Striped files are mappable only when every strip follows the previous one
+    for tile in tiles:
+        t_codec, extents, offset, t_rawmode, t_stride, t_orientation = _tile_layout(tile)
+        x0, y0, x1, _ = extents
+        if (t_codec != 'raw' or t_rawmode != rawmode or (t_stride or row_bytes) != stride
+                or t_orientation != orientation or x0 != 0 or x1 != width
+                or offset != base_offset + y0 * stride):
+            return None
+
+    if base_offset + stride * height > os.path.getsize(image_path):
+        return None
+
+    rows = np.memmap(image_path, dtype=np.uint8, mode='r', offset=base_offset,
+                     shape=(height, stride))
+    pixels = rows[:, :row_bytes].view(dtype)
+    if channels > 1:
+        pixels = pixels.reshape(height, width, channels)
+    if orientation < 0:
+        pixels = pixels[::-1]
+    if reverse_channels:
+        pixels = pixels[..., ::-1]
+    return pixels
+
+
+def map_raw_image(image_path, shape, dtype=np.uint8, offset=0):
+    """
+    Map a headerless raw frame
+
+    Args:
+        image_path: Path to the raw file
+        shape: (height, width) or (height, width, channels)
+        dtype: Sample type stored in the file
+        offset: Number of header bytes to skip
+
+    Returns:
+        numpy.memmap: Read-only view onto the file
+    """
+    return np.memmap(image_path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+
+
+def map_image(image_path):
+    """
+    Expose an uncompressed image file as a read-only memory-mapped array
+
+    Supports NPY, binary PPM/PGM, uncompressed BMP and uncompressed TIFF.
+    Nothing is decoded: pages are read from the file only when touched.
+
+    Args:
+        image_path: Path to the image file
+
+    Returns:
+        numpy array: (H, W) or (H, W, 3) read-only view, or None if the file
+        is compressed or has a layout that cannot be viewed directly
+    """
+    if os.path.splitext(image_path)[1].lower() == '.npy':
+        try:
+            return np.load(image_path, mmap_mode='r', allow_pickle=False)
+        except ValueError:
+            return None
+    try:
+        return _map_pillow_image(image_path)
+    except (OSError, ValueError):
+        return None
+
+
+def array_mode(img_array):
+    """
+    Pillow mode name matching an array's layout
+
+    Returns:
+        str: 'L' or 'RGB' for 8-bit gray/color arrays, None otherwise
+    """
+    if img_array.dtype != np.uint8:
+        return None
+    if img_array.ndim == 2:
+        return 'L'
+    if img_array.ndim == 3 and img_array.shape[2] == 3:
+        return 'RGB'
+    return None
+
+
+def open_mapped_output(output_path, shape, dtype=np.uint8):
+    """
+    Create an output file and return a writable memory-mapped array onto its pixels
+
+    Args:
+        output_path: Destination path ending in .npy, .ppm or .pgm
+        shape: (height, width) for gray or (height, width, 3) for color
+        dtype: Sample type (PPM/PGM outputs must be uint8)
+
+    Returns:
+        numpy.memmap: Writable array; call .flush() when done
+    """
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext not in MAPPED_OUTPUT_EXTENSIONS:
+        raise ValueError(f"Unsupported mapped output type '{ext}'")
+
+    if ext == '.npy':
+        return np.lib.format.open_memmap(output_path, mode='w+', dtype=dtype, shape=tuple(shape))
+
+    if np.dtype(dtype) != np.uint8:
+        raise ValueError("PPM/PGM outputs must be uint8")
+    height, width = shape[:2]
+    color = len(shape) == 3
+    if color and shape[2] != 3:
+        raise ValueError("PPM outputs must have 3 channels")
+    if ext == '.pgm' and color:
+        raise ValueError("PGM outputs must be single-channel")
+    header = f"{'P6' if color else 'P5'}\n{width} {height}\n255\n".encode('ascii')
+    with open(output_path, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + width * height * (3 if color else 1))
+    return np.memmap(output_path, dtype=np.uint8, mode='r+', offset=len(header), shape=tuple(shape))
@@ -0,0 +1,665 @@
+"""
+Pixel-operation backends
+Each operation (brighten, normalize, stretch, stretch_histogram, apply_lut,
+histogram, histogram_extrema, to_gray) has NumPy, OpenCV and Pillow
+implementations with identical results: additions saturate at 0/255 (like
+cv2.add, unlike the wrapping np.add of ex2_02), normalize matches
+ex2_05.normalize and stretch matches helper_functions.histogram_stretching.
+When Numba is installed, the table and histogram operations also get a
+'numba' backend built on the compiled kernels of jit_kernels.
+
+A short micro-benchmark (autotune) picks the fastest backend per operation and
+image size on the current machine. Its result is cached on disk so later
+processes start without re-measuring. OpenCV and Numba are optional.
+"""
+
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from helper_functions import BLOCK_ELEMENTS, stretch_lut
+import jit_kernels
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+OPERATIONS = ('brighten', 'normalize', 'stretch', 'stretch_histogram', 'apply_lut', 'histogram',
+              'histogram_extrema', 'to_gray')
+
+# Backends in order of preference when nothing has been measured
+BACKEND_ORDER = ('opencv', 'numba', 'numpy', 'pillow')
+
+# Size buckets: (upper bound in megapixels, bucket name, shape used to benchmark it)
+SIZE_BUCKETS = (
+    (0.5, 'small', (480, 640)),
+    (4.0, 'medium', (1080, 1920)),
+    (float('inf'), 'large', (2160, 3840)),
+)
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'PIXEL_BACKEND_CACHE', os.path.join(tempfile.gettempdir(), 'pixel_backends_tuning.json'))
+
+_implementations = {op: {} for op in OPERATIONS}
+_selection = {}
+
+
+def _register(op, backend):
+    """Decorator adding a function to the implementation table"""
+    def decorator(func):
+        _implementations[op][backend] = func
+        return func
+    return decorator
+
+
+def available_backends(op=None):
+    """
+    Backends that can run an operation in this environment
+
+    Args:
+        op: Operation name, or None for every backend that is installed
+
+    Returns:
+        list: Backend names in preference order
+    """
+    names = _implementations[op] if op else {name for impls in _implementations.values() for name in impls}
+    return [name for name in BACKEND_ORDER if name in names]
+
+
+def size_bucket(shape):
+    """Name of the size bucket an image of this shape falls in"""
+    megapixels = shape[0] * shape[1] / 1e6
+    for limit, name, _ in SIZE_BUCKETS:
+        if megapixels <= limit:
+            return name
+    return SIZE_BUCKETS[-1][1]
+
+
+def select_backend(op, shape):
+    """
+    Backend to use for an operation on an image of the given shape
+
+    Uses the autotuned choice when there is one, otherwise the first available
+    backend in BACKEND_ORDER.
+    """
+    choice = _selection.get(op, {}).get(size_bucket(shape))
+    if choice in _implementations[op]:
+        return choice
+    return available_backends(op)[0]
+
+
+# ============ Lookup tables shared by all backends ============
+
+def _brighten_lut(b):
+    """Saturating addition of b as a 256-entry table"""
+    return np.clip(np.arange(256, dtype=np.int32) + int(b), 0, 255).astype(np.uint8)
+
+
+def _normalize_lut(min_val, max_val):
+    """ex2_05.normalize as a 256-entry table (same float32 arithmetic and truncation)"""
+    values = np.arange(256, dtype=np.float32)
+    if max_val == min_val:
+        return np.arange(256, dtype=np.uint8)
+    return np.clip((values - min_val) * (255.0 / (max_val - min_val)), 0, 255).astype(np.uint8)
+
+
+def _channel_stretch_lut(min_val, max_val):
+    """histogram_stretching as a table (identity for a flat channel)"""
+    if max_val == min_val:
+        return np.arange(256, dtype=np.uint8)
+    return stretch_lut(min_val, max_val)
+
+
+def _channels(img):
+    """Number of channels of a (H, W) or (H, W, C) array"""
+    return 1 if img.ndim == 2 else img.shape[2]
+
+
+def _extrema(hist):
+    """Per-channel (mins, maxs) read off (C, 256) histograms (0, 0 for an empty image)"""
+    mins = np.zeros(len(hist), dtype=np.int64)
+    maxs = np.zeros(len(hist), dtype=np.int64)
+    for c, counts in enumerate(hist):
+        occupied = np.flatnonzero(counts)
+        if occupied.size:
+            mins[c], maxs[c] = occupied[0], occupied[-1]
+    return mins, maxs
+
+
+def lut_histograms(hist, lut):
+    """
+    Histograms of an image after apply_lut, computed from its histograms alone
+
+    All pixels of input value v become lut[v], so the output histogram is the
+    input histogram regrouped through the table - no pass over the image.
+
+    Args:
+        hist: (C, 256) histograms of the input
+        lut: uint8 table of shape (256,), or (256, C) with one column per channel
+
+    Returns:
+        numpy array: int64 (C, 256) histograms of the mapped image
+    """
+    tables = lut[:, np.newaxis] if lut.ndim == 1 else lut
+    return np.stack([np.bincount(tables[:, c], weights=counts, minlength=256)
+                     for c, counts in enumerate(hist)]).astype(np.int64)
+
+
+def _stretch_histogram_with(histogram_extrema, apply_lut):
+    """stretch_histogram built from one backend's histogram_extrema and apply_lut"""
+    def stretch_histogram(img, out=None):
+        hist, mins, maxs = histogram_extrema(img)
+        luts = np.stack([_channel_stretch_lut(lo, hi) for lo, hi in zip(mins, maxs)], axis=1)
+        out = apply_lut(img, luts[:, 0] if img.ndim == 2 else luts, out)
+        return out, hist, lut_histograms(hist, luts)
+    return stretch_histogram
+
+
+# ============ NumPy ============
+
+def _numpy_apply_lut(img, lut, out=None):
+    """Apply a (256,) or per-channel (256, C) table in row blocks"""
+    if out is None:
+        out = np.empty(img.shape, dtype=np.uint8)
+    rows_per_block = max(1, BLOCK_ELEMENTS // max(1, img[0].size))
+    for start in range(0, img.shape[0], rows_per_block):
+        stop = start + rows_per_block
+        if lut.ndim == 1:
+            np.take(lut, img[start:stop], out=out[start:stop], mode='clip')
+        else:
+            for c in range(lut.shape[1]):
+                np.take(lut[:, c], img[start:stop, :, c], out=out[start:stop, :, c], mode='clip')
+    return out
+
+
+@_register('brighten', 'numpy')
+def _numpy_brighten(img, b):
+    return _numpy_apply_lut(img, _brighten_lut(b))
+
+
+@_register('normalize', 'numpy')
+def _numpy_normalize(img):
+    return _numpy_apply_lut(img, _normalize_lut(float(img.min()), float(img.max())))
+
+
+@_register('stretch', 'numpy')
+def _numpy_stretch(img, out=None):
+    if img.ndim == 2:
+        return _numpy_apply_lut(img, _channel_stretch_lut(img.min(), img.max()), out)
+    luts = np.stack([_channel_stretch_lut(img[:, :, c].min(), img[:, :, c].max())
+                     for c in range(img.shape[2])], axis=1)
+    return _numpy_apply_lut(img, luts, out)
+
+
+_register('apply_lut', 'numpy')(_numpy_apply_lut)
+
+
+@_register('histogram', 'numpy')
+def _numpy_histogram(img, channel=0):
+    plane = img if img.ndim == 2 else img[:, :, channel]
+    return np.bincount(plane.ravel(), minlength=256)
+
+
+@_register('histogram_extrema', 'numpy')
+def _numpy_histogram_extrema(img):
+    hist = np.stack([_numpy_histogram(img, c) for c in range(_channels(img))]).astype(np.int64)
+    return (hist,) + _extrema(hist)
+
+
+_register('stretch_histogram', 'numpy')(_stretch_histogram_with(_numpy_histogram_extrema, _numpy_apply_lut))
+
+
+@_register('to_gray', 'numpy')
+def _numpy_to_gray(img):
+    # Pillow's ITU-R 601-2 luma transform in 16-bit fixed point
+    r, g, b = (img[:, :, c].astype(np.uint32) for c in range(3))
+    return ((r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16).astype(np.uint8)
+
+
+# ============ OpenCV ============
+
+if cv2 is not None:
+
+    def _cv2_channel_extrema(img):
+        """Per-channel (mins, maxs) read off calcHist (no channel split or copy)"""
+        mins, maxs = [], []
+        for c in range(_channels(img)):
+            occupied = np.flatnonzero(cv2.calcHist([img], [c], None, [256], [0, 256]))
+            mins.append(occupied[0])
+            maxs.append(occupied[-1])
+        return mins, maxs
+
+    def _cv2_apply_lut(img, lut, out=None):
+        """cv2.LUT with a (256,) or per-channel (256, C) table"""
+        table = lut if lut.ndim == 1 else np.ascontiguousarray(lut).reshape(256, 1, lut.shape[1])
+        if out is not None and out.flags.c_contiguous:
+            cv2.LUT(img, table, dst=out)
+            return out
+        result = cv2.LUT(img, table)
+        if out is not None:
+            np.copyto(out, result)
+            return out
+        return result
+
+    @_register('brighten', 'opencv')
+    def _cv2_brighten(img, b):
+        return cv2.add(img, (float(b),) * 4)
+
+    @_register('normalize', 'opencv')
+    def _cv2_normalize(img):
+        min_val, max_val, _, _ = cv2.minMaxLoc(img.reshape(img.shape[0], -1))
+        return _cv2_apply_lut(img, _normalize_lut(min_val, max_val))
+
+    @_register('stretch', 'opencv')
+    def _cv2_stretch(img, out=None):
+        mins, maxs = _cv2_channel_extrema(img)
+        luts = np.stack([_channel_stretch_lut(lo, hi) for lo, hi in zip(mins, maxs)], axis=1)
+        return _cv2_apply_lut(img, luts[:, 0] if img.ndim == 2 else luts, out)
+
+    _register('apply_lut', 'opencv')(_cv2_apply_lut)
+
+    @_register('histogram', 'opencv')
+    def _cv2_histogram(img, channel=0):
+        hist = cv2.calcHist([img], [0 if img.ndim == 2 else channel], None, [256], [0, 256])
+        return hist.ravel().astype(np.int64)
+
+    @_register('histogram_extrema', 'opencv')
+    def _cv2_histogram_extrema(img):
+        hist = np.stack([_cv2_histogram(img, c) for c in range(_channels(img))])
+        return (hist,) + _extrema(hist)
+
+    _register('stretch_histogram', 'opencv')(_stretch_histogram_with(_cv2_histogram_extrema, _cv2_apply_lut))
+
+    # No 'to_gray': cv2.cvtColor rounds differently from Pillow's luma transform
+    # on about 0.1% of colors, so it cannot give identical results.
+
+
+# ============ Pillow ============
+
+def _pil_apply_luts(image, luts):
+    """Image.point with one table per band"""
+    return image.point([int(v) for lut in luts for v in lut])
+
+
+@_register('brighten', 'pillow')
+def _pil_brighten(img, b):
+    image = Image.fromarray(img)
+    return np.asarray(_pil_apply_luts(image, [_brighten_lut(b)] * _channels(img)))
+
+
+@_register('normalize', 'pillow')
+def _pil_normalize(img):
+    image = Image.fromarray(img)
+    extrema = image.getextrema()
+    if img.ndim == 2:
+        extrema = [extrema]
+    min_val = min(lo for lo, _ in extrema)
+    max_val = max(hi for _, hi in extrema)
+    return np.asarray(_pil_apply_luts(image, [_normalize_lut(min_val, max_val)] * _channels(img)))
+
+
+@_register('stretch', 'pillow')
+def _pil_stretch(img, out=None):
+    image = Image.fromarray(img)
+    extrema = image.getextrema()
+    if img.ndim == 2:
+        extrema = [extrema]
+    result = np.asarray(_pil_apply_luts(image, [_channel_stretch_lut(lo, hi) for lo, hi in extrema]))
+    if out is not None:
+        np.copyto(out, result)
+        return out
+    return result
+
+
+@_register('apply_lut', 'pillow')
+def _pil_apply_lut(img, lut, out=None):
+    luts = [lut] * _channels(img) if lut.ndim == 1 else list(lut.T)
+    result = np.asarray(_pil_apply_luts(Image.fromarray(img), luts))
+    if out is not None:
+        np.copyto(out, result)
+        return out
+    return result
+
+
+@_register('histogram', 'pillow')
+def _pil_histogram(img, channel=0):
+    hist = Image.fromarray(img).histogram()
+    start = 0 if img.ndim == 2 else 256 * channel
+    return np.array(hist[start:start + 256], dtype=np.int64)
+
+
+@_register('histogram_extrema', 'pillow')
+def _pil_histogram_extrema(img):
+    # One call counts every band
+    hist = np.array(Image.fromarray(img).histogram(), dtype=np.int64).reshape(_channels(img), 256)
+    return (hist,) + _extrema(hist)
+
+
+_register('stretch_histogram', 'pillow')(_stretch_histogram_with(_pil_histogram_extrema, _pil_apply_lut))
+
+
+@_register('to_gray', 'pillow')
+def _pil_to_gray(img):
+    return np.asarray(Image.fromarray(img).convert('L'))
+
+
+# ============ Numba ============
+
+if jit_kernels.JIT_AVAILABLE:
+
+    @_register('apply_lut', 'numba')
+    def _numba_apply_lut(img, lut, out=None):
+        if out is None:
+            out = np.empty(img.shape, dtype=np.uint8)
+        tables = lut[np.newaxis] if lut.ndim == 1 else np.ascontiguousarray(lut.T)
+        if lut.ndim == 1 and img.ndim == 3:
+            tables = np.repeat(tables, img.shape[2], axis=0)
+        jit_kernels.apply_tables(jit_kernels.planes(img), tables, jit_kernels.planes(out))
+        return out
+
+    @_register('histogram', 'numba')
+    def _numba_histogram(img, channel=0):
+        c = 0 if img.ndim == 2 else channel
+        return jit_kernels.channel_histograms(jit_kernels.planes(img)[:, :, c:c + 1])[0]
+
+    @_register('histogram_extrema', 'numba')
+    def _numba_histogram_extrema(img):
+        hist = jit_kernels.channel_histograms(jit_kernels.planes(img))
+        return (hist,) + _extrema(hist)
+
+    _register('stretch_histogram', 'numba')(_stretch_histogram_with(_numba_histogram_extrema, _numba_apply_lut))
+
+    @_register('stretch', 'numba')
+    def _numba_stretch(img, out=None):
+        return _implementations['stretch_histogram']['numba'](img, out)[0]
+
+
+# ============ Public operations ============
+
+def brighten(img, b, backend=None):
+    """
+    Add b to every pixel, saturating at 0 and 255
+
+    Args:
+        img: uint8 array (H, W) or (H, W, 3)
+        b: Value to add (may be negative)
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        numpy array: Brightened image
+    """
+    return _implementations['brighten'][backend or select_backend('brighten', img.shape)](img, b)
+
+
+def normalize(img, backend=None):
+    """
+    Stretch the global min/max of an image to 0-255 (same results as ex2_05.normalize)
+
+    Returns:
+        numpy array: Normalized image
+    """
+    return _implementations['normalize'][backend or select_backend('normalize', img.shape)](img)
+
+
+def stretch(img, out=None, backend=None):
+    """
+    Histogram stretching of each channel separately (same results as histogram_stretching)
+
+    Args:
+        img: uint8 array (H, W) or (H, W, 3)
+        out: Optional uint8 array of the same shape to write the result into
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        numpy array: Stretched image (out, if given)
+    """
+    return _implementations['stretch'][backend or select_backend('stretch', img.shape)](img, out)
+
+
+def stretch_histogram(img, out=None, backend=None):
+    """
+    Histogram stretching (same results as stretch), also returning the
+    histograms of every channel before and after
+
+    Args:
+        img: uint8 array (H, W) or (H, W, C)
+        out: Optional uint8 array of the same shape to write the result into
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        tuple: (stretched image (out, if given), int64 (C, 256) histograms of img,
+                int64 (C, 256) histograms of the stretched image)
+    """
+    return _implementations['stretch_histogram'][backend or select_backend('stretch_histogram', img.shape)](
+        img, out)
+
+
+def apply_lut(img, lut, out=None, backend=None):
+    """
+    Map every pixel through a lookup table
+
+    Args:
+        img: uint8 array (H, W) or (H, W, C)
+        lut: uint8 table of shape (256,), or (256, C) with one column per channel
+        out: Optional uint8 array of the same shape to write the result into
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        numpy array: Mapped image (out, if given)
+    """
+    return _implementations['apply_lut'][backend or select_backend('apply_lut', img.shape)](img, lut, out)
+
+
+def histogram(img, channel=0, backend=None):
+    """
+    256-bin histogram of one channel
+
+    Args:
+        img: uint8 array (H, W) or (H, W, C)
+        channel: Channel index (ignored for 2D images)
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        numpy array: int64 counts
+    """
+    return _implementations['histogram'][backend or select_backend('histogram', img.shape)](img, channel)
+
+
+def histogram_extrema(img, backend=None):
+    """
+    256-bin histogram, minimum and maximum of every channel
+
+    Args:
+        img: uint8 array (H, W) or (H, W, C)
+        backend: Force a backend name instead of the autotuned choice
+
+    Returns:
+        tuple: (int64 (C, 256) histograms, int64 (C,) minimums, int64 (C,) maximums)
+    """
+    return _implementations['histogram_extrema'][backend or select_backend('histogram_extrema', img.shape)](img)
+
+
+def to_gray(img, backend=None):
+    """
+    RGB to grayscale with Pillow's ITU-R 601-2 luma transform
+
+    Returns:
+        numpy array: uint8 (H, W) image
+    """
+    return _implementations['to_gray'][backend or select_backend('to_gray', img.shape)](img)
+
+
+# ============ Autotuning ============
+
+def _fingerprint():
+    """Identifies the machine and library versions a tuning result is valid for"""
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'opencv': cv2.__version__ if cv2 is not None else None,
+        'numba': jit_kernels.numba.__version__ if jit_kernels.JIT_AVAILABLE else None,
+        'operations': list(OPERATIONS),
+    }
+
+
+def _benchmark_args(op, img):
+    """Arguments used to time an operation"""
+    if op == 'brighten':
+        return (img, 50)
+    if op == 'apply_lut':
+        lut = np.arange(255, -1, -1, dtype=np.uint8)
+        return (img, lut if img.ndim == 2 else np.tile(lut[:, None], (1, img.shape[2])))
+    if op == 'histogram':
+        return (img, 1)
+    return (img,)
+
+
+def benchmark(repeats=3, seed=0):
+    """
+    Time every backend of every operation on each size bucket
+
+    Returns:
+        dict: op -> bucket -> backend -> best time in seconds
+    """
+    rng = np.random.default_rng(seed)
+    timings = {op: {} for op in OPERATIONS}
+    for _, bucket, (height, width) in SIZE_BUCKETS:
+        # Narrow value range so stretch/normalize do real work
+        img = rng.integers(40, 200, (height, width, 3), dtype=np.uint8)
+        for op in OPERATIONS:
+            timings[op][bucket] = {}
+            for backend, func in _implementations[op].items():
+                args = _benchmark_args(op, img)
+                func(*args)  # warm-up
+                best = float('inf')
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    func(*args)
+                    best = min(best, time.perf_counter() - start)
+                timings[op][bucket][backend] = best
+    return timings
+
+
+def verify(seed=0):
+    """
+    Check that every backend gives the same results as the NumPy backend
+
+    Returns:
+        list: (op, backend, image kind) of every mismatch (empty when all agree)
+    """
+    rng = np.random.default_rng(seed)
+    color = rng.integers(40, 200, (97, 131, 3), dtype=np.uint8)
+    images = {'color': color, 'gray': color[:, :, 1].copy(), 'strided': color[::2, ::3]}
+    mismatches = []
+    for op in OPERATIONS:
+        for kind, img in images.items():
+            if op == 'to_gray' and img.ndim == 2:
+                continue
+            args = _benchmark_args(op, img)
+            expected = _implementations[op]['numpy'](*args)
+            for backend, func in _implementations[op].items():
+                result = func(*args)
+                if isinstance(expected, tuple):
+                    same = all(np.array_equal(a, b) for a, b in zip(result, expected))
+                else:
+                    same = np.array_equal(result, expected)
+                if not same:
+                    mismatches.append((op, backend, kind))
+    return mismatches
+
+
+def autotune(cache_path=DEFAULT_CACHE_PATH, force=False, repeats=3):
+    """
+    Choose the fastest backend per operation and size, reusing a cached result
+
+    The benchmark only runs when there is no cache for this machine and these
+    library versions. A lock file keeps concurrently starting workers from
+    benchmarking at the same time (they wait and then read the cache).
+
+    Args:
+        cache_path: JSON file holding the tuning result (None disables caching)
+        force: Re-run the benchmark even if a valid cache exists
+        repeats: Timed runs per backend (the best is used)
+
+    Returns:
+        dict: op -> bucket -> chosen backend
+    """
+    fingerprint = _fingerprint()
+
+    def read_cache():
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached['selection'] if cached.get('fingerprint') == fingerprint else None
+
+    if cache_path and not force:
+        selection = read_cache()
+        if selection is not None:
+            _selection.clear()
+            _selection.update(selection)
+            return dict(_selection)
+
+    lock_file = None
+    try:
+        if cache_path and fcntl is not None:
+            os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+            lock_file = open(cache_path + '.lock', 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have finished tuning while we waited
+            selection = None if force else read_cache()
+            if selection is not None:
+                _selection.clear()
+                _selection.update(selection)
+                return dict(_selection)
+
+        timings = benchmark(repeats=repeats)
+        selection = {op: {bucket: min(times, key=times.get) for bucket, times in buckets.items()}
+                     for op, buckets in timings.items()}
+        _selection.clear()
+        _selection.update(selection)
+
+        if cache_path:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'fingerprint': fingerprint, 'selection': selection, 'timings': timings},
+                          f, indent=1)
+            os.replace(tmp_path, cache_path)
+    finally:
+        if lock_file is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+    return dict(_selection)
+
+
+if __name__ == "__main__":
+    print(f"Available backends: {', '.join(available_backends())}")
+    mismatches = verify()
+    for op, backend, kind in mismatches:
+        print(f"MISMATCH: {op} with {backend} on a {kind} image differs from numpy")
+    timings = benchmark()
+    for op in OPERATIONS:
+        for _, bucket, _ in SIZE_BUCKETS:
+            times = timings[op][bucket]
+            line = '  '.join(f"{name}={seconds * 1000:7.2f}ms" for name, seconds in sorted(times.items()))
+            print(f"{op:17s} {bucket:7s} {line}   -> {min(times, key=times.get)}")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,233 @@
+"""
+Synthetic test images for benchmarking
+Vectorized versions of the test patterns used in the exercises (the gradient
+of ex2_01, the low-contrast circle of ex2_04 and the low-contrast shapes of
+create_low_contrast_image.py) plus noise and outlier injection (as in ex2_06).
+Generated fixtures can be cached on disk keyed by their parameters.
+
+usage example:
+    python synthetic_images.py gradient --height 2160 --width 3840 --channels 3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+
+PATTERNS = ('gradient', 'low_contrast_circle', 'low_contrast_shapes', 'uniform_noise')
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.fixture_cache')
+
+
+def gradient(height, width):
+    """
+    Diagonal gradient: 0 at (0, 0) rising to 255 at (height-1, width-1)
+
+    Gives the same values as ex2_01.create_gradient_image without the pixel loop.
+
+    Returns:
+        numpy array: float64 (height, width) levels in the 0-255 range
+    """
+    y = np.arange(height, dtype=np.float64)[:, np.newaxis]
+    x = np.arange(width, dtype=np.float64)[np.newaxis, :]
+    return (x + y) * 255 / max(1, height - 1 + width - 1)
+
+
+def low_contrast_circle(height, width, fg=105, bg=100):
+    """
+    Filled circle of value fg on a bg background (as ex2_04.create_low_contrast_image)
+
+    The disc matches cv2.circle with thickness -1 pixel for pixel.
+
+    Returns:
+        numpy array: float64 (height, width) levels
+    """
+    cx, cy = width // 2, height // 2
+    radius = min(width, height) // 3
+    y, x = np.ogrid[:height, :width]
+    mask = (x - cx) ** 2 + (y - cy) ** 2 <= radius ** 2
+    return np.where(mask, float(fg), float(bg))
+
+
+def low_contrast_shapes(height, width, rng, low=50, high=150):
+    """
+    Noisy narrow-range image with a dark rectangle and a light circle
+    (as 1/create_low_contrast_image.py, scaled to any size)
+
+    Returns:
+        numpy array: float64 (height, width) levels in [low, high)
+    """
+    img = rng.integers(low, high, (height, width)).astype(np.float64)
+
+    # Dark rectangle over the middle of the upper half
+    top, bottom = height // 4, height // 2
+    left, right = width // 4, 3 * width // 4
+    img[top:bottom, left:right] = rng.integers(low, low + (high - low) * 3 // 10,
+                                               (bottom - top, right - left))
+
+    # Lighter circle in the lower right
+    y, x = np.ogrid[:height, :width]
+    radius = min(height, width) * 3 // 20
+    mask = (x - 3 * width // 4) ** 2 + (y - 3 * height // 4) ** 2 <= radius ** 2
+    img[mask] = rng.integers(low + (high - low) * 7 // 10, high, int(mask.sum()))
+    return img
+
+
+def add_noise(levels, sigma, rng):
+    """Add zero-mean Gaussian noise (in 0-255 level units) in place"""
+    levels += rng.normal(0.0, sigma, levels.shape)
+    return levels
+
+
+def inject_outliers(img, count, rng, low=0, high=None):
+    """
+    Set random pixels to extreme values (as the two outlier pixels of ex2_06)
+
+    Args:
+        img: Image array modified in place
+        count: Number of outliers; half are set to low, half to high
+        rng: numpy Generator
+        low: Dark outlier value
+        high: Bright outlier value (default: dtype maximum, or 1.0 for floats)
+
+    Returns:
+        numpy array: img
+    """
+    if high is None:
+        high = np.iinfo(img.dtype).max if np.issubdtype(img.dtype, np.integer) else 1.0
+    height, width = img.shape[:2]
+    flat_index = rng.choice(height * width, size=min(count, height * width), replace=False)
+    rows, cols = np.unravel_index(flat_index, (height, width))
+    half = len(flat_index) // 2
+    img[rows[:half], cols[:half]] = low
+    img[rows[half:], cols[half:]] = high
+    return img
+
+
+def _to_dtype(levels, dtype):
+    """Convert 0-255 levels to dtype (truncating for uint8, as the exercises do)"""
+    dtype = np.dtype(dtype)
+    levels = np.clip(levels, 0, 255, out=levels)
+    if dtype == np.uint8:
+        return levels.astype(np.uint8)
+    if dtype == np.uint16:
+        return (levels * 257).astype(np.uint16)
+    if np.issubdtype(dtype, np.floating):
+        return (levels / 255).astype(dtype)
+    raise ValueError(f"Unsupported dtype '{dtype}'")
+
+
+def generate(pattern='gradient', height=512, width=512, channels=1, dtype=np.uint8,
+             noise=0.0, outliers=0, seed=0, **pattern_args):
+    """
+    Generate a synthetic test image
+
+    Args:
+        pattern: One of PATTERNS
+        height: Image height
+        width: Image width
+        channels: 1 for a 2D image, otherwise the number of channels (each
+                  channel gets independent noise)
+        dtype: uint8, uint16 or a float type (floats are scaled to 0-1)
+        noise: Standard deviation of Gaussian noise in 0-255 level units
+        outliers: Number of extreme pixels to inject
+        seed: Random seed (results are deterministic for a given seed)
+        pattern_args: Extra arguments for the pattern (e.g. fg/bg)
+
+    Returns:
+        numpy array: (height, width) or (height, width, channels) image
+    """
+    rng = np.random.default_rng(seed)
+    if pattern == 'gradient':
+        levels = gradient(height, width)
+    elif pattern == 'low_contrast_circle':
+        levels = low_contrast_circle(height, width, **pattern_args)
+    elif pattern == 'low_contrast_shapes':
+        levels = low_contrast_shapes(height, width, rng, **pattern_args)
+    elif pattern == 'uniform_noise':
+        levels = rng.uniform(0, 256, (height, width))
+    else:
+        raise ValueError(f"Unknown pattern '{pattern}'")
+
+    if channels > 1:
+        levels = np.repeat(levels[:, :, np.newaxis], channels, axis=2)
+    if noise:
+        add_noise(levels, noise, rng)
+
+    img = _to_dtype(levels, dtype)
+    if outliers:
+        inject_outliers(img, outliers, rng)
+    return img
+
+
+def fixture_key(**params):
+    """Stable hash of generation parameters, used as the cache file name"""
+    params = {name: (np.dtype(value).str if name == 'dtype' else value)
+              for name, value in sorted(params.items())}
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def cached_fixture(cache_dir=DEFAULT_CACHE_DIR, **params):
+    """
+    Load a generated image from the on-disk cache, generating it on first use
+
+    The cache file is an .npy keyed by the generation parameters and is
+    returned as a read-only memory map, so repeated benchmark runs start
+    instantly and share pages between processes.
+
+    Args:
+        cache_dir: Directory holding cached fixtures
+        params: Arguments for generate()
+
+    Returns:
+        numpy array: Read-only memory-mapped image
+    """
+    params.setdefault('pattern', 'gradient')
+    params.setdefault('dtype', np.uint8)
+    path = os.path.join(cache_dir, f"{params['pattern']}_{fixture_key(**params)}.npy")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        img = generate(**params)
+        # Write under a temporary name so concurrent users never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, img)
+        os.replace(tmp_path, path)
+    return np.load(path, mmap_mode='r')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate (and cache) a synthetic test image')
+    parser.add_argument('pattern', choices=PATTERNS)
+    parser.add_argument('--height', type=int, default=512)
+    parser.add_argument('--width', type=int, default=512)
+    parser.add_argument('--channels', type=int, default=1)
+    parser.add_argument('--dtype', default='uint8', choices=('uint8', 'uint16', 'float32', 'float64'))
+    parser.add_argument('--noise', type=float, default=0.0)
+    parser.add_argument('--outliers', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--save', help='Also save the image to this path (PNG, TIFF, ... or .npy)')
+    args = parser.parse_args(argv)
+
+    img = cached_fixture(cache_dir=args.cache_dir, pattern=args.pattern, height=args.height,
+                         width=args.width, channels=args.channels, dtype=args.dtype,
+                         noise=args.noise, outliers=args.outliers, seed=args.seed)
+    print(f"{args.pattern}: shape={img.shape} dtype={img.dtype} range=[{img.min()}, {img.max()}]")
+    print(f"Cached at: {img.filename}")
+    if args.save:
+        if args.save.endswith('.npy'):
+            np.save(args.save, img)
+        else:
+            from PIL import Image
+            Image.fromarray(np.asarray(img)).save(args.save)
+        print(f"Saved to: {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Watch-folder ingestion daemon
+Polls a directory and runs new or changed images through the batch stretching
+pipeline. A persistent manifest records each file's size, modification time,
+content hash and outputs, so unchanged files are never reprocessed and a
+restarted daemon picks up exactly where it left off.
+
+usage example:
+    python watch_folder.py incoming/ -o processed/ --mode color --interval 5
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from batch_stretch import IMAGE_EXTENSIONS, MODES, output_base, process_file
+from helper_functions import file_digest
+
+
+MANIFEST_NAME = '.manifest.json'
+
+# Files modified more recently than this many seconds are assumed to be still being written
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# The manifest is saved after this many processed files or seconds, whichever comes first
+# (rewriting it after every file is quadratic in the size of a large backlog)
+MANIFEST_SAVE_FILES = 100
+MANIFEST_SAVE_SECONDS = 5.0
+
+
+def load_manifest(manifest_path):
+    """
+    Read the manifest written by a previous run
+
+    Returns:
+        dict: Relative path -> entry (empty if there is no manifest yet)
+    """
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        print(f"Warning: manifest '{manifest_path}' is corrupt, starting fresh", file=sys.stderr)
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    """Write the manifest atomically (temp file + rename) so a crash never leaves it half-written"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+
+
+def scan_folder(watch_dir, skip_dir=None):
+    """
+    List image files under watch_dir with their size and modification time
+
+    Returns:
+        dict: Relative path -> (size, mtime_ns)
+    """
+    found = {}
+    skip_dir = os.path.abspath(skip_dir) if skip_dir else None
+    for dirpath, dirnames, names in os.walk(watch_dir):
+        if skip_dir:
+            dirnames[:] = [d for d in dirnames if os.path.abspath(os.path.join(dirpath, d)) != skip_dir]
+        for name in names:
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            found[os.path.relpath(path, watch_dir)] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+def find_changes(manifest, found, watch_dir, settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """
+    Decide which files need processing
+
+    Files whose size and mtime match the manifest are skipped without being
+    read. Files that were only touched (same content hash) have their manifest
+    entry refreshed instead of being reprocessed.
+
+    Returns:
+        tuple: (list of (relative path, size, mtime_ns, sha256) to process,
+        number of manifest entries refreshed in place)
+    """
+    now_ns = time.time_ns()
+    changed = []
+    refreshed = 0
+    for rel_path, (size, mtime_ns) in sorted(found.items()):
+        entry = manifest.get(rel_path)
+        if entry and entry['size'] == size and entry['mtime_ns'] == mtime_ns:
+            continue
+        if now_ns - mtime_ns < settle_seconds * 1e9:
+            continue
+        try:
+            digest = file_digest(os.path.join(watch_dir, rel_path))
+        except FileNotFoundError:
+            continue
+        if entry and entry['sha256'] == digest:
+            entry['size'], entry['mtime_ns'] = size, mtime_ns
+            refreshed += 1
+            continue
+        changed.append((rel_path, size, mtime_ns, digest))
+    return changed, refreshed
+
+
+def watch(watch_dir, output_dir, mode='color', workers=None, interval=5.0,
+          settle_seconds=DEFAULT_SETTLE_SECONDS, histograms=True, once=False):
+    """
+    Run the ingestion loop
+
+    Args:
+        watch_dir: Directory to watch (recursively)
+        output_dir: Root of the output tree; also holds the manifest
+        mode: 'gray', 'color' or 'channels'
+        workers: Number of worker processes (default: CPU count)
+        interval: Seconds between polls
+        settle_seconds: Minimum age of a file before it is picked up
+        histograms: Write histogram JSON files next to the outputs
+        once: Process the current backlog and return instead of looping
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    print(f"Watching '{watch_dir}' ({len(manifest)} files already in manifest)")
+
+    stop = []
+    previous_handler = signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    max_workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=max_workers)
+    unsaved, last_save = 0, time.monotonic()
+
+    try:
+        while not stop:
+            found = scan_folder(watch_dir, skip_dir=output_dir)
+
+            # Forget files that were removed from the watch folder
+            removed = set(manifest) - set(found)
+            for rel_path in removed:
+                del manifest[rel_path]
+
+            changed, refreshed = find_changes(manifest, found, watch_dir, settle_seconds)
+            futures = {}
+            broken = False
+            for rel_path, size, mtime_ns, digest in changed:
+                job = (process_file, os.path.join(watch_dir, rel_path),
+                       output_base(rel_path, '.', output_dir), mode, histograms)
+                try:
+                    future = pool.submit(*job)
+                except BrokenProcessPool:
+                    # A worker died during the previous files; continue with a fresh pool
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(max_workers=max_workers)
+                    future = pool.submit(*job)
+                futures[future] = (rel_path, size, mtime_ns, digest)
+
+            for future, (rel_path, size, mtime_ns, digest) in futures.items():
+                try:
+                    _, outputs, megapixels, seconds, error = future.result()
+                except Exception as e:
+                    # A crashed worker or a failed write (e.g. a full disk) says nothing
+                    # about the file itself, so it stays out of the manifest and is
+                    # retried on the next poll
+                    print(f"RETRY {rel_path}: {type(e).__name__}: {e}", file=sys.stderr)
+                    if isinstance(e, BrokenProcessPool):
+                        broken = True
+                    continue
+                # Errors returned by process_file (unreadable or unsupported images) are
+                # recorded, so such a file is retried only once it changes
+                manifest[rel_path] = {
+                    'size': size,
+                    'mtime_ns': mtime_ns,
+                    'sha256': digest,
+                    'outputs': outputs,
+                    'error': error,
+                    'processed_at': time.time(),
+                }
+                if error:
+                    print(f"FAILED {rel_path}: {error}", file=sys.stderr)
+                else:
+                    print(f"{seconds * 1000:8.1f} ms  {megapixels:7.2f} MP  {rel_path}")
+                unsaved += 1
+                # A restart redoes at most the files processed since the last save
+                if unsaved >= MANIFEST_SAVE_FILES or time.monotonic() - last_save >= MANIFEST_SAVE_SECONDS:
+                    save_manifest(manifest, manifest_path)
+                    unsaved, last_save = 0, time.monotonic()
+
+            if broken:
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=max_workers)
+            if unsaved or removed or refreshed:
+                save_manifest(manifest, manifest_path)
+                unsaved, last_save = 0, time.monotonic()
+            if once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.shutdown()
+        signal.signal(signal.SIGTERM, previous_handler)
+        save_manifest(manifest, manifest_path)
+        print(f"Stopped; manifest has {len(manifest)} files")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch a folder and stretch new or changed images')
+    parser.add_argument('watch_dir', help='Directory to watch')
+    parser.add_argument('-o', '--output', required=True, help='Output directory (holds the manifest)')
+    parser.add_argument('--mode', choices=MODES, default='color')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls')
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help='Ignore files modified less than this many seconds ago')
+    parser.add_argument('--no-histograms', action='store_true', help='Do not write histogram files')
+    parser.add_argument('--once', action='store_true', help='Process the current backlog and exit')
+    args = parser.parse_args(argv)
+
+    watch(args.watch_dir, args.output, mode=args.mode, workers=args.workers, interval=args.interval,
+          settle_seconds=args.settle, histograms=not args.no_histograms, once=args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
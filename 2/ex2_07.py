@@ -9,29 +9,186 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 
-def compute_histogram(img):
+def _uniform_bins(bins, value_range):
     """
-    Computes histogram of a grayscale image without using library functions
+    Range limits and scale of uniform binning, with cv2.calcHist's arithmetic
+    
+    calcHist takes the range as 32-bit floats, so a limit such as 130.3 is
+    really 130.30000305; the scale and offset are then computed in double.
+    
+    Returns:
+    tuple: (low, high, scale) as Python floats
+    """
+    low, high = (float(np.float32(limit)) for limit in value_range)
+    return low, high, bins / (high - low)
+
+
+def _bin_lookup(bins, value_range):
+    """
+    Bin index for every 8-bit value, using the same uniform binning rule as cv2.calcHist
+    
+    Parameters:
+    bins (int): Number of bins
+    value_range (tuple): (low, high) range; values outside [low, high) are not counted
+    
+    Returns:
+    numpy.ndarray: 256 bin indices, -1 for values outside the range
+    """
+    low, high, scale = _uniform_bins(bins, value_range)
+    values = np.arange(256, dtype=np.float64)
+    lookup = np.clip(np.floor(values * scale - low * scale), 0, bins - 1).astype(np.intp)
+    lookup[(values < low) | (values >= high)] = -1
+    return lookup
+
+
+def _bin_matrix(bins, value_range):
+    """
+    One-hot (256, bins) matrix mapping each 8-bit value to its bin (all-zero rows when out of range)
+    
+    Multiplying a 256-entry value count by this matrix merges the counts into bins.
+    """
+    lookup = _bin_lookup(bins, value_range)
+    matrix = np.zeros((256, bins), dtype=np.int64)
+    valid = lookup >= 0
+    matrix[np.nonzero(valid)[0], lookup[valid]] = 1
+    return matrix
+
+
+def _bin_indices(values, bins, value_range):
+    """
+    Bin index of each value (-1 when out of range)
+    
+    Parameters:
+    values (numpy.ndarray): Pixel values (any shape)
+    bins (int): Number of bins
+    value_range (tuple): (low, high) range
+    
+    Returns:
+    numpy.ndarray: Bin indices with the same shape as values
+    """
+    if values.dtype == np.uint8:
+        return _bin_lookup(bins, value_range)[values]
+    low, _, scale = _uniform_bins(bins, value_range)
+    # For other types calcHist goes by the computed index alone: it is not clamped, and
+    # values whose index falls outside [0, bins) are dropped (so are NaNs)
+    indices = np.floor(values.astype(np.float64) * scale - low * scale)
+    indices[~((indices >= 0) & (indices < bins))] = -1
+    return indices.astype(np.intp)
+
+
+def _regions(img, mask, roi):
+    """
+    Split an image (and its mask) into the regions to be counted
+    
+    Parameters:
+    img (numpy.ndarray): Image
+    mask (numpy.ndarray): Optional mask of the same height/width (nonzero = counted)
+    roi (tuple or list): Optional (x, y, w, h) rectangle or list of rectangles
+    
+    Returns:
+    list: (image region, mask region or None) pairs
+    """
+    rects = [None] if roi is None else ([roi] if np.isscalar(roi[0]) else list(roi))
+    regions = []
+    for rect in rects:
+        if rect is None:
+            region, region_mask = img, mask
+        else:
+            x, y, w, h = rect
+            region = img[y:y + h, x:x + w]
+            region_mask = None if mask is None else mask[y:y + h, x:x + w]
+        if region_mask is not None:
+            region_mask = region_mask.astype(bool, copy=False)
+        regions.append((region, region_mask))
+    return regions
+
+
+def _count(indices, bins):
+    """Count valid (non-negative) bin indices"""
+    indices = indices.ravel()
+    if indices.size and indices.min() < 0:
+        indices = indices[indices >= 0]
+    return np.bincount(indices, minlength=bins).astype(np.int32)
+
+
+def compute_histogram(img, mask=None, roi=None, bins=256, value_range=(0, 256)):
+    """
+    Computes histogram of a grayscale image without using library histogram functions
+    
+    Results are identical to cv2.calcHist([img], [0], mask, [bins], value_range).
     
     Parameters:
     img (numpy.ndarray): Grayscale image
+    mask (numpy.ndarray): Optional mask (bool or uint8, nonzero pixels are counted)
+    roi (tuple or list): Optional (x, y, w, h) rectangle, or a list of rectangles
+                         to compute one histogram per region in a single call
+    bins (int): Number of bins
+    value_range (tuple): (low, high) range covered by the bins
     
     Returns:
-    numpy.ndarray: Histogram array of size 256
+    numpy.ndarray: Histogram array of size bins, or (n_rois, bins) for a list of ROIs
+    """
+    histograms = []
+    for region, region_mask in _regions(img, mask, roi):
+        if region_mask is not None:
+            region = region[region_mask]
+        if region.dtype == np.uint8:
+            # Count each of the 256 values once, then merge the counts into bins
+            counts = np.bincount(region.ravel(), minlength=256)
+            if bins == 256 and tuple(value_range) == (0, 256):
+                histograms.append(counts.astype(np.int32))
+            else:
+                histograms.append((counts @ _bin_matrix(bins, value_range)).astype(np.int32))
+        else:
+            histograms.append(_count(_bin_indices(region, bins, value_range), bins))
+    
+    if roi is not None and not np.isscalar(roi[0]):
+        return np.stack(histograms)
+    return histograms[0]
+
+
+def compute_joint_histogram(img, channels=(0, 1), bins=(32, 32), ranges=((0, 256), (0, 256)),
+                            mask=None, roi=None):
     """
-    # Initialize histogram array with 256 bins (for values 0-255)
-    histogram = np.zeros(256, dtype=np.int32)
+    Computes a 2D joint histogram of two channels (e.g. R-G, or H-S of an HSV image)
+    
+    Results are identical to cv2.calcHist([img], list(channels), mask, list(bins), flat ranges).
     
-    # Get image dimensions
-    height, width = img.shape
+    Parameters:
+    img (numpy.ndarray): Multi-channel image
+    channels (tuple): The two channel indices to combine
+    bins (tuple): Number of bins for each channel
+    ranges (tuple): (low, high) range for each channel
+    mask (numpy.ndarray): Optional mask (nonzero pixels are counted)
+    roi (tuple or list): Optional (x, y, w, h) rectangle, or a list of rectangles
     
-    # Count frequency of each pixel value
-    for y in range(height):
-        for x in range(width):
-            pixel_value = img[y, x]
-            histogram[pixel_value] += 1
+    Returns:
+    numpy.ndarray: (bins[0], bins[1]) histogram, or (n_rois, bins[0], bins[1]) for a list of ROIs
+    """
+    c0, c1 = channels
+    n0, n1 = bins
+    histograms = []
+    for region, region_mask in _regions(img, mask, roi):
+        first = region[..., c0]
+        second = region[..., c1]
+        if region_mask is not None:
+            first, second = first[region_mask], second[region_mask]
+        if first.dtype == np.uint8 and second.dtype == np.uint8:
+            # Count all 256x256 value pairs, then merge rows and columns into bins
+            pairs = (first.astype(np.intp) << 8) | second
+            counts = np.bincount(pairs.ravel(), minlength=65536).reshape(256, 256)
+            joint = _bin_matrix(n0, ranges[0]).T @ counts @ _bin_matrix(n1, ranges[1])
+            histograms.append(joint.astype(np.int32))
+            continue
+        idx0 = _bin_indices(first, n0, ranges[0])
+        idx1 = _bin_indices(second, n1, ranges[1])
+        # Combine into one flat index; pairs with any out-of-range channel are dropped
+        flat = np.where((idx0 >= 0) & (idx1 >= 0), idx0 * n1 + idx1, -1)
+        histograms.append(_count(flat, n0 * n1).reshape(n0, n1))
     
-    return histogram
+    if roi is not None and not np.isscalar(roi[0]):
+        return np.stack(histograms)
+    return histograms[0]
 
 
 def convert_to_grayscale(image_path):
@@ -147,6 +304,26 @@ def main_with_sample_image():
         print("\n✓ SUCCESS: Manual histogram matches cv2.calcHist() result!")
     else:
         print("\n✗ WARNING: Results differ!")
+    
+    # Masked and region histograms, also compared with cv2.calcHist
+    mask = np.zeros(test_img.shape, dtype=np.uint8)
+    cv2.circle(mask, (100, 100), 50, 255, -1)
+    masked_hist = compute_histogram(test_img, mask=mask)
+    masked_cv2 = cv2.calcHist([test_img], [0], mask, [256], [0, 256]).flatten().astype(np.int32)
+    print(f"Masked histogram matches cv2.calcHist(): {np.array_equal(masked_hist, masked_cv2)}")
+    
+    rois = [(0, 0, 200, 200), (200, 200, 150, 150)]
+    roi_hists = compute_histogram(test_img, roi=rois)
+    for (x, y, w, h), roi_hist in zip(rois, roi_hists):
+        region = test_img[y:y + h, x:x + w]
+        print(f"ROI {(x, y, w, h)}: {np.sum(roi_hist)} pixels, mean {region.mean():.1f}, "
+              f"most common value {np.argmax(roi_hist)}")
+    
+    # 2D joint histogram of two channels of a color image
+    color_img = cv2.merge([test_img, 255 - test_img, test_img // 2])
+    joint = compute_joint_histogram(color_img, channels=(0, 1), bins=(32, 32))
+    joint_cv2 = cv2.calcHist([color_img], [0, 1], None, [32, 32], [0, 256, 0, 256]).astype(np.int32)
+    print(f"Joint 2D histogram matches cv2.calcHist(): {np.array_equal(joint, joint_cv2)}")
 
 
 def main_with_file(image_path):
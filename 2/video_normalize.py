@@ -0,0 +1,291 @@
+"""
+Video / frame-sequence normalization
+Streams frames from a video file (cv2.VideoCapture) or an image sequence and
+normalizes them like ex2_05.normalize, but with stretch bounds taken from an
+exponentially smoothed running histogram instead of each frame's own min/max.
+This removes the flicker of per-frame normalization, and each frame only
+needs one histogram and one lookup-table pass.
+
+Frames are decoded on a background thread into a bounded queue, so memory
+stays flat however long the input is.
+
+usage example:
+    python video_normalize.py input.mp4 output.mp4 --alpha 0.1
+    python video_normalize.py "frames/*.png" out_frames/
+"""
+
+import argparse
+import glob
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Sentinel put on the queue when the decoder thread is finished
+_END = object()
+
+
+def read_frames(source):
+    """
+    Lazily read frames from a video file, an image directory or a glob pattern
+
+    Parameters:
+    source (str): Video path, directory of images, or glob pattern
+
+    Yields:
+    numpy.ndarray: BGR (or grayscale) frames
+    """
+    if os.path.isdir(source) or glob.has_magic(source):
+        pattern = os.path.join(source, '*') if os.path.isdir(source) else source
+        for path in sorted(glob.glob(pattern)):
+            frame = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if frame is not None:
+                yield frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video '{source}'")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+def prefetch_frames(frames, max_queued=8):
+    """
+    Decode frames on a background thread into a bounded queue
+
+    Parameters:
+    frames (iterable): Frame iterator (e.g. from read_frames)
+    max_queued (int): Maximum number of decoded frames held in memory
+
+    Yields:
+    numpy.ndarray: Frames in order
+    """
+    frame_queue = queue.Queue(maxsize=max_queued)
+    stop = threading.Event()
+
+    def decode():
+        try:
+            for frame in frames:
+                while not stop.is_set():
+                    try:
+                        frame_queue.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            frame_queue.put(e)
+        frame_queue.put(_END)
+
+    thread = threading.Thread(target=decode, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def frame_histogram(frame):
+    """
+    Histogram of all pixel values of a frame (all channels together)
+
+    Parameters:
+    frame (numpy.ndarray): uint8 frame
+
+    Returns:
+    numpy.ndarray: float64 histogram with 256 bins
+    """
+    channels = 1 if frame.ndim == 2 else frame.shape[2]
+    hist = np.zeros(256, dtype=np.float64)
+    for c in range(channels):
+        hist += cv2.calcHist([frame], [c], None, [256], [0, 256]).ravel()
+    return hist
+
+
+def histogram_bounds(hist, low_percentile=0.0, high_percentile=100.0):
+    """
+    Stretch bounds from a histogram
+
+    With the default percentiles these are the min and max values present;
+    higher/lower percentiles ignore outlier pixels (see ex2_06).
+
+    Parameters:
+    hist (numpy.ndarray): 256-bin histogram (may be smoothed, i.e. non-integer)
+    low_percentile (float): Percentile used as the lower bound
+    high_percentile (float): Percentile used as the upper bound
+
+    Returns:
+    tuple: (min_val, max_val)
+    """
+    cumulative = np.cumsum(hist)
+    total = cumulative[-1]
+    if total <= 0:
+        return 0, 255
+    # A (smoothed) bin counts as occupied while it holds at least half a pixel
+    epsilon = 0.5
+    low = int(np.searchsorted(cumulative, total * low_percentile / 100.0 + epsilon))
+    high = int(np.searchsorted(cumulative, total * high_percentile / 100.0 - epsilon))
+    return min(low, 255), min(high, 255)
+
+
+def normalize_lut(min_val, max_val):
+    """
+    Lookup table with the ex2_05.normalize formula for the given bounds
+
+    Values outside the bounds are clipped to 0/255.
+
+    Returns:
+    numpy.ndarray: uint8 table of 256 entries
+    """
+    values = np.arange(256, dtype=np.float32)
+    if max_val <= min_val:
+        return values.astype(np.uint8)
+    return np.clip((values - min_val) * (255.0 / (max_val - min_val)), 0, 255).astype(np.uint8)
+
+
+def normalize_stream(frames, alpha=0.1, low_percentile=0.0, high_percentile=100.0):
+    """
+    Normalize a stream of frames with temporally smoothed bounds
+
+    The running histogram is updated as smoothed = alpha * current + (1 - alpha) * smoothed,
+    so the stretch bounds follow scene changes without flickering.
+
+    Parameters:
+    frames (iterable): uint8 frames
+    alpha (float): Smoothing factor in (0, 1]; 1 means per-frame normalization
+    low_percentile (float): Lower bound percentile of the smoothed histogram
+    high_percentile (float): Upper bound percentile of the smoothed histogram
+
+    Yields:
+    numpy.ndarray: Normalized frames
+    """
+    smoothed = None
+    for frame in frames:
+        hist = frame_histogram(frame)
+        if smoothed is None:
+            smoothed = hist
+        else:
+            smoothed *= 1.0 - alpha
+            smoothed += alpha * hist
+        min_val, max_val = histogram_bounds(smoothed, low_percentile, high_percentile)
+        yield cv2.LUT(frame, normalize_lut(min_val, max_val))
+
+
+class _SequenceWriter:
+    """Writes frames as numbered images into a directory (VideoWriter-like interface)"""
+
+    def __init__(self, directory, extension='.png'):
+        self.directory = directory
+        self.extension = extension
+        self.count = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame):
+        cv2.imwrite(os.path.join(self.directory, f"frame_{self.count:06d}{self.extension}"), frame)
+        self.count += 1
+
+    def release(self):
+        pass
+
+
+def open_writer(output, frame, fps=30.0, fourcc='mp4v'):
+    """
+    Open a cv2.VideoWriter for a video path, or an image-sequence writer for a directory
+
+    Parameters:
+    output (str): Output video path, or a directory (ending in a separator or without extension)
+    frame (numpy.ndarray): First frame (gives the size and color layout)
+    fps (float): Frame rate for video outputs
+    fourcc (str): Four-character codec code for video outputs
+    """
+    if output.endswith(os.sep) or os.path.isdir(output) or not os.path.splitext(output)[1]:
+        return _SequenceWriter(output)
+    height, width = frame.shape[:2]
+    writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height),
+                             frame.ndim == 3)
+    if not writer.isOpened():
+        raise ValueError(f"Could not open video writer for '{output}'")
+    return writer
+
+
+def normalize_video(source, output, alpha=0.1, low_percentile=0.0, high_percentile=100.0,
+                    max_queued=8, fps=None, fourcc='mp4v'):
+    """
+    Normalize a video or frame sequence and write the result
+
+    Parameters:
+    source (str): Video path, directory of images, or glob pattern
+    output (str): Output video path or directory
+    alpha (float): Histogram smoothing factor
+    low_percentile (float): Lower bound percentile
+    high_percentile (float): Upper bound percentile
+    max_queued (int): Decoded frames buffered ahead of processing
+    fps (float): Output frame rate (default: the input's, or 30)
+    fourcc (str): Output codec
+
+    Returns:
+    tuple: (number of frames, seconds)
+    """
+    if fps is None:
+        fps = 30.0
+        if os.path.isfile(source):
+            capture = cv2.VideoCapture(source)
+            fps = capture.get(cv2.CAP_PROP_FPS) or fps
+            capture.release()
+
+    start = time.perf_counter()
+    writer = None
+    count = 0
+    frames = prefetch_frames(read_frames(source), max_queued)
+    try:
+        for frame in normalize_stream(frames, alpha, low_percentile, high_percentile):
+            if writer is None:
+                writer = open_writer(output, frame, fps, fourcc)
+            writer.write(frame)
+            count += 1
+    finally:
+        frames.close()
+        if writer is not None:
+            writer.release()
+    return count, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Flicker-free normalization of videos and frame sequences')
+    parser.add_argument('source', help='Input video, image directory or glob pattern')
+    parser.add_argument('output', help='Output video path or directory for an image sequence')
+    parser.add_argument('--alpha', type=float, default=0.1, help='Histogram smoothing factor (1 = per frame)')
+    parser.add_argument('--low', type=float, default=0.0, help='Lower bound percentile')
+    parser.add_argument('--high', type=float, default=100.0, help='Upper bound percentile')
+    parser.add_argument('--queue', type=int, default=8, help='Decoded frames buffered ahead')
+    parser.add_argument('--fps', type=float, default=None, help='Output frame rate')
+    parser.add_argument('--fourcc', default='mp4v', help='Output codec')
+    args = parser.parse_args(argv)
+
+    count, seconds = normalize_video(args.source, args.output, args.alpha, args.low, args.high,
+                                     args.queue, args.fps, args.fourcc)
+    print(f"Normalized {count} frames in {seconds:.2f} s ({count / max(seconds, 1e-9):.1f} fps)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+3D Lookup Tables for 8-bit Color Conversion
+===========================================
+For 8-bit RGB there are only 256^3 possible colors, so converting an image to
+HSV, HSL or YCrCb can be a table lookup instead of per-pixel arithmetic.
+
+A table is either full (every color, step 1) or subsampled on a coarser grid
+and evaluated with trilinear interpolation. Tables are built once with
+convert_color_spaces and stored as .npy files that are opened as read-only
+memory maps, so every process (e.g. every gunicorn worker) shares the same
+pages instead of building its own copy.
+
+Table sizes (float32, 3 values per entry):
+    step 1   256^3 entries  ~201 MB   exact (to float32 precision)
+    step 5    52^3 entries  ~1.7 MB   interpolated
+    step 15   18^3 entries  ~70 KB    interpolated
+
+The full table is the fast path (one gather per pixel, about 3x faster than
+convert_color_spaces); subsampled tables mainly save memory and disk, since
+the interpolation costs about as much as the direct formulas.
+
+Usage:
+    python color_luts.py --step 5          # build (or reuse) the tables
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Locking is only used to stop concurrent processes building the same table
+    fcntl = None
+
+from color_models import COLOR_SPACES, convert_color_spaces
+
+
+DEFAULT_LUT_DIR = os.environ.get('COLOR_LUT_DIR', os.path.join(tempfile.gettempdir(), 'color_luts'))
+
+# Grid steps must divide 255 so that both 0 and 255 are grid points
+VALID_STEPS = (1, 3, 5, 15, 17, 51, 85)
+
+# Spaces whose first channel is a hue in degrees (interpolated around the circle)
+HUE_SPACES = ('hsv', 'hsl')
+
+# Pixels interpolated per block in convert_with_lut
+BLOCK_PIXELS = 1 << 14
+
+# Tables already opened by this process: (directory, space, step) -> memmap
+_open_luts = {}
+
+
+def lut_path(space, step=1, lut_dir=DEFAULT_LUT_DIR):
+    """Path of the table file for a color space and grid step"""
+    return os.path.join(lut_dir, f"rgb_to_{space}_step{step}.npy")
+
+
+def build_color_lut(space, step=1):
+    """
+    Evaluate a conversion on the RGB grid.
+
+    Args:
+        space (str): 'hsv', 'hsl' or 'ycrcb'
+        step (int): Grid spacing in RGB levels (one of VALID_STEPS)
+
+    Returns:
+        numpy.ndarray: (n, n, n, 3) float32 table indexed by [r, g, b] grid position
+    """
+    if space not in COLOR_SPACES:
+        raise ValueError(f"Unknown color space '{space}'")
+    if step not in VALID_STEPS:
+        raise ValueError(f"step must be one of {VALID_STEPS}")
+
+    levels = np.arange(0, 256, step, dtype=np.uint8)
+    n = len(levels)
+    lut = np.empty((n, n, n, 3), dtype=np.float32)
+    grid = np.empty((n, n, 3), dtype=np.uint8)
+    grid[..., 1] = levels[:, np.newaxis]
+    grid[..., 2] = levels[np.newaxis, :]
+    # One red level at a time keeps the float64 temporaries small
+    for i, red in enumerate(levels):
+        grid[..., 0] = red
+        lut[i] = convert_color_spaces(grid, (space,))[space]
+    return lut
+
+
+def load_color_lut(space, step=1, lut_dir=DEFAULT_LUT_DIR):
+    """
+    Open a table as a read-only memory map, building and saving it on first use.
+
+    The file is written under a temporary name and renamed into place, and a
+    lock file stops concurrently starting processes from building the same
+    table twice (they wait and then map the finished file).
+
+    Returns:
+        numpy.memmap: (n, n, n, 3) float32 table
+    """
+    key = (os.path.abspath(lut_dir), space, step)
+    lut = _open_luts.get(key)
+    if lut is not None:
+        return lut
+
+    path = lut_path(space, step, lut_dir)
+    if not os.path.exists(path):
+        os.makedirs(lut_dir, exist_ok=True)
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_file = open(path + '.lock', 'w')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have built the table while we waited
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, build_color_lut(space, step))
+                os.replace(tmp_path, path)
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    lut = np.load(path, mmap_mode='r')
+    _open_luts[key] = lut
+    return lut
+
+
+def _trilinear(flat, n, step, pixels, hue, out):
+    """
+    Trilinear interpolation of a flattened (n^3, 3) table for a block of pixels
+
+    Args:
+        flat (numpy.ndarray): Table reshaped to (n^3, 3)
+        n (int): Grid points per axis
+        step (int): Grid step in RGB levels
+        pixels (numpy.ndarray): (M, 3) uint8 RGB values
+        hue (bool): The first channel is a hue in degrees
+        out (numpy.ndarray): (M, 3) float32 output
+    """
+    base = np.zeros(len(pixels), dtype=np.intp)
+    fractions = []
+    for c in range(3):
+        values = pixels[:, c].astype(np.intp)
+        index = np.minimum(values // step, n - 2)
+        fraction = (values - index * step).astype(np.float32)
+        fraction /= step
+        fractions.append(fraction[:, np.newaxis])
+        base *= n
+        base += index
+    rf, gf, bf = fractions
+
+    corners = [np.take(flat, base + ((dr * n + dg) * n + db), axis=0)
+               for dr in (0, 1) for dg in (0, 1) for db in (0, 1)]
+    if hue:
+        # Move each corner hue within 180 degrees of the first corner so cells
+        # straddling red (0/360) do not blend towards cyan
+        reference = corners[0][:, 0]
+        for corner in corners[1:]:
+            corner[:, 0] -= 360 * np.round((corner[:, 0] - reference) / 360)
+
+    def lerp(a, b, fraction):
+        b -= a
+        b *= fraction
+        b += a
+        return b
+
+    # Interpolate along blue, then green, then red
+    c00, c01, c10, c11 = (lerp(corners[k], corners[k + 1], bf) for k in range(0, 8, 2))
+    c0, c1 = lerp(c00, c01, gf), lerp(c10, c11, gf)
+    out[...] = lerp(c0, c1, rf)
+    if hue:
+        np.mod(out[:, 0], 360, out=out[:, 0])
+    return out
+
+
+def convert_with_lut(rgb, space, step=1, lut_dir=DEFAULT_LUT_DIR, out=None):
+    """
+    Convert an 8-bit RGB image through a 3D lookup table.
+
+    With step 1 this is a single gather from the full table; coarser steps
+    interpolate trilinearly between the 8 surrounding grid points (exact for
+    YCrCb, which is linear, and an approximation for HSV/HSL).
+
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) uint8 RGB image
+        space (str): 'hsv', 'hsl' or 'ycrcb'
+        step (int): Grid step of the table to use
+        lut_dir (str): Directory holding the table files
+        out (numpy.ndarray): Optional (H, W, 3) float32 output array
+
+    Returns:
+        numpy.ndarray: (H, W, 3) float32 array laid out like convert_color_spaces
+    """
+    rgb = np.asarray(rgb)
+    if rgb.dtype != np.uint8:
+        raise ValueError("Lookup-table conversion needs uint8 RGB input")
+    lut = load_color_lut(space, step, lut_dir)
+    if out is None:
+        out = np.empty(rgb.shape, dtype=np.float32)
+
+    if step == 1:
+        red, green, blue = (rgb[..., c].astype(np.intp) for c in range(3))
+        index = red
+        index <<= 16
+        index |= green << 8
+        index |= blue
+        return np.take(lut.reshape(-1, 3), index, axis=0, out=out)
+
+    # Interpolate in blocks so the per-corner temporaries stay cache-sized
+    flat = lut.reshape(-1, 3)
+    pixels = rgb.reshape(-1, 3)
+    out_pixels = out.reshape(-1, 3)
+    for start in range(0, len(pixels), BLOCK_PIXELS):
+        block = slice(start, start + BLOCK_PIXELS)
+        _trilinear(flat, lut.shape[0], step, pixels[block], space in HUE_SPACES, out_pixels[block])
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the 3D color conversion lookup tables')
+    parser.add_argument('--step', type=int, default=1, choices=VALID_STEPS,
+                        help='Grid step in RGB levels (1 = full table)')
+    parser.add_argument('--spaces', nargs='+', default=list(COLOR_SPACES), choices=COLOR_SPACES)
+    parser.add_argument('--lut-dir', default=DEFAULT_LUT_DIR)
+    args = parser.parse_args(argv)
+
+    for space in args.spaces:
+        start = time.perf_counter()
+        lut = load_color_lut(space, args.step, args.lut_dir)
+        print(f"{space:6s} {lut.shape} {lut.nbytes / 1e6:8.1f} MB  "
+              f"{time.perf_counter() - start:6.2f} s  {lut.filename}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
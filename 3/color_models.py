@@ -6,15 +6,34 @@ It implements both manual calculations and OpenCV's built-in functions for compa
 
 Usage:
     python color_models.py R G B
+    python color_models.py --bulk [INPUT] [options]
     
 Example:
     python color_models.py 255 128 64
+    python color_models.py --bulk palette.csv -o converted.csv --spaces hsv ycrcb
+    cat colors.bin | python color_models.py --bulk --input-format binary --workers 4 > out.csv
 """
 
+import argparse
+import os
 import sys
-import cv2
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 
+try:
+    import cv2
+except ImportError:
+    # OpenCV is only needed for the comparison printed by the command-line tool
+    cv2 = None
+
+# The compiled per-pixel kernel lives with the other optional Numba kernels in the 1 folder;
+# without Numba (JIT_AVAILABLE False) convert_color_spaces runs on whole-array NumPy operations
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '1'))
+import jit_kernels
+from jit_kernels import JIT_AVAILABLE
+
 
 def rgb_to_hsv_manual(r, g, b):
     """
@@ -133,10 +152,389 @@ def rgb_to_ycrcb_manual(r, g, b):
     return y, cr, cb
 
 
+# Color spaces produced by convert_color_spaces
+COLOR_SPACES = ('hsv', 'hsl', 'ycrcb')
+
+# Fixed-point YCrCb coefficients (scaled by 2^14, as in OpenCV's integer path)
+YCRCB_SHIFT = 14
+YCRCB_Y_COEFFS = (4899, 9617, 1868)  # 0.299, 0.587, 0.114
+YCRCB_CR_COEFF = 11682               # 0.713
+YCRCB_CB_COEFF = 9241                # 0.564
+
+# Pixels converted per block by rgb_to_ycrcb_fixed (keeps the int32 temporaries cache-sized)
+FIXED_POINT_BLOCK_PIXELS = 1 << 16
+
+
+def _hue_into(h, r, g, b, cmax, delta):
+    """
+    Fill h with the hue in degrees, using the same branch order as the scalar
+    versions (delta == 0, then cmax == r, then cmax == g, otherwise b)
+    """
+    # Avoid division by zero; those pixels take the delta == 0 branch anyway
+    safe_delta = np.where(delta == 0, 1.0, delta)
+
+    # cmax == b branch everywhere, then overwrite with the higher-priority branches
+    np.subtract(r, g, out=h)
+    h /= safe_delta
+    h += 4
+    h *= 60
+
+    mask = cmax == g
+    h[mask] = 60 * (((b[mask] - r[mask]) / safe_delta[mask]) + 2)
+    mask = cmax == r
+    h[mask] = 60 * (((g[mask] - b[mask]) / safe_delta[mask]) % 6)
+    h[delta == 0] = 0
+    return h
+
+
+def convert_color_spaces(rgb, spaces=COLOR_SPACES, out=None, jit=None):
+    """
+    Convert a whole RGB image to several color spaces in one pass.
+    
+    The normalization, cmax, cmin, delta and hue are computed once and shared
+    by HSV and HSL; results are identical to the scalar *_manual functions.
+    
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) array with RGB values in 0-255
+        spaces (iterable): Any subset of 'hsv', 'hsl', 'ycrcb'
+        out (dict): Optional preallocated (H, W, 3) float64 arrays keyed by space name
+        jit (bool): Use the Numba kernel (None = when Numba is installed, False = NumPy only)
+    
+    Returns:
+        dict: Space name -> (H, W, 3) float64 array, laid out like the
+            tuples returned by the scalar functions
+    """
+    spaces = [space.lower() for space in spaces]
+    unknown = set(spaces) - set(COLOR_SPACES)
+    if unknown:
+        raise ValueError(f"Unknown color spaces: {', '.join(sorted(unknown))}")
+
+    rgb = np.asarray(rgb)
+    results = dict(out or {})
+    for space in spaces:
+        if space not in results:
+            results[space] = np.empty(rgb.shape, dtype=np.float64)
+
+    if jit and not JIT_AVAILABLE:
+        raise RuntimeError('Numba is not available (or disabled with JIT_KERNELS=0)')
+    if JIT_AVAILABLE if jit is None else jit:
+        # One pass per pixel instead of a dozen whole-array temporaries; needs outputs
+        # that can be viewed as (N, 3), so non-contiguous out= arrays take the NumPy path
+        if all(results[space].flags.c_contiguous for space in spaces):
+            unused = np.empty((0, 3), dtype=np.float64)
+            views = [results[space].reshape(-1, 3) if space in spaces else unused for space in COLOR_SPACES]
+            jit_kernels.color_spaces(rgb.reshape(-1, 3), *views, *(space in spaces for space in COLOR_SPACES))
+            return {space: results[space] for space in spaces}
+
+    if 'ycrcb' in spaces:
+        rgb_float = rgb.astype(np.float64, copy=False)
+        red, green, blue = rgb_float[..., 0], rgb_float[..., 1], rgb_float[..., 2]
+        ycrcb = results['ycrcb']
+        y, cr, cb = ycrcb[..., 0], ycrcb[..., 1], ycrcb[..., 2]
+        np.multiply(red, 0.299, out=y)
+        y += 0.587 * green
+        y += 0.114 * blue
+        np.subtract(red, y, out=cr)
+        cr *= 0.713
+        cr += 128
+        np.subtract(blue, y, out=cb)
+        cb *= 0.564
+        cb += 128
+
+    hue_spaces = [space for space in spaces if space in ('hsv', 'hsl')]
+    if hue_spaces:
+        normalized = rgb / 255
+        r, g, b = normalized[..., 0], normalized[..., 1], normalized[..., 2]
+        cmax = np.maximum(np.maximum(r, g), b)
+        cmin = np.minimum(np.minimum(r, g), b)
+        delta = cmax - cmin
+
+        # Hue is computed once into the first requested space and copied to the other
+        hue = _hue_into(results[hue_spaces[0]][..., 0], r, g, b, cmax, delta)
+        for space in hue_spaces[1:]:
+            results[space][..., 0] = hue
+
+        if 'hsv' in spaces:
+            hsv = results['hsv']
+            np.divide(delta, np.where(cmax == 0, 1.0, cmax), out=hsv[..., 1])
+            hsv[..., 1][cmax == 0] = 0
+            hsv[..., 2] = cmax
+
+        if 'hsl' in spaces:
+            hsl = results['hsl']
+            l = hsl[..., 2]
+            np.add(cmax, cmin, out=l)
+            l /= 2
+            denominator = 1 - np.abs(2 * l - 1)
+            denominator[delta == 0] = 1.0
+            np.divide(delta, denominator, out=hsl[..., 1])
+            hsl[..., 1][delta == 0] = 0
+
+    return {space: results[space] for space in spaces}
+
+
+def rgb_to_hsv_array(rgb):
+    """
+    Convert a whole RGB image to HSV (array version of rgb_to_hsv_manual).
+    
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) array with RGB values in 0-255
+    
+    Returns:
+        numpy.ndarray: (H, W, 3) float64 array of (h, s, v) with
+            h in 0-360 degrees and s, v in 0-1
+    """
+    return convert_color_spaces(rgb, ('hsv',))['hsv']
+
+
+def rgb_to_hsl_array(rgb):
+    """
+    Convert a whole RGB image to HSL (array version of rgb_to_hsl_manual).
+    
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) array with RGB values in 0-255
+    
+    Returns:
+        numpy.ndarray: (H, W, 3) float64 array of (h, s, l) with
+            h in 0-360 degrees and s, l in 0-1
+    """
+    return convert_color_spaces(rgb, ('hsl',))['hsl']
+
+
+def rgb_to_ycrcb_array(rgb):
+    """
+    Convert a whole RGB image to YCrCb (array version of rgb_to_ycrcb_manual).
+    
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) array with RGB values in 0-255
+    
+    Returns:
+        numpy.ndarray: (H, W, 3) float64 array of (y, cr, cb)
+    """
+    return convert_color_spaces(rgb, ('ycrcb',))['ycrcb']
+
+
+def rgb_to_ycrcb_fixed(rgb, out=None):
+    """
+    Convert a uint8 RGB image to uint8 YCrCb with integer fixed-point arithmetic.
+    
+    Coefficients are scaled by 2^14 and each result is rounded by adding half
+    before the shift (as libjpeg does). Y is rounded before it is used for Cr
+    and Cb, which makes the output identical to
+    cv2.cvtColor(bgr, cv2.COLOR_BGR2YCrCb) for every 8-bit color.
+    
+    Args:
+        rgb (numpy.ndarray): (H, W, 3) uint8 array with RGB values
+        out (numpy.ndarray): Optional (H, W, 3) uint8 output array (any strides)
+    
+    Returns:
+        numpy.ndarray: (H, W, 3) uint8 array of (y, cr, cb)
+    """
+    rgb = np.asarray(rgb)
+    if rgb.dtype != np.uint8:
+        raise ValueError("Fixed-point conversion needs uint8 RGB input")
+    if out is None:
+        out = np.empty(rgb.shape, dtype=np.uint8)
+    elif out.shape != rgb.shape or out.dtype != np.uint8:
+        raise ValueError("out must be a uint8 array with the shape of the input")
+    
+    # reshape() of a non-contiguous out would be a copy, so convert into a
+    # contiguous scratch array and copy the result into out at the end
+    target = out if out.flags.c_contiguous else np.empty(rgb.shape, dtype=np.uint8)
+    half = 1 << (YCRCB_SHIFT - 1)
+    offset = (128 << YCRCB_SHIFT) + half
+    pixels = rgb.reshape(-1, 3)
+    out_pixels = target.reshape(-1, 3)
+    for start in range(0, len(pixels), FIXED_POINT_BLOCK_PIXELS):
+        block = slice(start, start + FIXED_POINT_BLOCK_PIXELS)
+        r, g, b = (pixels[block, c].astype(np.int32) for c in range(3))
+        
+        y = r * YCRCB_Y_COEFFS[0]
+        y += g * YCRCB_Y_COEFFS[1]
+        y += b * YCRCB_Y_COEFFS[2]
+        y += half
+        y >>= YCRCB_SHIFT
+        out_pixels[block, 0] = y
+        
+        # Cr and Cb reuse the r and b temporaries
+        for plane, (diff, coeff) in ((1, (r, YCRCB_CR_COEFF)), (2, (b, YCRCB_CB_COEFF))):
+            diff -= y
+            diff *= coeff
+            diff += offset
+            diff >>= YCRCB_SHIFT
+            np.clip(diff, 0, 255, out=diff)
+            out_pixels[block, plane] = diff
+    if target is not out:
+        out[...] = target
+    return out
+
+
+# Colors converted per chunk in bulk mode
+BULK_CHUNK_COLORS = 1 << 18
+
+
+def read_rgb_chunks(stream, input_format='csv', chunk_colors=BULK_CHUNK_COLORS):
+    """
+    Read RGB triples from a binary stream in chunks.
+    
+    CSV input has one "r,g,b" (or whitespace-separated) triple per line; a
+    first line that is not numeric is treated as a header and skipped. Binary
+    input is raw uint8 triples.
+    
+    Args:
+        stream: Binary file object (e.g. sys.stdin.buffer)
+        input_format (str): 'csv' or 'binary'
+        chunk_colors (int): Maximum colors per chunk
+    
+    Yields:
+        numpy.ndarray: (N, 3) uint8 arrays of RGB values
+    """
+    if input_format == 'binary':
+        while True:
+            data = stream.read(chunk_colors * 3)
+            if not data:
+                return
+            if len(data) % 3:
+                raise ValueError("Binary input length is not a multiple of 3 bytes")
+            yield np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+    
+    pending = b''
+    first = True
+    while True:
+        data = stream.read(chunk_colors * 12)
+        block = pending + data
+        if data:
+            # Only parse complete lines; the remainder is carried to the next chunk
+            cut = block.rfind(b'\n') + 1
+            block, pending = block[:cut], block[cut:]
+        if first and block:
+            first = False
+            header, _, rest = block.partition(b'\n')
+            if any(c.isalpha() for c in header.decode('utf-8', 'replace')):
+                block = rest
+        
+        rows = [line.split() for line in block.replace(b',', b' ').splitlines() if line.strip()]
+        if rows:
+            for row in rows:
+                if len(row) != 3:
+                    raise ValueError(f"Every input line must hold exactly three integers (r, g, b), "
+                                     f"got '{b' '.join(row).decode('ascii', 'replace')}'")
+            try:
+                values = np.array(rows).astype(np.int64)
+            except ValueError:
+                raise ValueError("RGB values must be integers") from None
+            if values.min() < 0 or values.max() > 255:
+                raise ValueError("RGB values must be in range 0-255")
+            yield values.astype(np.uint8).reshape(-1, 3)
+        if not data:
+            return
+
+
+def bulk_header(spaces):
+    """CSV header line for the given color spaces"""
+    names = {'hsv': ('h', 's', 'v'), 'hsl': ('h', 's', 'l'), 'ycrcb': ('y', 'cr', 'cb')}
+    columns = ['r', 'g', 'b'] + [f"{space}_{name}" for space in spaces for name in names[space]]
+    return (','.join(columns) + '\n').encode('ascii')
+
+
+def convert_rgb_chunk(rgb, spaces=COLOR_SPACES, output_format='csv'):
+    """
+    Convert an (N, 3) chunk of RGB triples and encode the result.
+    
+    CSV rows hold the input r, g, b followed by the channels of each space;
+    binary rows hold only the converted channels as little-endian float32.
+    
+    Returns:
+        bytes: Encoded rows
+    """
+    planes = convert_color_spaces(rgb[np.newaxis], spaces)
+    converted = np.concatenate([planes[space][0] for space in spaces], axis=1)
+    if output_format == 'binary':
+        return converted.astype('<f4').tobytes()
+    
+    # One %-format per row over plain Python values is much faster than np.savetxt
+    row_format = ','.join(['%d'] * 3 + ['%.6g'] * converted.shape[1])
+    columns = [column.tolist() for column in rgb.T] + [column.tolist() for column in converted.T]
+    return ''.join([row_format % row + '\n' for row in zip(*columns)]).encode('ascii')
+
+
+def bulk_convert(input_stream, output_stream, spaces=COLOR_SPACES, input_format='csv',
+                 output_format='csv', workers=1, chunk_colors=BULK_CHUNK_COLORS):
+    """
+    Stream RGB triples through the vectorized converter.
+    
+    Chunks are converted in order and written as soon as they are ready. With
+    several workers, at most 2 * workers chunks are in flight, so memory use
+    does not depend on the input size.
+    
+    Returns:
+        int: Number of colors converted
+    """
+    spaces = tuple(spaces)
+    if output_format == 'csv':
+        output_stream.write(bulk_header(spaces))
+    
+    count = 0
+    chunks = read_rgb_chunks(input_stream, input_format, chunk_colors)
+    if workers <= 1:
+        for rgb in chunks:
+            output_stream.write(convert_rgb_chunk(rgb, spaces, output_format))
+            count += len(rgb)
+        return count
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for rgb in chunks:
+            if len(pending) >= 2 * workers:
+                output_stream.write(pending.popleft().result())
+            pending.append(pool.submit(convert_rgb_chunk, rgb, spaces, output_format))
+            count += len(rgb)
+        while pending:
+            output_stream.write(pending.popleft().result())
+    return count
+
+
+def bulk_main(argv):
+    """Command-line entry point for --bulk"""
+    parser = argparse.ArgumentParser(prog='color_models.py --bulk',
+                                     description='Convert many RGB triples in one run')
+    parser.add_argument('input', nargs='?', default='-', help='Input file (default: stdin)')
+    parser.add_argument('-o', '--output', default='-', help='Output file (default: stdout)')
+    parser.add_argument('--spaces', nargs='+', choices=COLOR_SPACES, default=list(COLOR_SPACES))
+    parser.add_argument('--input-format', choices=('csv', 'binary'), default='csv')
+    parser.add_argument('--output-format', choices=('csv', 'binary'), default='csv',
+                        help='binary writes float32 rows of the converted channels only')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes')
+    parser.add_argument('--chunk', type=int, default=BULK_CHUNK_COLORS, help='Colors per chunk')
+    args = parser.parse_args(argv)
+    
+    input_stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    output_stream = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        count = bulk_convert(input_stream, output_stream, args.spaces, args.input_format,
+                             args.output_format, args.workers, args.chunk)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if input_stream is not sys.stdin.buffer:
+            input_stream.close()
+        if output_stream is not sys.stdout.buffer:
+            output_stream.close()
+        else:
+            output_stream.flush()
+    print(f"Converted {count} colors", file=sys.stderr)
+    return 0
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--bulk':
+        sys.exit(bulk_main(sys.argv[2:]))
+    
     # Validate command line arguments
     if len(sys.argv) < 4:
         print("Usage: python color_models.py R G B")
+        print("       python color_models.py --bulk [INPUT] [options]")
         print("Example: python color_models.py 255 128 64")
         sys.exit(1)
     
@@ -165,7 +563,14 @@ if __name__ == "__main__":
     y, cr, cb = rgb_to_ycrcb_manual(R, G, B)
     print(f"YCrCb: Y={y:.2f}, Cr={cr:.2f}, Cb={cb:.2f}")
     
+    y, cr, cb = rgb_to_ycrcb_fixed(np.uint8([[[R, G, B]]]))[0][0]
+    print(f"YCrCb (fixed-point): Y={y}, Cr={cr}, Cb={cb}")
+    
     # ============ OpenCV Implementations ============
+    if cv2 is None:
+        print("\nOpenCV is not installed; skipping the comparison with cv2.cvtColor")
+        sys.exit(0)
+    
     print("\nOpenCV Built-in Functions:")
     print("-" * 60)
     
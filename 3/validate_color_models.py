@@ -0,0 +1,238 @@
+"""
+Color Conversion Validation
+===========================
+Sweeps every 8-bit RGB color (256^3 = 16.7M) in chunks through each converter
+and compares the result with cv2.cvtColor (COLOR_BGR2HSV, COLOR_BGR2HLS and
+COLOR_BGR2YCrCb). For each converter and channel it reports the maximum and
+mean absolute error, a histogram of the errors, and the conversion speed.
+
+Errors are measured in OpenCV's 8-bit units: hue in 0-180 (compared around
+the circle), the other channels in 0-255.
+
+Converters:
+    manual      rgb_to_*_manual, one color at a time (sampled, see --manual-stride)
+    vectorized  convert_color_spaces (NumPy path)
+    jit         convert_color_spaces with the Numba kernel (when installed); also
+                counts values that differ from the NumPy path at all
+    lut         convert_with_lut (full table, or --lut-step)
+    fixed       rgb_to_ycrcb_fixed (YCrCb only)
+
+Usage:
+    python validate_color_models.py
+    python validate_color_models.py --converters vectorized fixed --json report.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_models import (JIT_AVAILABLE, convert_color_spaces, rgb_to_hsv_manual, rgb_to_hsl_manual,
+                          rgb_to_ycrcb_manual, rgb_to_ycrcb_fixed)
+from color_luts import DEFAULT_LUT_DIR, convert_with_lut
+
+
+CONVERTERS = ('manual', 'vectorized', 'jit', 'lut', 'fixed')
+
+# OpenCV code for each space; cv2 gives HLS where we produce HSL
+CV2_CODES = {'hsv': cv2.COLOR_BGR2HSV, 'hsl': cv2.COLOR_BGR2HLS, 'ycrcb': cv2.COLOR_BGR2YCrCb}
+
+CHANNEL_NAMES = {'hsv': ('H', 'S', 'V'), 'hsl': ('H', 'S', 'L'), 'ycrcb': ('Y', 'Cr', 'Cb')}
+
+# Upper edges of the error histogram bins (OpenCV units); the last bin is open
+ERROR_BINS = (0.0, 0.5, 1.0, 2.0, 4.0, 8.0)
+
+# Colors per chunk (as a 1024 x 1024 image)
+CHUNK_ROWS = 1024
+CHUNK_COLS = 1024
+
+
+def color_chunks(stride=1):
+    """
+    Every stride-th 8-bit RGB color, in order, as (rows, CHUNK_COLS, 3) uint8 images
+
+    The final chunk may be a single partial row when the count is not a
+    multiple of CHUNK_COLS.
+    """
+    chunk = CHUNK_ROWS * CHUNK_COLS * stride
+    for start in range(0, 1 << 24, chunk):
+        codes = np.arange(start, min(start + chunk, 1 << 24), stride, dtype=np.uint32)
+        rgb = np.empty((len(codes), 3), dtype=np.uint8)
+        rgb[:, 0] = codes >> 16
+        rgb[:, 1] = (codes >> 8) & 255
+        rgb[:, 2] = codes & 255
+        if len(codes) % CHUNK_COLS:
+            yield rgb[np.newaxis]
+        else:
+            yield rgb.reshape(-1, CHUNK_COLS, 3)
+
+
+def to_opencv_units(space, result):
+    """
+    Rescale a converter's (H, W, 3) output to OpenCV's 8-bit channel order and units
+
+    Returns:
+        numpy.ndarray: float64 array laid out like cv2.cvtColor's output
+    """
+    result = result.astype(np.float64)
+    if space == 'ycrcb':
+        return result
+    scaled = np.empty_like(result)
+    scaled[..., 0] = result[..., 0] / 2
+    if space == 'hsv':
+        scaled[..., 1:] = result[..., 1:] * 255
+    else:
+        # HSL (h, s, l) -> HLS (h, l, s)
+        scaled[..., 1] = result[..., 2] * 255
+        scaled[..., 2] = result[..., 1] * 255
+    return scaled
+
+
+def _manual(space, rgb):
+    """Run the scalar converter over every pixel of a chunk"""
+    convert = {'hsv': rgb_to_hsv_manual, 'hsl': rgb_to_hsl_manual, 'ycrcb': rgb_to_ycrcb_manual}[space]
+    pixels = rgb.reshape(-1, 3).tolist()
+    return np.array([convert(r, g, b) for r, g, b in pixels], dtype=np.float64).reshape(rgb.shape)
+
+
+def converter_functions(lut_step=1, lut_dir=DEFAULT_LUT_DIR):
+    """
+    Converter name -> space -> function(rgb chunk) returning an (H, W, 3) result
+    """
+    return {
+        'manual': {space: (lambda rgb, space=space: _manual(space, rgb)) for space in CV2_CODES},
+        'vectorized': {space: (lambda rgb, space=space: convert_color_spaces(rgb, (space,), jit=False)[space])
+                       for space in CV2_CODES},
+        'jit': {space: (lambda rgb, space=space: convert_color_spaces(rgb, (space,), jit=True)[space])
+                for space in CV2_CODES} if JIT_AVAILABLE else {},
+        'lut': {space: (lambda rgb, space=space: convert_with_lut(rgb, space, lut_step, lut_dir))
+                for space in CV2_CODES},
+        'fixed': {'ycrcb': rgb_to_ycrcb_fixed},
+    }
+
+
+class ErrorStats:
+    """Running per-channel error statistics over many chunks"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max = np.zeros(3)
+        self.sum = np.zeros(3)
+        self.histogram = np.zeros((3, len(ERROR_BINS) + 1), dtype=np.int64)
+        # Values differing from the NumPy path (only counted for the jit converter)
+        self.mismatches = None
+
+    def update(self, error, seconds):
+        error = error.reshape(-1, 3)
+        self.count += len(error)
+        self.seconds += seconds
+        np.maximum(self.max, error.max(axis=0), out=self.max)
+        self.sum += error.sum(axis=0)
+        for c in range(3):
+            self.histogram[c] += np.bincount(np.searchsorted(ERROR_BINS, error[:, c]),
+                                             minlength=len(ERROR_BINS) + 1)
+
+    def as_dict(self, space):
+        extra = {} if self.mismatches is None else {'mismatches_vs_vectorized': self.mismatches}
+        return {
+            **extra,
+            'colors': self.count,
+            'megapixels_per_second': self.count / 1e6 / max(self.seconds, 1e-9),
+            'channels': {
+                name: {
+                    'max_error': float(self.max[c]),
+                    'mean_error': float(self.sum[c] / max(self.count, 1)),
+                    'histogram': self.histogram[c].tolist(),
+                }
+                for c, name in enumerate(CHANNEL_NAMES[space])
+            },
+        }
+
+
+def validate(converters=CONVERTERS, spaces=tuple(CV2_CODES), manual_stride=64, lut_step=1,
+             lut_dir=DEFAULT_LUT_DIR, verbose=True):
+    """
+    Compare converters against OpenCV over the full 8-bit RGB cube
+
+    Args:
+        converters: Converter names (see CONVERTERS)
+        spaces: Color spaces to check ('hsv', 'hsl', 'ycrcb')
+        manual_stride: Check every n-th color with the scalar converters (1 = all)
+        lut_step: Grid step of the lookup tables
+        lut_dir: Directory holding the lookup tables
+        verbose: Print progress
+
+    Returns:
+        dict: converter -> space -> statistics (see ErrorStats.as_dict)
+    """
+    functions = converter_functions(lut_step, lut_dir)
+    report = {}
+    for name in converters:
+        stride = manual_stride if name == 'manual' else 1
+        for space in spaces:
+            convert = functions[name].get(space)
+            if convert is None:
+                continue
+            stats = ErrorStats()
+            for rgb in color_chunks(stride):
+                reference = cv2.cvtColor(np.ascontiguousarray(rgb[..., ::-1]), CV2_CODES[space])
+                start = time.perf_counter()
+                result = convert(rgb)
+                seconds = time.perf_counter() - start
+
+                error = np.abs(to_opencv_units(space, result) - reference)
+                if space != 'ycrcb':
+                    np.minimum(error[..., 0], 180 - error[..., 0], out=error[..., 0])
+                stats.update(error, seconds)
+                if name == 'jit':
+                    expected = convert_color_spaces(rgb, (space,), jit=False)[space]
+                    stats.mismatches = (stats.mismatches or 0) + int(np.count_nonzero(result != expected))
+            report.setdefault(name, {})[space] = stats.as_dict(space)
+            if verbose:
+                print(f"checked {name:10s} {space:5s} ({stats.count} colors, {stats.seconds:.1f} s)",
+                      file=sys.stderr)
+    return report
+
+
+def print_report(report):
+    """Print the validation report as a table"""
+    edges = [f"<={edge:g}" for edge in ERROR_BINS] + [f">{ERROR_BINS[-1]:g}"]
+    print(f"{'converter':10s} {'space':6s} {'ch':3s} {'max':>8s} {'mean':>9s} {'MP/s':>8s}  "
+          + ' '.join(f"{edge:>8s}" for edge in edges))
+    print('-' * (50 + 9 * len(edges)))
+    for name, spaces in report.items():
+        for space, stats in spaces.items():
+            for channel, values in stats['channels'].items():
+                percentages = np.array(values['histogram']) * 100 / max(stats['colors'], 1)
+                print(f"{name:10s} {space:6s} {channel:3s} {values['max_error']:8.3f} "
+                      f"{values['mean_error']:9.5f} {stats['megapixels_per_second']:8.1f}  "
+                      + ' '.join(f"{p:7.3f}%" for p in percentages))
+            if 'mismatches_vs_vectorized' in stats:
+                print(f"{name:10s} {space:6s} values differing from vectorized: {stats['mismatches_vs_vectorized']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate color conversions against OpenCV over all 8-bit colors')
+    parser.add_argument('--converters', nargs='+', choices=CONVERTERS, default=list(CONVERTERS))
+    parser.add_argument('--spaces', nargs='+', choices=tuple(CV2_CODES), default=list(CV2_CODES))
+    parser.add_argument('--manual-stride', type=int, default=64,
+                        help='Check every n-th color with the scalar converters (1 = all, ~1 min per space)')
+    parser.add_argument('--lut-step', type=int, default=1, help='Grid step of the lookup tables')
+    parser.add_argument('--lut-dir', default=DEFAULT_LUT_DIR)
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    report = validate(args.converters, args.spaces, args.manual_stride, args.lut_step, args.lut_dir)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
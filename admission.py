@@ -0,0 +1,181 @@
+"""
+Admission control for expensive requests
+
+Each worker process runs a fixed number of processing slots. Requests that
+find all slots busy wait in a weighted fair queue (start-time fair queuing):
+every client gets an equal share of processing time regardless of how many
+or how large its requests are, so one client uploading huge images cannot
+starve the others.
+
+Requests are turned away early instead of queueing indefinitely:
+    429  the client already has per_client_limit requests running or queued
+    503  the request would have to queue, and the estimated wait plus its own
+         processing time exceeds the latency SLO (or it waited longer than the SLO)
+Both carry a Retry-After estimate.
+
+Costs are estimates in seconds; a running correction factor learned from
+actual processing times keeps the wait estimates calibrated.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted"""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Per-process admission control with a weighted fair queue
+
+    Args:
+        slots: Requests processed at the same time
+        per_client_limit: Maximum running + queued requests per client
+        slo_seconds: Latency objective; requests expected to exceed it are shed
+        client_weights: Optional client -> weight (larger weights get a larger share)
+    """
+
+    def __init__(self, slots=2, per_client_limit=4, slo_seconds=15.0, client_weights=None):
+        self.slots = slots
+        self.per_client_limit = per_client_limit
+        self.slo_seconds = slo_seconds
+        self.client_weights = client_weights or {}
+
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._running_cost = 0.0
+        self._queued_cost = 0.0
+        self._client_requests = {}
+        self._client_finish = {}
+        self._virtual_time = 0.0
+        # Actual seconds per estimated second (exponential moving average)
+        self._correction = 1.0
+        self._stats = {'admitted': 0, 'queued': 0, 'shed': 0, 'rejected_client_limit': 0,
+                       'shed_after_waiting': 0, 'completed': 0}
+        self._total_wait = 0.0
+
+    def _estimated_wait(self):
+        """Seconds until a newly queued request would start (assuming FIFO over all work)"""
+        backlog = self._queued_cost + self._running_cost
+        if self._running < self.slots and not self._queue:
+            return 0.0
+        return backlog * self._correction / self.slots
+
+    def _reject(self, status, retry_after, reason, counter):
+        self._stats[counter] += 1
+        raise Overloaded(status, max(1, math.ceil(retry_after)), reason)
+
+    @contextmanager
+    def admit(self, client, cost):
+        """
+        Hold a processing slot for the duration of the with-block
+
+        Args:
+            client: Client identifier (e.g. remote address)
+            cost: Estimated processing time in seconds
+
+        Raises:
+            Overloaded: The request was rejected or shed
+        """
+        with self._cond:
+            if self._client_requests.get(client, 0) >= self.per_client_limit:
+                self._reject(429, self._estimated_wait(), 'Too many concurrent requests from this client',
+                             'rejected_client_limit')
+            wait = self._estimated_wait()
+            # Requests that can start right away are always admitted, however large
+            if wait > 0 and wait + cost * self._correction > self.slo_seconds:
+                self._reject(503, wait, 'Server is overloaded, please retry later', 'shed')
+
+            # Start-time fair queuing: tags advance by cost / weight per client
+            weight = self.client_weights.get(client, 1.0)
+            start_tag = max(self._virtual_time, self._client_finish.get(client, 0.0))
+            self._client_finish[client] = start_tag + cost / weight
+            entry = [start_tag, next(self._sequence), cost, False]
+            heapq.heappush(self._queue, entry)
+            self._queued_cost += cost
+            self._client_requests[client] = self._client_requests.get(client, 0) + 1
+
+            enqueued = time.monotonic()
+            deadline = enqueued + self.slo_seconds
+            if self._running >= self.slots or self._queue[0] is not entry:
+                self._stats['queued'] += 1
+            try:
+                while self._running >= self.slots or self._queue[0] is not entry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject(503, self._estimated_wait(), 'Server is overloaded, please retry later',
+                                     'shed_after_waiting')
+                    self._cond.wait(remaining)
+            except BaseException:
+                # Whatever interrupted the wait (shedding, a timeout of the serving framework,
+                # shutdown), leave a tombstone so the entry never blocks the requests behind it
+                entry[3] = True
+                self._queued_cost -= cost
+                self._release_client(client)
+                self._drop_cancelled()
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._queue)
+            self._drop_cancelled()
+            self._queued_cost -= cost
+            self._running += 1
+            self._running_cost += cost
+            self._virtual_time = start_tag
+            self._stats['admitted'] += 1
+            self._total_wait += time.monotonic() - enqueued
+            # The next request in line may be able to start too
+            self._cond.notify_all()
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._running -= 1
+                self._running_cost -= cost
+                self._release_client(client)
+                self._stats['completed'] += 1
+                if cost > 0:
+                    self._correction += 0.2 * (elapsed / cost - self._correction)
+                self._cond.notify_all()
+
+    def _release_client(self, client):
+        count = self._client_requests[client] - 1
+        if count:
+            self._client_requests[client] = count
+        else:
+            del self._client_requests[client]
+            # Idle clients start again from the current virtual time
+            self._client_finish.pop(client, None)
+
+    def _drop_cancelled(self):
+        while self._queue and self._queue[0][3]:
+            heapq.heappop(self._queue)
+
+    def stats(self):
+        """Counters for /metrics"""
+        with self._cond:
+            admitted = self._stats['admitted']
+            return dict(self._stats,
+                        running=self._running,
+                        queue_depth=sum(1 for entry in self._queue if not entry[3]),
+                        estimated_wait_seconds=round(self._estimated_wait(), 3),
+                        mean_queue_wait_seconds=round(self._total_wait / admitted, 3) if admitted else 0.0,
+                        cost_correction=round(self._correction, 3),
+                        slots=self.slots,
+                        slo_seconds=self.slo_seconds)
@@ -3,35 +3,141 @@ Flask Web Application for Image Processing
 Allows users to upload images and apply various processing techniques
 """
 
-from flask import Flask, render_template, request, send_file, url_for
+from flask import Flask, render_template, request, send_file, url_for, jsonify, abort
 from werkzeug.utils import secure_filename
 from PIL import Image
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend for server
-import matplotlib.pyplot as plt
 import os
 import io
 import base64
+import uuid
 from datetime import datetime
 
 # Import helper functions from the 1 folder
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '1'))
-from helper_functions import compute_histogram, histogram_stretching, stretch_histogram
+from helper_functions import load_image, file_digest
+from buffer_pool import pooled_buffer, pool_stats
+import pixel_backends
+
+# Import color model conversions from the 3 folder
+sys.path.append(os.path.join(os.path.dirname(__file__), '3'))
+from color_models import convert_color_spaces
+import color_luts
+
+# Result figures are prebuilt templates drawn with the object-oriented API (no
+# pyplot global state), so requests can render concurrently in threaded workers
+from figure_templates import FigureTemplate, pooled_template, template_stats
+from result_store import create_result_store
+from single_flight import SingleFlight, DEFAULT_LOCK_DIR
+from admission import AdmissionController, Overloaded
+from request_profiler import RequestProfiler, DEFAULT_PROFILE_DIR
+from tuning_sessions import TuningSessionCache, DEFAULT_PARAMS, stretch_tables
+from tile_pyramid import build_pyramid, TILE_FORMATS
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['PROCESSED_FOLDER'] = 'static/processed'
+# Results live outside the static folder, so they are only served through /results
+# (which applies the retention) and never directly by the static file handler
+app.config['RESULT_FOLDER'] = os.environ.get('RESULT_FOLDER', 'results')
+# Where results are kept: 'disk' (RESULT_FOLDER, shared by all workers), 'memory'
+# (per worker process, for single-worker deployments) or 'object' (object store)
+app.config['RESULT_STORE'] = os.environ.get('RESULT_STORE', 'disk')
+app.config['RESULT_TTL'] = int(os.environ.get('RESULT_TTL', 24 * 3600))
+app.config['RESULT_MAX_BYTES'] = int(os.environ.get('RESULT_MAX_BYTES', 1024 * 1024 * 1024))
+# Coalescing of identical concurrent requests: lock/result directory (private to this
+# user; refused if another user owns it or can write to it) and maximum wait
+app.config['COALESCE_DIR'] = os.environ.get('COALESCE_DIR', DEFAULT_LOCK_DIR)
+app.config['COALESCE_TIMEOUT'] = float(os.environ.get('COALESCE_TIMEOUT', 60))
+# Admission control (per worker): concurrent processing slots, requests per client,
+# latency objective in seconds, and the number of reverse proxies in front of the app
+# (0: the client is the connection's address; behind a proxy that address is the proxy's,
+# so all clients would share one limit and fair queuing would have nothing to balance)
+app.config['ADMISSION_SLOTS'] = int(os.environ.get('ADMISSION_SLOTS', 2))
+app.config['ADMISSION_PER_CLIENT'] = int(os.environ.get('ADMISSION_PER_CLIENT', 4))
+app.config['ADMISSION_SLO'] = float(os.environ.get('ADMISSION_SLO', 15))
+app.config['ADMISSION_TRUST_PROXY'] = int(os.environ.get('ADMISSION_TRUST_PROXY', 0))
+# Per-request profiling: requests with X-Profile: <token> (or ?profile=<token>) run under
+# cProfile + tracemalloc when enabled; /debug/profiles needs the same token, and both stay
+# closed until a token is set
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '0') == '1'
+app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN', '')
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', DEFAULT_PROFILE_DIR)
+# Results up to this size are embedded in the result page as a data URI instead
+# of being stored and fetched with a second request (0 disables inline results)
+app.config['INLINE_RESULT_MAX_BYTES'] = int(os.environ.get('INLINE_RESULT_MAX_BYTES', 512 * 1024))
+# Interactive tuning of stretch results: shared directory the uploads are kept in (on the same
+# file system as UPLOAD_FOLDER, so keeping one is a rename) and its disk quota, and the
+# per-worker cache of histograms and previews (sessions, bytes, idle seconds)
+app.config['SESSION_FOLDER'] = os.environ.get('SESSION_FOLDER', 'sessions')
+app.config['SESSION_MAX_DISK_BYTES'] = int(os.environ.get('SESSION_MAX_DISK_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['SESSION_MAX_COUNT'] = int(os.environ.get('SESSION_MAX_COUNT', 32))
+app.config['SESSION_MAX_BYTES'] = int(os.environ.get('SESSION_MAX_BYTES', 512 * 1024 * 1024))
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 1800))
+# Stretch results of at least this many pixels are also written as a deep-zoom tile
+# pyramid and shown in a pan/zoom viewer (0 disables), with the tile size and format
+app.config['DEEP_ZOOM_MIN_PIXELS'] = int(os.environ.get('DEEP_ZOOM_MIN_PIXELS', 4000000))
+app.config['TILE_SIZE'] = int(os.environ.get('TILE_SIZE', 256))
+app.config['TILE_FORMAT'] = os.environ.get('TILE_FORMAT', 'jpeg')
 app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
+app.config['BACKEND_AUTOTUNE'] = os.environ.get('BACKEND_AUTOTUNE', '1') == '1'
+# Grid step of the 3D color lookup tables (0 = convert with the direct formulas)
+app.config['COLOR_LUT_STEP'] = int(os.environ.get('COLOR_LUT_STEP', '0'))
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+# Allowed file extensions (ppm/pgm/tif/tiff/npy are memory-mapped when uncompressed)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'ppm', 'pgm', 'tif', 'tiff', 'npy'}
 
 # Create necessary folders
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['PROCESSED_FOLDER'], exist_ok=True)
+os.makedirs(app.config['RESULT_FOLDER'], exist_ok=True)
+if os.path.commonpath([os.path.abspath(app.config['RESULT_FOLDER']), app.static_folder]) == app.static_folder:
+    raise ValueError('RESULT_FOLDER must not be inside the static folder')
+
+result_store = create_result_store(app.config['RESULT_STORE'], app.config['RESULT_FOLDER'],
+                                   app.config['RESULT_TTL'], app.config['RESULT_MAX_BYTES'])
+# A leader rejected by admission control does not fail its followers; they are admitted on their own
+single_flight = SingleFlight(app.config['COALESCE_DIR'], app.config['COALESCE_TIMEOUT'],
+                             retry_errors=(Overloaded,))
+admission = AdmissionController(app.config['ADMISSION_SLOTS'], app.config['ADMISSION_PER_CLIENT'],
+                                app.config['ADMISSION_SLO'])
+
+request_profiler = RequestProfiler(app.config['PROFILE_FOLDER'], app.config['PROFILING_ENABLED'],
+                                   app.config['PROFILING_TOKEN'])
+tuning_sessions = TuningSessionCache(app.config['SESSION_FOLDER'], app.config['SESSION_MAX_COUNT'],
+                                     app.config['SESSION_MAX_BYTES'], app.config['SESSION_TTL'],
+                                     app.config['SESSION_MAX_DISK_BYTES'])
+
+# Widths in pixels of the downscaled result variants offered to the browser through srcset
+# (the full render is about 1800-3000 px wide)
+RESULT_VARIANT_WIDTHS = {'preview': 640, 'standard': 1280}
+
+# Processing types whose results can be tuned interactively, with the mode their upload is decoded in
+TUNABLE_TYPES = {'grayscale_stretch': 'L', 'color_stretch': 'RGB'}
+
+# Seconds per megapixel to build a deep-zoom pyramid (stretch, tile, encode)
+DEEP_ZOOM_COST = 0.05
+
+# Seconds per megapixel to re-stretch and encode a tuning session's JPEG preview or full-resolution PNG
+TUNE_COSTS = {'preview': 0.02, 'full': 0.15}
+
+# Rough processing time per type: (fixed seconds for the figure, seconds per megapixel).
+# The admission controller corrects these against measured times.
+PROCESSING_COSTS = {
+    'rgb_channels': (1.0, 0.8),
+    'grayscale_stretch': (0.4, 0.5),
+    'color_stretch': (0.7, 0.6),
+    'color_spaces': (2.0, 2.5),
+}
+
+# Pick the fastest pixel backend per operation (cached on disk after the first run)
+if app.config['BACKEND_AUTOTUNE']:
+    pixel_backends.autotune()
+
+# Map the color lookup tables (built once, then shared by all workers through the page cache)
+if app.config['COLOR_LUT_STEP']:
+    for space in ('hsv', 'hsl', 'ycrcb'):
+        color_luts.load_color_lut(space, app.config['COLOR_LUT_STEP'])
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -41,197 +147,253 @@ def generate_unique_filename(original_filename):
     """Generate a unique filename with timestamp"""
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
     name, ext = os.path.splitext(secure_filename(original_filename))
-    return f"{name}_{timestamp}{ext}"
+    # The random suffix keeps names unique when threads handle requests in the same microsecond
+    return f"{name}_{timestamp}_{uuid.uuid4().hex[:8]}{ext}"
 
-def process_rgb_channels(img_path):
-    """Process: Display RGB channels separately"""
-    img = Image.open(img_path).convert('RGB')
-    img_array = np.array(img)
-    
-    # Split channels
-    r_channel = img_array[:, :, 0]
-    g_channel = img_array[:, :, 1]
-    b_channel = img_array[:, :, 2]
-    
-    # Create visualization
-    fig, axes = plt.subplots(2, 2, figsize=(12, 12))
-    
-    # Original image
-    axes[0, 0].imshow(img)
-    axes[0, 0].set_title('Original Image', fontsize=14, fontweight='bold')
-    axes[0, 0].axis('off')
-    
-    # Red channel
-    axes[0, 1].imshow(r_channel, cmap='Reds')
-    axes[0, 1].set_title('Red Channel', fontsize=14)
-    axes[0, 1].axis('off')
-    
-    # Green channel
-    axes[1, 0].imshow(g_channel, cmap='Greens')
-    axes[1, 0].set_title('Green Channel', fontsize=14)
-    axes[1, 0].axis('off')
-    
-    # Blue channel
-    axes[1, 1].imshow(b_channel, cmap='Blues')
-    axes[1, 1].set_title('Blue Channel', fontsize=14)
-    axes[1, 1].axis('off')
-    
-    plt.tight_layout()
-    
-    # Save to file
-    output_filename = generate_unique_filename('rgb_channels.png')
-    output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    
-    return output_filename
+def memory_metrics():
+    """Current and peak resident memory of this worker, plus buffer pool counters"""
+    metrics = {'pid': os.getpid(), 'buffer_pool': pool_stats(), 'figure_templates': template_stats()}
+    try:
+        import resource
+        # ru_maxrss is reported in kilobytes on Linux
+        metrics['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as statm:
+            metrics['rss_bytes'] = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    return metrics
 
-def process_grayscale_stretch(img_path):
-    """Process: Grayscale with histogram stretching"""
-    img = Image.open(img_path).convert('RGB')
-    
-    # Convert to grayscale
-    gray_img = img.convert('L')
-    gray_array = np.array(gray_img)
-    
-    # Apply histogram stretching
-    stretched_array = histogram_stretching(gray_array)
-    stretched_img = Image.fromarray(stretched_array, 'L')
-    
-    # Compute histograms
-    original_hist = compute_histogram(gray_array)
-    stretched_hist = compute_histogram(stretched_array)
-    
-    # Create visualization
-    fig, axes = plt.subplots(2, 3, figsize=(15, 10))
-    
-    # Original grayscale
-    axes[0, 0].imshow(gray_img, cmap='gray')
-    axes[0, 0].set_title('Original Grayscale', fontsize=14, fontweight='bold')
-    axes[0, 0].axis('off')
-    
-    # Original histogram
-    axes[0, 1].bar(range(256), original_hist, color='gray', width=1)
-    axes[0, 1].set_title('Original Histogram')
-    axes[0, 1].set_xlabel('Pixel Value')
-    axes[0, 1].set_ylabel('Frequency')
-    axes[0, 1].set_xlim([0, 255])
-    
-    # Original stats
-    axes[0, 2].text(0.5, 0.5, f'Min: {gray_array.min()}\nMax: {gray_array.max()}\nMean: {gray_array.mean():.1f}',
-                    ha='center', va='center', fontsize=16, transform=axes[0, 2].transAxes)
-    axes[0, 2].set_title('Original Stats')
-    axes[0, 2].axis('off')
-    
-    # Stretched grayscale
-    axes[1, 0].imshow(stretched_img, cmap='gray')
-    axes[1, 0].set_title('Histogram Stretched', fontsize=14, fontweight='bold')
-    axes[1, 0].axis('off')
-    
-    # Stretched histogram
-    axes[1, 1].bar(range(256), stretched_hist, color='darkblue', width=1)
-    axes[1, 1].set_title('Stretched Histogram')
-    axes[1, 1].set_xlabel('Pixel Value')
-    axes[1, 1].set_ylabel('Frequency')
-    axes[1, 1].set_xlim([0, 255])
-    
-    # Stretched stats
-    axes[1, 2].text(0.5, 0.5, f'Min: {stretched_array.min()}\nMax: {stretched_array.max()}\nMean: {stretched_array.mean():.1f}',
-                    ha='center', va='center', fontsize=16, transform=axes[1, 2].transAxes)
-    axes[1, 2].set_title('Stretched Stats')
-    axes[1, 2].axis('off')
-    
-    plt.tight_layout()
-    
-    # Save to file
-    output_filename = generate_unique_filename('grayscale_stretch.png')
-    output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    
-    return output_filename
+def estimate_cost(img_path, processing_type):
+    """Estimated processing seconds from the image dimensions (read from the header only)"""
+    base, per_megapixel = PROCESSING_COSTS[processing_type]
+    try:
+        if img_path.lower().endswith('.npy'):
+            height, width = np.load(img_path, mmap_mode='r').shape[:2]
+        else:
+            with Image.open(img_path) as img:
+                width, height = img.size
+    except (OSError, ValueError):
+        # Unreadable uploads fail quickly during processing
+        return base
+    pixels = width * height
+    if processing_type in TUNABLE_TYPES and wants_deep_zoom(pixels):
+        per_megapixel += DEEP_ZOOM_COST
+    return base + per_megapixel * pixels / 1e6
 
-def process_color_stretch(img_path):
-    """Process: Color histogram stretching (each channel separately)"""
-    img = Image.open(img_path).convert('RGB')
-    img_array = np.array(img)
-    
-    # Split and stretch each channel
-    r_channel = img_array[:, :, 0]
-    g_channel = img_array[:, :, 1]
-    b_channel = img_array[:, :, 2]
-    
-    r_stretched = histogram_stretching(r_channel)
-    g_stretched = histogram_stretching(g_channel)
-    b_stretched = histogram_stretching(b_channel)
-    
-    # Combine stretched channels
-    stretched_array = np.stack([r_stretched, g_stretched, b_stretched], axis=2)
-    stretched_img = Image.fromarray(stretched_array.astype(np.uint8))
-    
-    # Compute histograms
-    r_hist = compute_histogram(r_channel)
-    g_hist = compute_histogram(g_channel)
-    b_hist = compute_histogram(b_channel)
-    
-    r_hist_stretched = compute_histogram(r_stretched)
-    g_hist_stretched = compute_histogram(g_stretched)
-    b_hist_stretched = compute_histogram(b_stretched)
-    
-    # Create visualization
-    fig, axes = plt.subplots(2, 4, figsize=(20, 10))
-    
-    # Original image
-    axes[0, 0].imshow(img)
-    axes[0, 0].set_title('Original Image', fontsize=14, fontweight='bold')
-    axes[0, 0].axis('off')
-    
-    # Original histograms
-    axes[0, 1].bar(range(256), r_hist, color='red', alpha=0.6, width=1)
-    axes[0, 1].set_title('Red Channel (Original)')
-    axes[0, 1].set_xlabel('Pixel Value')
-    axes[0, 1].set_ylabel('Frequency')
-    
-    axes[0, 2].bar(range(256), g_hist, color='green', alpha=0.6, width=1)
-    axes[0, 2].set_title('Green Channel (Original)')
-    axes[0, 2].set_xlabel('Pixel Value')
-    axes[0, 2].set_ylabel('Frequency')
-    
-    axes[0, 3].bar(range(256), b_hist, color='blue', alpha=0.6, width=1)
-    axes[0, 3].set_title('Blue Channel (Original)')
-    axes[0, 3].set_xlabel('Pixel Value')
-    axes[0, 3].set_ylabel('Frequency')
-    
-    # Stretched image
-    axes[1, 0].imshow(stretched_img)
-    axes[1, 0].set_title('Histogram Stretched', fontsize=14, fontweight='bold')
-    axes[1, 0].axis('off')
-    
-    # Stretched histograms
-    axes[1, 1].bar(range(256), r_hist_stretched, color='red', alpha=0.6, width=1)
-    axes[1, 1].set_title('Red Channel (Stretched)')
-    axes[1, 1].set_xlabel('Pixel Value')
-    axes[1, 1].set_ylabel('Frequency')
+def client_id():
+    """Identifier used for per-client limits and fair queuing"""
+    proxies = app.config['ADMISSION_TRUST_PROXY']
+    if proxies and len(request.access_route) >= proxies:
+        # Each proxy appends the address it received the request from; entries further
+        # left come from the client itself and could be forged to dodge the limits
+        return request.access_route[-proxies]
+    return request.remote_addr or 'unknown'
+
+def load_upload(img_path, mode):
+    """Load an uploaded file as an array (memory-mapped for uncompressed formats)"""
+    img_array = load_image(img_path, mode=mode, as_array=True)
+    if img_array is None:
+        raise ValueError('Could not read image')
+    if img_array.dtype != np.uint8:
+        raise ValueError('Only 8-bit images are supported')
+    return img_array
+
+def parse_tune_params(values):
+    """
+    Stretch parameters from a form or query string
+
+    Raises:
+        ValueError: A parameter is malformed or out of range
+    """
+    params = {
+        'clip_low': float(values.get('clip_low', 0)),
+        'clip_high': float(values.get('clip_high', 0)),
+        'gamma': float(values.get('gamma', 1)),
+        'channels': values.get('channels', 'rgb'),
+    }
+    if not (0 <= params['clip_low'] < 50 and 0 <= params['clip_high'] < 50):
+        raise ValueError('Clip points must be between 0 and 50 percent')
+    if not 0.1 <= params['gamma'] <= 10:
+        raise ValueError('Gamma must be between 0.1 and 10')
+    if set(params['channels']) - set('rgb'):
+        raise ValueError('Channels must be a selection of r, g and b')
+    return params
+
+def stretch_upload(img_array, out, params=None):
+    """
+    Stretch a decoded upload into out with tuning parameters (None = regular stretching)
+    
+    Returns:
+        tuple: (stretched image, histograms of img_array, histograms of the stretched image)
+    """
+    if params is None or params == DEFAULT_PARAMS:
+        return pixel_backends.stretch_histogram(img_array, out=out)
+    hist = pixel_backends.histogram_extrema(img_array)[0]
+    table, _ = stretch_tables(hist, **params)
+    stretched = pixel_backends.apply_lut(img_array, table, out=out)
+    return stretched, hist, pixel_backends.lut_histograms(hist, table)
+
+def wants_deep_zoom(pixels):
+    """Whether a stretch result of this many pixels also gets a deep-zoom pyramid"""
+    return bool(app.config['DEEP_ZOOM_MIN_PIXELS']) and pixels >= app.config['DEEP_ZOOM_MIN_PIXELS']
+
+def build_deep_zoom(stretched):
+    """
+    Write a stretched image, as rendered in the result figure, as a tile pyramid into the result store
     
-    axes[1, 2].bar(range(256), g_hist_stretched, color='green', alpha=0.6, width=1)
-    axes[1, 2].set_title('Green Channel (Stretched)')
-    axes[1, 2].set_xlabel('Pixel Value')
-    axes[1, 2].set_ylabel('Frequency')
+    Returns:
+        dict: Pyramid description for the viewer, including its id
+    """
+    pyramid_id = os.path.splitext(generate_unique_filename('tiles'))[0]
+    extension = TILE_FORMATS[app.config['TILE_FORMAT']]
     
-    axes[1, 3].bar(range(256), b_hist_stretched, color='blue', alpha=0.6, width=1)
-    axes[1, 3].set_title('Blue Channel (Stretched)')
-    axes[1, 3].set_xlabel('Pixel Value')
-    axes[1, 3].set_ylabel('Frequency')
+    def put_tile(level, col, row, data):
+        result_store.put(f"{pyramid_id}_{level}_{col}_{row}.{extension}", data)
     
-    plt.tight_layout()
+    pyramid = build_pyramid(stretched, None, put_tile, app.config['TILE_SIZE'], app.config['TILE_FORMAT'])
+    return dict(pyramid, id=pyramid_id)
+
+def build_rgb_channels_template():
+    """Figure template: original image and its R, G, B channels"""
+    template = FigureTemplate(2, 2, (12, 12))
+    axes = template.axes
+    template.add_image('original', axes[0, 0], 'Original Image', rgb=True, bold=True)
+    template.add_image('red', axes[0, 1], 'Red Channel', cmap='Reds')
+    template.add_image('green', axes[1, 0], 'Green Channel', cmap='Greens')
+    template.add_image('blue', axes[1, 1], 'Blue Channel', cmap='Blues')
+    template.finish_layout()
+    return template
+
+def process_rgb_channels(img_path):
+    """Process: Display RGB channels separately"""
+    img_array = load_upload(img_path, 'RGB')
     
-    # Save to file
-    output_filename = generate_unique_filename('color_stretch.png')
-    output_path = os.path.join(app.config['PROCESSED_FOLDER'], output_filename)
-    plt.savefig(output_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    with pooled_template('rgb_channels', build_rgb_channels_template) as template:
+        template.set_image('original', img_array)
+        template.set_image('red', img_array[:, :, 0])
+        template.set_image('green', img_array[:, :, 1])
+        template.set_image('blue', img_array[:, :, 2])
+        png = template.render_png()
     
-    return output_filename
+    return png
+
+def build_grayscale_stretch_template():
+    """Figure template: grayscale image, histogram and stats before and after stretching"""
+    template = FigureTemplate(2, 3, (15, 10))
+    axes = template.axes
+    template.add_image('original', axes[0, 0], 'Original Grayscale', cmap='gray', bold=True)
+    template.add_histogram('original', axes[0, 1], 'Original Histogram', 'gray')
+    template.add_text('original', axes[0, 2], 'Original Stats')
+    template.add_image('stretched', axes[1, 0], 'Histogram Stretched', cmap='gray', bold=True)
+    template.add_histogram('stretched', axes[1, 1], 'Stretched Histogram', 'darkblue')
+    template.add_text('stretched', axes[1, 2], 'Stretched Stats')
+    template.finish_layout()
+    return template
+
+def process_grayscale_stretch(img_path, params=None, keep=None):
+    """
+    Process: Grayscale with histogram stretching
+    
+    params are tuning parameters (see parse_tune_params); keep, if given, is
+    called with the decoded image, its histograms and the stretched image
+    while they are still alive
+    """
+    # Load as grayscale
+    gray_array = load_upload(img_path, 'L')
+    
+    # Apply histogram stretching into a pooled output buffer; the histograms come
+    # with it, so neither image is scanned again to plot them
+    with pooled_buffer(gray_array.shape) as out:
+        stretched_array, hist, stretched_hist = stretch_upload(gray_array, out, params)
+        with pooled_template('grayscale_stretch', build_grayscale_stretch_template) as template:
+            for name, data, counts in (('original', gray_array, hist[0]),
+                                       ('stretched', stretched_array, stretched_hist[0])):
+                template.set_image(name, data)
+                template.set_histogram(name, counts)
+                template.set_text(name, f'Min: {data.min()}\nMax: {data.max()}\nMean: {data.mean():.1f}')
+            png = template.render_png()
+        if keep is not None:
+            keep(gray_array, hist, stretched_array)
+    
+    return png
+
+def build_color_stretch_template():
+    """Figure template: color image and per-channel histograms before and after stretching"""
+    template = FigureTemplate(2, 4, (20, 10))
+    axes = template.axes
+    for row, (name, label, title) in enumerate((('original', 'Original', 'Original Image'),
+                                                ('stretched', 'Stretched', 'Histogram Stretched'))):
+        template.add_image(name, axes[row, 0], title, rgb=True, bold=True)
+        for c, color in enumerate(('red', 'green', 'blue')):
+            template.add_histogram(f'{name}_{color}', axes[row, c + 1],
+                                   f'{color.title()} Channel ({label})', color, alpha=0.6)
+    template.finish_layout()
+    return template
+
+def process_color_stretch(img_path, params=None, keep=None):
+    """Process: Color histogram stretching (each channel separately); params and keep as for grayscale"""
+    img_array = load_upload(img_path, 'RGB')
+    
+    # Stretch all channels straight into a pooled output buffer, with the histograms
+    with pooled_buffer(img_array.shape) as out:
+        stretched_array, hist, stretched_hist = stretch_upload(img_array, out, params)
+        with pooled_template('color_stretch', build_color_stretch_template) as template:
+            for name, data, counts in (('original', img_array, hist),
+                                       ('stretched', stretched_array, stretched_hist)):
+                template.set_image(name, data)
+                for c, color in enumerate(('red', 'green', 'blue')):
+                    template.set_histogram(f'{name}_{color}', counts[c])
+            png = template.render_png()
+        if keep is not None:
+            keep(img_array, hist, stretched_array)
+    
+    return png
+
+# One row per color space: (key, name, plane names, display settings per plane)
+COLOR_SPACE_ROWS = [
+    ('hsv', 'HSV', ('Hue', 'Saturation', 'Value'),
+     [('hsv', 0, 360), ('gray', 0, 1), ('gray', 0, 1)]),
+    ('hsl', 'HSL', ('Hue', 'Saturation', 'Lightness'),
+     [('hsv', 0, 360), ('gray', 0, 1), ('gray', 0, 1)]),
+    ('ycrcb', 'YCrCb', ('Y (Luma)', 'Cr (Red-difference)', 'Cb (Blue-difference)'),
+     [('gray', 0, 255), ('RdYlGn_r', 0, 255), ('RdYlBu_r', 0, 255)]),
+]
+
+def build_color_spaces_template():
+    """Figure template: original image and three planes for each color space"""
+    template = FigureTemplate(3, 4, (20, 15))
+    for row, (key, space, names, settings) in enumerate(COLOR_SPACE_ROWS):
+        # Original image at the start of each row
+        template.add_image(f'{key}_original', template.axes[row, 0], f'Original ({space})',
+                           rgb=True, bold=True)
+        for c, (name, (cmap, vmin, vmax)) in enumerate(zip(names, settings)):
+            template.add_image(f'{key}_{c}', template.axes[row, c + 1], f'{space}: {name}',
+                               cmap=cmap, vmin=vmin, vmax=vmax)
+    template.finish_layout()
+    return template
+
+def process_color_spaces(img_path):
+    """Process: Decompose the image into HSV, HSL and YCrCb planes"""
+    img_array = load_upload(img_path, 'RGB')
+    
+    if app.config['COLOR_LUT_STEP']:
+        planes = {space: color_luts.convert_with_lut(img_array, space, app.config['COLOR_LUT_STEP'])
+                  for space in ('hsv', 'hsl', 'ycrcb')}
+    else:
+        # One pass shares the hue/min/max work between HSV and HSL
+        planes = convert_color_spaces(img_array, ('hsv', 'hsl', 'ycrcb'))
+    
+    with pooled_template('color_spaces', build_color_spaces_template) as template:
+        for key, _, _, _ in COLOR_SPACE_ROWS:
+            template.set_image(f'{key}_original', img_array)
+            for c in range(3):
+                template.set_image(f'{key}_{c}', planes[key][:, :, c])
+        png = template.render_png()
+    
+    return png
 
 @app.route('/')
 def index():
@@ -251,7 +413,12 @@ def process():
         return render_template('index.html', error='No file selected')
     
     if not allowed_file(file.filename):
-        return render_template('index.html', error='Invalid file type. Allowed: PNG, JPG, JPEG, GIF, BMP')
+        return render_template('index.html', error='Invalid file type. Allowed: PNG, JPG, JPEG, GIF, BMP, PPM, PGM, TIFF, NPY')
+    
+    try:
+        tune_params = parse_tune_params(request.form) if processing_type in TUNABLE_TYPES else None
+    except ValueError as e:
+        return render_template('index.html', error=str(e))
     
     try:
         # Save uploaded file
@@ -261,33 +428,224 @@ def process():
         
         # Process based on selected type
         if processing_type == 'rgb_channels':
-            result_filename = process_rgb_channels(filepath)
+            processor = process_rgb_channels
             description = 'RGB Color Channels Separation'
         elif processing_type == 'grayscale_stretch':
-            result_filename = process_grayscale_stretch(filepath)
+            processor = process_grayscale_stretch
             description = 'Grayscale with Histogram Stretching'
         elif processing_type == 'color_stretch':
-            result_filename = process_color_stretch(filepath)
+            processor = process_color_stretch
             description = 'Color Histogram Stretching'
+        elif processing_type == 'color_spaces':
+            processor = process_color_spaces
+            description = 'HSV / HSL / YCrCb Color Planes'
         else:
+            os.remove(filepath)
             return render_template('index.html', error='Invalid processing type')
         
-        # Clean up uploaded file
-        os.remove(filepath)
+        # Identical uploads processed concurrently (in any worker) with the same
+        # parameters share one computation, including its tuning session
+        coalesce_key = f"{file_digest(filepath)}_{processing_type}"
+        if tune_params is not None:
+            coalesce_key += '_' + '_'.join(str(tune_params[name]) for name in sorted(tune_params))
+        client, cost = client_id(), estimate_cost(filepath, processing_type)
+        
+        def run_admitted():
+            # Only the request that actually computes takes a processing slot
+            with admission.admit(client, cost):
+                if tune_params is None:
+                    return processor(filepath), {}
+                
+                kept = {}
+                
+                def keep(image, histograms, stretched):
+                    # Keep the upload so the result can be re-tuned without uploading it again
+                    # (the file moves into the session, so nothing extra is written)
+                    kept['session_id'] = tuning_sessions.create(filepath, image, histograms)
+                    if wants_deep_zoom(image.shape[0] * image.shape[1]):
+                        # Large scans can be inspected at full resolution without downloading them
+                        kept['pyramid'] = build_deep_zoom(stretched)
+                
+                png = processor(filepath, tune_params, keep)
+                return png, kept
+        
+        profile_id = None
+        try:
+            if request_profiler.authorized(request):
+                # Profiled requests always compute their own result
+                (png, kept), profile_id = request_profiler.profile(
+                    run_admitted, label=f'{processing_type} {filename}')
+            else:
+                png, kept = single_flight.do(coalesce_key, run_admitted)
+        finally:
+            # Clean up uploaded file, unless it was kept for a tuning session
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        
+        result_key = generate_unique_filename(f'{processing_type}.png')
+        result_data_uri = None
+        with Image.open(io.BytesIO(png)) as img:
+            result_width = img.width
+        if len(png) <= app.config['INLINE_RESULT_MAX_BYTES']:
+            # Small results go straight into the page: no store write, no second request
+            result_data_uri = 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+        else:
+            result_store.put(result_key, png)
         
         return render_template('result.html', 
-                             result_image=result_filename,
+                             result_image=result_key,
+                             result_data_uri=result_data_uri,
+                             result_width=result_width,
+                             variant_widths=RESULT_VARIANT_WIDTHS,
                              description=description,
-                             processing_type=processing_type)
-    
+                             processing_type=processing_type,
+                             profile_id=profile_id,
+                             session_id=kept.get('session_id'),
+                             tune_params=tune_params,
+                             pyramid=kept.get('pyramid'))
+    
+    except Overloaded as e:
+        return (render_template('index.html', error=e.reason), e.status,
+                {'Retry-After': str(e.retry_after)})
     except Exception as e:
         return render_template('index.html', error=f'Processing error: {str(e)}')
 
-@app.route('/download/<filename>')
-def download(filename):
+def result_variant(key, variant):
+    """
+    PNG bytes of a result at a given resolution, downscaled from the full
+    render on first request and then kept in the result store
+    
+    Returns None if the result expired or never existed.
+    """
+    if variant == 'full':
+        return result_store.get(key)
+    variant_key = f"{os.path.splitext(key)[0]}@{variant}.png"
+    data = result_store.get(variant_key)
+    if data is not None:
+        return data
+    
+    data = result_store.get(key)
+    if data is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        target_width = RESULT_VARIANT_WIDTHS[variant]
+        if width <= target_width:
+            return data
+        img = img.convert('RGB').resize((target_width, round(height * target_width / width)),
+                                        Image.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    data = buffer.getvalue()
+    result_store.put(variant_key, data)
+    return data
+
+def send_result(key, as_attachment, variant='full'):
+    """Send a stored result, or 404 if it expired or never existed"""
+    if variant not in RESULT_VARIANT_WIDTHS and variant != 'full':
+        abort(404)
+    data = result_variant(key, variant)
+    if data is None:
+        abort(404)
+    return send_file(io.BytesIO(data), mimetype='image/png', as_attachment=as_attachment,
+                     download_name=key, max_age=app.config['RESULT_TTL'])
+
+@app.route('/results/<key>')
+def result(key):
+    """Serve a processed image from the result store (?variant=preview|standard|full)"""
+    return send_result(key, as_attachment=False, variant=request.args.get('variant', 'full'))
+
+@app.route('/download/<key>')
+def download(key):
     """Download processed image"""
-    filepath = os.path.join(app.config['PROCESSED_FOLDER'], filename)
-    return send_file(filepath, as_attachment=True)
+    return send_result(key, as_attachment=True)
+
+@app.route('/tune/<session_id>')
+def tune(session_id):
+    """
+    Re-stretch a tuning session's image with new parameters
+    (clip_low, clip_high, gamma, channels): a JPEG preview, or the full
+    resolution PNG with ?size=full
+    """
+    session = tuning_sessions.get(session_id)
+    if session is None:
+        abort(404)
+    try:
+        params = parse_tune_params(request.args)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    
+    full = request.args.get('size') == 'full'
+    height, width = (session.shape if full else session.preview.shape)[:2]
+    buffer = io.BytesIO()
+    try:
+        # A full-resolution render is as heavy as /process, so tuning takes the same processing slots
+        with admission.admit(client_id(), TUNE_COSTS['full' if full else 'preview'] * width * height / 1e6):
+            try:
+                tuned, ranges = session.render(full=full, **params)
+            except OSError:
+                # The session's file was removed since it was looked up
+                abort(404)
+            if full:
+                Image.fromarray(tuned).save(buffer, format='PNG')
+            else:
+                # JPEG encodes an order of magnitude faster than PNG, which matters for live previews
+                Image.fromarray(tuned).save(buffer, format='JPEG', quality=90)
+    except Overloaded as e:
+        return jsonify(error=e.reason), e.status, {'Retry-After': str(e.retry_after)}
+    
+    if full:
+        response = send_file(io.BytesIO(buffer.getvalue()), mimetype='image/png', as_attachment=True,
+                             download_name='tuned.png')
+    else:
+        response = send_file(io.BytesIO(buffer.getvalue()), mimetype='image/jpeg')
+    # Input range mapped to 0-255 per channel, shown next to the controls
+    response.headers['X-Stretch-Range'] = ' '.join(f'{low}-{high}' for low, high in ranges)
+    return response
+
+@app.route('/tiles/<pyramid_id>/<int:level>/<int:col>_<int:row>.<extension>')
+def tile(pyramid_id, level, col, row, extension):
+    """One deep-zoom tile; tiles never change, so browsers and proxies may keep them"""
+    if extension not in TILE_FORMATS.values():
+        abort(404)
+    key = f"{pyramid_id}_{level}_{col}_{row}.{extension}"
+    data = result_store.get(key)
+    if data is None:
+        abort(404)
+    response = send_file(io.BytesIO(data), mimetype='image/png' if extension == 'png' else 'image/jpeg',
+                         etag=key, max_age=app.config['RESULT_TTL'])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Per-worker memory metrics"""
+    return jsonify(memory=memory_metrics(), result_store=result_store.stats(),
+                   coalescing=single_flight.stats(), admission=admission.stats(),
+                   tuning_sessions=tuning_sessions.stats())
+
+@app.route('/debug/profiles')
+def debug_profiles():
+    """Recent request profiles (needs the profiling token)"""
+    if not request_profiler.authorized(request):
+        abort(404)
+    return jsonify(profiles=request_profiler.list_profiles())
+
+@app.route('/debug/profiles/<profile_id>')
+def debug_profile(profile_id):
+    """One profile's summary as JSON, or its pstats dump for <id>.prof"""
+    if not request_profiler.authorized(request):
+        abort(404)
+    if profile_id.endswith('.prof'):
+        path = request_profiler.stats_path(profile_id[:-len('.prof')])
+        if path is None:
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True)
+    summary = request_profiler.load_summary(profile_id)
+    if summary is None:
+        abort(404)
+    return jsonify(summary)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,175 @@
+"""Per-process pool of prebuilt result figures that are updated in place for each request"""
+
+import io
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+# Maximum number of idle templates kept for each processing type
+MAX_TEMPLATES_PER_KIND = 4
+
+# Upper bound on the total bytes held by idle templates, mostly their renderers' pixel
+# buffers (13-27 MB each at 150 dpi): room for two idle templates of each processing type
+MAX_POOL_BYTES = 160 * 1024 * 1024
+
+# Histogram bin edges shared by all histogram artists
+HISTOGRAM_EDGES = np.arange(257)
+
+_lock = threading.Lock()
+_free_templates = {}
+_stats = {'hits': 0, 'misses': 0, 'dropped': 0}
+
+
+class FigureTemplate:
+    """
+    A figure whose axes, titles and artists are created once
+
+    Requests only swap the data of the image, histogram and text artists, and
+    the layout is computed once by finish_layout() instead of on every render.
+    """
+
+    def __init__(self, rows, cols, figsize):
+        self.figure = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.subplots(rows, cols)
+        self.images = {}
+        self.placeholders = {}
+        self.histograms = {}
+        self.texts = {}
+
+    def add_image(self, name, ax, title, cmap=None, vmin=None, vmax=None, rgb=False, bold=False):
+        """Add an image artist; images without vmin/vmax are rescaled to each new image's range"""
+        placeholder = np.zeros((2, 2, 3) if rgb else (2, 2), dtype=np.uint8)
+        image = ax.imshow(placeholder, cmap=cmap, vmin=vmin, vmax=vmax)
+        ax.set_title(title, fontsize=14, fontweight='bold' if bold else 'normal')
+        ax.axis('off')
+        self.images[name] = (image, vmin is None and vmax is None and not rgb)
+        self.placeholders[name] = placeholder
+
+    def add_histogram(self, name, ax, title, color, alpha=1.0):
+        """Add a filled step artist covering the 256 histogram bins"""
+        self.histograms[name] = ax.stairs(np.zeros(256), HISTOGRAM_EDGES, fill=True,
+                                          color=color, alpha=alpha)
+        ax.set_title(title)
+        ax.set_xlabel('Pixel Value')
+        ax.set_ylabel('Frequency')
+        ax.set_xlim(0, 256)
+
+    def add_text(self, name, ax, title):
+        """Add a centered text block (e.g. image statistics)"""
+        self.texts[name] = ax.text(0.5, 0.5, '', ha='center', va='center', fontsize=16,
+                                   transform=ax.transAxes)
+        ax.set_title(title)
+        ax.axis('off')
+
+    def finish_layout(self):
+        """Compute the subplot layout once, after all artists have been added"""
+        self.figure.tight_layout()
+
+    def set_image(self, name, data):
+        image, autoscale = self.images[name]
+        height, width = data.shape[:2]
+        image.set_data(data)
+        image.set_extent((-0.5, width - 0.5, height - 0.5, -0.5))
+        image.axes.set_xlim(-0.5, width - 0.5)
+        image.axes.set_ylim(height - 0.5, -0.5)
+        if autoscale:
+            image.norm.vmin, image.norm.vmax = data.min(), data.max()
+
+    def set_histogram(self, name, hist):
+        self.histograms[name].set_data(hist)
+        self.histograms[name].axes.set_ylim(0, max(float(np.max(hist)), 1.0) * 1.05)
+
+    def set_text(self, name, text):
+        self.texts[name].set_text(text)
+
+    def render_png(self, dpi=150):
+        """Render the current state to PNG bytes"""
+        buffer = io.BytesIO()
+        self.figure.savefig(buffer, format='png', dpi=dpi)
+        return buffer.getvalue()
+
+    def reset(self):
+        """
+        Drop the request's data before the template goes back to the pool
+
+        set_data() keeps a reference to each image, so without this an idle
+        template would hold the last request's full-resolution images. The
+        canvas and its renderer are kept: the next render at the same size
+        reuses the renderer's pixel buffer instead of allocating a new one.
+        """
+        for name, (image, _) in self.images.items():
+            image.set_data(self.placeholders[name])
+        for histogram in self.histograms.values():
+            histogram.set_data(np.zeros(256))
+        for text in self.texts.values():
+            text.set_text('')
+
+    @property
+    def nbytes(self):
+        """Bytes of image data and rendered pixels currently held"""
+        total = sum(image.get_array().nbytes for image, _ in self.images.values())
+        renderer = getattr(self.figure.canvas, 'renderer', None)
+        if renderer is not None:
+            total += int(renderer.width * renderer.height * 4)
+        return total
+
+
+def acquire_template(kind, build):
+    """
+    Get an idle template for a processing type, building one if none is free
+
+    Args:
+        kind: Processing type name
+        build: Function returning a new FigureTemplate for this type
+
+    Returns:
+        FigureTemplate: Template owned by the caller until release_template()
+    """
+    with _lock:
+        templates = _free_templates.get(kind)
+        if templates:
+            _stats['hits'] += 1
+            return templates.pop()
+        _stats['misses'] += 1
+    return build()
+
+
+def _pool_bytes():
+    """Total bytes held by the idle templates"""
+    return sum(template.nbytes for templates in _free_templates.values() for template in templates)
+
+
+def release_template(kind, template):
+    """
+    Return a template to the pool, emptied of the request's data (dropped if
+    the pool for this type is full or the pool would exceed MAX_POOL_BYTES)
+    """
+    template.reset()
+    with _lock:
+        templates = _free_templates.setdefault(kind, [])
+        if len(templates) < MAX_TEMPLATES_PER_KIND and _pool_bytes() + template.nbytes <= MAX_POOL_BYTES:
+            templates.append(template)
+        else:
+            _stats['dropped'] += 1
+
+
+@contextmanager
+def pooled_template(kind, build):
+    """Context manager that acquires a template and always releases it"""
+    template = acquire_template(kind, build)
+    try:
+        yield template
+    finally:
+        release_template(kind, template)
+
+
+def template_stats():
+    """Pool counters and the number of idle templates per processing type"""
+    with _lock:
+        return dict(_stats, idle={kind: len(templates) for kind, templates in _free_templates.items()},
+                    idle_bytes=_pool_bytes())
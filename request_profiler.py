@@ -0,0 +1,189 @@
+"""
+Opt-in profiling of individual requests
+
+When enabled in the config, a request carrying the profiling token (in the
+X-Profile header or the ?profile= query parameter) runs under cProfile and
+tracemalloc. The pstats dump and a JSON summary (hottest functions,
+allocation sites, peak traced memory) are written to a directory shared by
+all workers and listed by the /debug/profiles endpoints.
+
+Only one request per process is profiled at a time (tracemalloc is process
+wide); a profiling request arriving meanwhile simply runs unprofiled. The
+memory figures still cover the whole process: with a threaded server they
+include what other requests allocated during the profiled one, which the
+summary says along with the number of threads that were running.
+
+Profiling is refused entirely while no token is configured.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), 'image_processing_profiles')
+
+# Frames kept per allocation traceback
+TRACEMALLOC_FRAMES = 5
+
+_PROFILE_ID = re.compile(r'^[0-9A-Za-z_-]+$')
+
+MEMORY_SCOPE_NOTE = ('Memory figures are process wide (tracemalloc): they include allocations made by '
+                     'other threads while this request ran, so they are exact only when it ran alone.')
+
+
+class RequestProfiler:
+    """
+    Runs selected requests under cProfile and tracemalloc and stores the results
+
+    Args:
+        directory: Where profiles are stored
+        enabled: Master switch; when False no request is ever profiled
+        token: Secret the header/query value must match (no request is authorized while it is empty)
+        keep: Number of most recent profiles kept
+        top: Functions and allocation sites listed in each summary
+    """
+
+    def __init__(self, directory=DEFAULT_PROFILE_DIR, enabled=False, token='', keep=50, top=30):
+        self.directory = directory
+        self.enabled = enabled
+        self.token = token
+        self.keep = keep
+        self.top = top
+        self._lock = threading.Lock()
+        if enabled:
+            os.makedirs(directory, exist_ok=True)
+
+    def authorized(self, req):
+        """Whether a Flask request carries a valid profiling token"""
+        if not self.enabled or not self.token:
+            return False
+        value = req.headers.get('X-Profile') or req.args.get('profile') or ''
+        if not value:
+            return False
+        return hmac.compare_digest(value.encode('utf-8'), self.token.encode('utf-8'))
+
+    def profile(self, func, label=''):
+        """
+        Call func() under the profilers
+
+        Returns:
+            tuple: (func's result, profile id or None if another profile was running)
+        """
+        if not self._lock.acquire(blocking=False):
+            return func(), None
+        try:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            profiler = cProfile.Profile()
+            threads = threading.active_count()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                result = func()
+            finally:
+                profiler.disable()
+                seconds = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                threads = max(threads, threading.active_count())
+            profile_id = self._save(profiler, snapshot, peak, seconds, label, threads)
+        finally:
+            self._lock.release()
+        return result, profile_id
+
+    def _save(self, profiler, snapshot, peak, seconds, label, threads):
+        profile_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        base = os.path.join(self.directory, profile_id)
+        profiler.dump_stats(base + '.prof')
+
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        stats.sort_stats('cumulative').print_stats(self.top)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:self.top]
+
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        allocations = snapshot.statistics('lineno')[:self.top]
+
+        summary = {
+            'id': profile_id,
+            'label': label,
+            'created': time.time(),
+            'seconds': round(seconds, 4),
+            'peak_traced_bytes': peak,
+            # cProfile only sees the request's thread, tracemalloc sees all of them
+            'threads': threads,
+            'memory_note': MEMORY_SCOPE_NOTE,
+            'functions': [
+                {'function': f"{os.path.basename(filename)}:{line}({name})",
+                 'calls': calls, 'total_seconds': round(total, 6), 'cumulative_seconds': round(cumulative, 6)}
+                for (filename, line, name), (_, calls, total, cumulative, _) in functions
+            ],
+            # Memory still held at the end of the request, by allocation site
+            'allocations': [
+                {'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'bytes': stat.size, 'count': stat.count}
+                for stat in allocations
+            ],
+            'report': f"{MEMORY_SCOPE_NOTE}\nThreads running: {threads}\n\n{text.getvalue()}",
+        }
+        tmp_path = f"{base}.json.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(summary, f, indent=1)
+        os.replace(tmp_path, base + '.json')
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        """Delete all but the most recent `keep` profiles"""
+        summaries = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.json')),
+                           key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in summaries[self.keep:]:
+            for path in (entry.path, entry.path[:-len('.json')] + '.prof'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self):
+        """Summaries of the stored profiles (without the text report), newest first"""
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            summary = self.load_summary(entry.name[:-len('.json')])
+            if summary:
+                profiles.append({key: summary[key] for key in ('id', 'label', 'created', 'seconds',
+                                                               'peak_traced_bytes')})
+        return sorted(profiles, key=lambda summary: summary['created'], reverse=True)
+
+    def load_summary(self, profile_id):
+        """Full summary of one profile, or None"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def stats_path(self, profile_id):
+        """Path of a profile's pstats dump (for snakeviz, pstats, ...), or None"""
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + '.prof')
+        return path if os.path.exists(path) else None
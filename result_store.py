@@ -0,0 +1,333 @@
+"""
+Pluggable storage for rendered results
+
+Backends:
+    memory  In-process LRU byte cache with a TTL and a size cap (only shared by
+            the threads of one worker, so use a single worker process with it)
+    disk    Files in a directory shared by all workers; a background janitor
+            deletes results past their retention and enforces a disk quota
+    object  Any object store client with put/get/delete/list (LocalObjectStore
+            is a directory-backed stand-in for a bucket); the same janitor
+            enforces retention and a quota on the objects under the prefix
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultStore:
+    """Interface shared by all result store backends"""
+
+    def put(self, key, data):
+        """Store the bytes of a result under key"""
+        raise NotImplementedError
+
+    def get(self, key):
+        """Bytes stored under key, or None if missing or expired"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove a result (missing keys are ignored)"""
+        raise NotImplementedError
+
+    def sweep(self):
+        """Drop expired results and enforce the size limit; returns the number removed"""
+        return 0
+
+    def stats(self):
+        """Counters for /metrics"""
+        return {}
+
+    def _start_janitor(self, interval):
+        """Run sweep() every interval seconds in a daemon thread"""
+        janitor = threading.Thread(target=self._janitor, args=(interval,), daemon=True)
+        janitor.start()
+
+    def _janitor(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sweep()
+            except OSError:
+                pass
+
+
+def _valid_key(key):
+    """Keys become file and object names, so reject anything that could escape the store"""
+    if not key or '/' in key or '\\' in key or key.startswith('.'):
+        raise KeyError(key)
+    return key
+
+
+class MemoryResultStore(ResultStore):
+    """In-process result cache with a TTL and a byte size cap (least recently used evicted first)"""
+
+    def __init__(self, ttl=3600, max_bytes=256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0, 'expired': 0}
+
+    def _remove(self, key):
+        _, data = self._items.pop(key)
+        self._bytes -= len(data)
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            raise ValueError('Result is larger than the result store size cap')
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            self._items[_valid_key(key)] = (time.time() + self.ttl, data)
+            self._bytes += len(data)
+            self._sweep_locked()
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._items)))
+                self._stats['evicted'] += 1
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    self._remove(key)
+                    self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self._stats['hits'] += 1
+            return item[1]
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+
+    def _sweep_locked(self):
+        now = time.time()
+        expired = [key for key, (expires_at, _) in self._items.items() if expires_at < now]
+        for key in expired:
+            self._remove(key)
+        self._stats['expired'] += len(expired)
+        return len(expired)
+
+    def sweep(self):
+        with self._lock:
+            return self._sweep_locked()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, backend='memory', items=len(self._items), bytes=self._bytes)
+
+
+class DiskResultStore(ResultStore):
+    """
+    Results as files in a directory, with a janitor thread enforcing retention and a quota
+
+    Every worker process runs its own janitor; they only ever delete files, so
+    running several at once is harmless.
+    """
+
+    def __init__(self, directory, ttl=24 * 3600, max_bytes=1024 * 1024 * 1024,
+                 janitor_interval=60.0):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._stats = {'expired': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if janitor_interval:
+            self._start_janitor(janitor_interval)
+
+    def path(self, key):
+        """File path of a stored result"""
+        return os.path.join(self.directory, _valid_key(key))
+
+    def put(self, key, data):
+        path = self.path(key)
+        # Write under a temporary name so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        try:
+            path = self.path(key)
+            if os.path.getmtime(path) + self.ttl < time.time():
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except (KeyError, OSError):
+            return None
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except (KeyError, OSError):
+            pass
+
+    def _files(self):
+        """(mtime, size, path) of every stored result, oldest first"""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(files)
+
+    def sweep(self):
+        removed = 0
+        cutoff = time.time() - self.ttl
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            expired = mtime < cutoff
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            with self._lock:
+                self._stats['expired' if expired else 'evicted'] += 1
+        return removed
+
+    def stats(self):
+        files = self._files()
+        with self._lock:
+            return dict(self._stats, backend='disk', items=len(files),
+                        bytes=sum(size for _, size, _ in files))
+
+
+class LocalObjectStore:
+    """
+    Directory-backed stand-in for an object store bucket
+
+    Real clients (S3, GCS, ...) are adapted to the same four methods.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name.replace('/', '__'))
+
+    def put_object(self, name, data):
+        tmp_path = f"{self._path(name)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(name))
+
+    def get_object(self, name):
+        """(data, last modified timestamp), or None if there is no such object"""
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read(), os.fstat(f.fileno()).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def delete_object(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def list_objects(self, prefix=''):
+        """(name, size, last modified timestamp) of the objects whose name starts with prefix"""
+        objects = []
+        for entry in os.scandir(self.directory):
+            name = entry.name.replace('__', '/')
+            if entry.is_file() and not name.endswith('.tmp') and name.startswith(prefix):
+                stat = entry.stat()
+                objects.append((name, stat.st_size, stat.st_mtime))
+        return objects
+
+
+class ObjectResultStore(ResultStore):
+    """
+    Results as objects in an object store, with a janitor thread enforcing retention and a quota
+
+    Expiry is also checked on read, so an expired result is never served
+    between sweeps. As with the disk store, every worker may run a janitor.
+    """
+
+    def __init__(self, client, prefix='results/', ttl=24 * 3600, max_bytes=1024 * 1024 * 1024,
+                 janitor_interval=60.0):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._stats = {'expired': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+        if janitor_interval:
+            self._start_janitor(janitor_interval)
+
+    def put(self, key, data):
+        self.client.put_object(self.prefix + _valid_key(key), data)
+
+    def get(self, key):
+        try:
+            found = self.client.get_object(self.prefix + _valid_key(key))
+        except KeyError:
+            return None
+        if found is None or found[1] + self.ttl < time.time():
+            return None
+        return found[0]
+
+    def delete(self, key):
+        self.client.delete_object(self.prefix + _valid_key(key))
+
+    def sweep(self):
+        removed = 0
+        cutoff = time.time() - self.ttl
+        objects = sorted(self.client.list_objects(self.prefix), key=lambda item: item[2])
+        total = sum(size for _, size, _ in objects)
+        for name, size, modified in objects:
+            expired = modified < cutoff
+            if not expired and total <= self.max_bytes:
+                break
+            self.client.delete_object(name)
+            total -= size
+            removed += 1
+            with self._lock:
+                self._stats['expired' if expired else 'evicted'] += 1
+        return removed
+
+    def stats(self):
+        objects = self.client.list_objects(self.prefix)
+        with self._lock:
+            return dict(self._stats, backend='object', items=len(objects),
+                        bytes=sum(size for _, size, _ in objects))
+
+
+def create_result_store(backend='disk', directory='results', ttl=24 * 3600,
+                        max_bytes=1024 * 1024 * 1024, janitor_interval=60.0):
+    """
+    Build the configured result store
+
+    Args:
+        backend: 'memory', 'disk' or 'object'
+        directory: Result directory (disk) or bucket directory of the local object store stand-in
+        ttl: Seconds a result is kept
+        max_bytes: Size cap (memory) or storage quota (disk, object)
+        janitor_interval: Seconds between janitor sweeps of the disk and object backends (0 disables them)
+    """
+    if backend == 'memory':
+        return MemoryResultStore(ttl, max_bytes)
+    if backend == 'disk':
+        return DiskResultStore(directory, ttl, max_bytes, janitor_interval)
+    if backend == 'object':
+        return ObjectResultStore(LocalObjectStore(directory), ttl=ttl, max_bytes=max_bytes,
+                                 janitor_interval=janitor_interval)
+    raise ValueError(f"Unknown result store backend '{backend}'")
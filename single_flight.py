@@ -0,0 +1,219 @@
+"""
+Single-flight coalescing of identical in-flight computations
+
+Requests with the same key (e.g. upload content hash + processing type) that
+arrive while the first one is still computing wait for its result instead
+of computing it again:
+
+    within a worker    followers wait on the leader thread's event
+    across workers     leaders serialize on a per-key lock file; the first
+                       writes its result next to the lock (the bytes, plus
+                       a JSON file for the accompanying dict), and the
+                       others read it after taking the lock
+
+Waiting is bounded by a timeout, after which a request computes the result
+itself, so a stuck or crashed leader never blocks anyone for long. Errors that
+only concern the leader's own request (retry_errors, e.g. a rejected
+admission) are not shared either: the followers then compute for themselves.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl only requests within the same worker process are coalesced
+    fcntl = None
+
+
+DEFAULT_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'image_processing_inflight')
+
+# Lock files untouched for this long are removed by the cleanup pass
+STALE_LOCK_SECONDS = 600
+
+
+def _private_directory(path):
+    """
+    Create a directory only this user can access, refusing an existing one
+    that another user owns or can write to (it holds results other workers
+    read back)
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"Coalescing directory '{path}' must be a directory owned by this user "
+                              f"and not writable by others")
+
+
+class _Call:
+    """A computation in progress in this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time, sharing its result
+
+    Args:
+        lock_dir: Directory for the cross-process lock and result files
+                  (None coalesces within this process only)
+        timeout: Seconds a request waits for another one's result before
+                 computing it itself
+        share_seconds: How long a finished result stays readable by requests
+                       from other workers that were waiting on the lock
+        retry_errors: Exception types raised by a leader after which its
+                      followers compute the result themselves instead of
+                      failing with the same error
+    """
+
+    def __init__(self, lock_dir=DEFAULT_LOCK_DIR, timeout=60.0, share_seconds=10.0, retry_errors=()):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.timeout = timeout
+        self.share_seconds = share_seconds
+        self.retry_errors = tuple(retry_errors)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'followers': 0, 'shared_across_workers': 0, 'timeouts': 0,
+                       'retried': 0}
+        if self.lock_dir:
+            _private_directory(self.lock_dir)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def do(self, key, compute):
+        """
+        Return compute()'s result, computing it at most once across concurrent callers
+
+        Args:
+            key: Identifier of the computation; must be usable as a file name
+            compute: Function without arguments returning bytes, or a tuple of
+                     bytes and a JSON-serializable dict
+
+        Returns:
+            The result (possibly computed by another request)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._stats['leaders' if leader else 'followers'] += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                self._count('timeouts')
+                return compute()
+            if isinstance(call.error, self.retry_errors):
+                # The leader's request was turned away; this one gets its own chance
+                self._count('retried')
+                return compute()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_across_workers(key, compute)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _acquire(self, lock_file):
+        """Take the exclusive lock, polling until the timeout; returns whether it was acquired"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.05)
+
+    def _read_recent(self, base):
+        """Result written within share_seconds, else None"""
+        try:
+            with open(base + '.result', 'rb') as f:
+                if time.time() - os.fstat(f.fileno()).st_mtime > self.share_seconds:
+                    return None
+                data = f.read()
+            with open(base + '.json') as f:
+                sidecar = json.load(f)
+            if sidecar['sha256'] != hashlib.sha256(data).hexdigest():
+                # Left over from an interrupted write
+                return None
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+        return data if sidecar['extras'] is None else (data, sidecar['extras'])
+
+    @staticmethod
+    def _write(base, result):
+        """Write a result for other workers; the JSON file names the digest of its bytes"""
+        data, extras = (result, None) if isinstance(result, bytes) else result
+        tmp_base = f"{base}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_base + '.json.tmp', 'w') as f:
+            json.dump({'extras': extras, 'sha256': hashlib.sha256(data).hexdigest()}, f)
+        os.replace(tmp_base + '.json.tmp', base + '.json')
+        with open(tmp_base + '.result.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(tmp_base + '.result.tmp', base + '.result')
+
+    def _cleanup(self):
+        """Remove old result files and stale lock files"""
+        now = time.time()
+        for entry in os.scandir(self.lock_dir):
+            try:
+                age = now - entry.stat().st_mtime
+                if (entry.name.endswith(('.result', '.json')) and age > self.share_seconds) or \
+                        (entry.name.endswith('.lock') and age > STALE_LOCK_SECONDS):
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _do_across_workers(self, key, compute):
+        if not self.lock_dir:
+            return compute()
+
+        self._cleanup()
+        base = os.path.join(self.lock_dir, key)
+        with open(base + '.lock', 'a') as lock_file:
+            acquired = self._acquire(lock_file)
+            try:
+                if acquired:
+                    os.utime(lock_file.fileno())
+                    # Another worker may have finished this computation while we waited
+                    shared = self._read_recent(base)
+                    if shared is not None:
+                        self._count('shared_across_workers')
+                        return shared
+                else:
+                    self._count('timeouts')
+
+                result = compute()
+                if acquired:
+                    self._write(base, result)
+                return result
+            finally:
+                if acquired:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """Counters for /metrics"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+class Interrupted(BaseException):
+    pass
+
+
+def test_interrupted_wait_does_not_block_the_queue():
+    controller = AdmissionController(slots=1, slo_seconds=5.0)
+    wait = controller._cond.wait
+    interrupted = []
+
+    def interrupt_once(timeout=None):
+        if not interrupted:
+            interrupted.append(True)
+            raise Interrupted
+        return wait(timeout)
+
+    controller._cond.wait = interrupt_once
+    with controller.admit('a', 0.1):
+        with pytest.raises(Interrupted):
+            with controller.admit('b', 0.1):
+                pass
+
+    # The interrupted request left the queue; the next one is admitted at once
+    admitted = threading.Event()
+
+    def next_request():
+        with controller.admit('c', 0.1):
+            admitted.set()
+
+    thread = threading.Thread(target=next_request)
+    thread.start()
+    assert admitted.wait(1.0)
+    thread.join()
+    assert controller.stats()['queue_depth'] == 0
+
+
+def test_client_limit_rejects_with_429():
+    controller = AdmissionController(slots=4, per_client_limit=1)
+    with controller.admit('a', 0.1):
+        with pytest.raises(Overloaded) as rejected:
+            with controller.admit('a', 0.1):
+                pass
+        assert rejected.value.status == 429
+
+
+@pytest.mark.parametrize('proxies', [1, 2])
+def test_clients_behind_a_proxy_get_separate_limits(app_module, monkeypatch, proxies):
+    monkeypatch.setitem(app_module.app.config, 'ADMISSION_TRUST_PROXY', proxies)
+    controller = AdmissionController(slots=4, per_client_limit=1)
+    # The client could put anything in front of what the proxies append
+    forwarded = ['203.0.113.7, 198.51.100.1', '203.0.113.7, 198.51.100.2']
+    if proxies == 2:
+        forwarded = [value + ', 10.0.0.1' for value in forwarded]
+
+    clients = []
+    for value in forwarded:
+        with app_module.app.test_request_context(headers={'X-Forwarded-For': value},
+                                                 environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+            clients.append(app_module.client_id())
+    assert clients == ['198.51.100.1', '198.51.100.2']
+
+    with controller.admit(clients[0], 0.1), controller.admit(clients[1], 0.1):
+        assert controller.stats()['running'] == 2
+
+
+def test_without_a_trusted_proxy_the_connection_address_is_the_client(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'ADMISSION_TRUST_PROXY', 0)
+    with app_module.app.test_request_context(headers={'X-Forwarded-For': '198.51.100.1'},
+                                             environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+        assert app_module.client_id() == '10.0.0.2'
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from batch_stretch import run_batch
+
+
+def _save(path, seed, mode='RGB'):
+    pixels = np.random.default_rng(seed).integers(40, 200, (24, 32, 3), dtype=np.uint8)
+    Image.fromarray(pixels).convert(mode).save(path)
+
+
+def test_inputs_never_overwrite_each_others_outputs(tmp_path):
+    first, second, output = tmp_path / 'first', tmp_path / 'second', tmp_path / 'out'
+    first.mkdir()
+    second.mkdir()
+    _save(first / 'a.png', 0)
+    _save(first / 'a.tif', 1)
+    _save(second / 'a.png', 2)
+
+    summary = run_batch([str(first), str(second)], str(output), workers=1, verbose=False, histograms=True)
+    assert summary['files'] == 3 and summary['failed'] == 0
+    assert sorted(os.listdir(output)) == ['a_png_2_hist.json', 'a_png_2_stretched.png',
+                                          'a_png_hist.json', 'a_png_stretched.png',
+                                          'a_tif_hist.json', 'a_tif_stretched.tif']
+
+
+def test_color_output_of_a_pgm_input_is_a_ppm(tmp_path):
+    _save(tmp_path / 'scan.pgm', 0, mode='L')
+    output = tmp_path / 'out'
+
+    summary = run_batch([str(tmp_path / 'scan.pgm')], str(output), mode='color', workers=1, verbose=False)
+    assert summary['failed'] == 0
+    with Image.open(output / 'scan_pgm_stretched.ppm') as img:
+        assert img.mode == 'RGB'
@@ -0,0 +1,23 @@
+import io
+import warnings
+
+import pytest
+
+from color_models import read_rgb_chunks
+
+
+def _read(data, chunk_colors=2):
+    return [chunk.tolist() for chunk in read_rgb_chunks(io.BytesIO(data), chunk_colors=chunk_colors)]
+
+
+def test_csv_chunks_skip_the_header_without_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        chunks = _read(b"r,g,b\n1,2,3\n4 5 6\n7,8,9")
+    assert sum(chunks, []) == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+
+@pytest.mark.parametrize('data', [b"1,2,3\n4,5\n", b"1,2\n3,4,5,6\n", b"1,2,3\n4,5,6.5\n", b"1,2,256\n"])
+def test_malformed_rows_raise(data):
+    with pytest.raises(ValueError):
+        _read(data, chunk_colors=100)
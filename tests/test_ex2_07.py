@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip('cv2')
+ex2_07 = pytest.importorskip('ex2_07')
+
+
+RANGES = [((0, 256), 256), ((5.5, 130.3), 37), ((5.5, 130.3), 64), ((0.1, 255.9), 256),
+          ((-3.4, 300.1), 51), ((68.9, 318.2), 240), ((10.2, 10.9), 3)]
+
+
+@pytest.mark.parametrize('value_range,bins', RANGES)
+def test_histogram_matches_calchist_for_non_integer_ranges(value_range, bins):
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, (120, 160), dtype=np.uint8)
+    floats = (rng.random((120, 160)) * 320 - 20).astype(np.float32)
+    for img in (gray, floats):
+        expected = cv2.calcHist([img], [0], None, [bins], list(value_range)).ravel()
+        np.testing.assert_array_equal(ex2_07.compute_histogram(img, bins=bins, value_range=value_range),
+                                      expected)
+
+
+@pytest.mark.parametrize('value_range,bins', RANGES)
+def test_joint_histogram_matches_calchist_for_non_integer_ranges(value_range, bins):
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (80, 90, 3), dtype=np.uint8)
+    ranges = (value_range, (12.7, 200.2))
+    expected = cv2.calcHist([img], [0, 2], None, [bins, 9], [*value_range, 12.7, 200.2])
+    np.testing.assert_array_equal(
+        ex2_07.compute_joint_histogram(img, channels=(0, 2), bins=(bins, 9), ranges=ranges), expected)
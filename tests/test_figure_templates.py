@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from figure_templates import FigureTemplate, acquire_template, release_template
+
+
+def _build():
+    template = FigureTemplate(1, 2, (4, 2))
+    template.add_image('image', template.axes[0], 'Image')
+    template.add_histogram('hist', template.axes[1], 'Histogram', 'gray')
+    template.finish_layout()
+    return template
+
+
+def test_canvas_and_renderer_survive_a_reset():
+    template = acquire_template('test', _build)
+    image = np.random.default_rng(0).integers(0, 256, (400, 600), dtype=np.uint8)
+    template.set_image('image', image)
+    template.set_histogram('hist', np.bincount(image.ravel(), minlength=256))
+    first = template.render_png()
+    canvas, renderer = template.figure.canvas, template.figure.canvas.renderer
+    release_template('test', template)
+
+    # The request's image is dropped, the rendering machinery is not
+    reused = acquire_template('test', _build)
+    assert reused is template
+    assert reused.images['image'][0].get_array().shape == (2, 2)
+    assert reused.figure.canvas is canvas and canvas.renderer is renderer
+
+    reused.set_image('image', image)
+    reused.set_histogram('hist', np.bincount(image.ravel(), minlength=256))
+    assert reused.render_png() == first
+    assert reused.figure.canvas is canvas and canvas.renderer is renderer
+    release_template('test', reused)
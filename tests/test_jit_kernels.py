@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('numba')
+
+import jit_kernels
+from color_models import convert_color_spaces
+
+if not jit_kernels.JIT_AVAILABLE:
+    pytest.skip('JIT kernels disabled with JIT_KERNELS=0', allow_module_level=True)
+
+
+@pytest.fixture
+def image():
+    # Odd width, so the kernels' unrolled loops also run their remainder
+    return np.random.default_rng(0).integers(0, 256, (37, 53, 3), dtype=np.uint8)
+
+
+def test_channel_histograms_match_bincount(image):
+    # Also a strided (non-contiguous) view, as pixel_backends passes for single channels
+    for img in (image, image[::2, ::3], jit_kernels.planes(image[:, :, 1])):
+        expected = [np.bincount(img[:, :, c].ravel(), minlength=256) for c in range(img.shape[2])]
+        np.testing.assert_array_equal(jit_kernels.channel_histograms(img), expected)
+
+
+@pytest.mark.parametrize('channels', [1, 2, 3])
+def test_apply_tables_matches_indexing(image, channels):
+    img = np.ascontiguousarray(image[:, :, :channels])
+    tables = np.random.default_rng(1).integers(0, 256, (channels, 256), dtype=np.uint8)
+    out = np.empty_like(img)
+    jit_kernels.apply_tables(img, tables, out)
+    np.testing.assert_array_equal(out, np.stack([tables[c][img[:, :, c]] for c in range(channels)], axis=2))
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (17, 31), (240, 320)])
+def test_gradient_matches_numpy(shape):
+    np.testing.assert_array_equal(jit_kernels.gradient_image(*shape, jit=True),
+                                  jit_kernels.gradient_image(*shape, jit=False))
+
+
+def test_color_spaces_are_bit_identical_to_numpy():
+    # Every gray level and a spread of colors, including the hue branch boundaries
+    rng = np.random.default_rng(2)
+    gray = np.repeat(np.arange(256, dtype=np.uint8)[:, np.newaxis], 3, axis=1)
+    rgb = np.concatenate([gray, rng.integers(0, 256, (20000, 3), dtype=np.uint8)]).reshape(-1, 16, 3)
+    for spaces in (('hsv', 'hsl', 'ycrcb'), ('hsl',), ('ycrcb',)):
+        compiled = convert_color_spaces(rgb, spaces, jit=True)
+        reference = convert_color_spaces(rgb, spaces, jit=False)
+        for space in spaces:
+            assert np.array_equal(compiled[space], reference[space]), space
+
+
+def test_benchmark_outputs_are_identical():
+    results = jit_kernels.benchmark(shape=(64, 96), repeats=1)
+    assert results and all(entry['identical'] for entry in results.values())
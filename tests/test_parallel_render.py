@@ -0,0 +1,35 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip('flask')
+pytest.importorskip('matplotlib')
+
+
+@pytest.fixture(scope='module')
+def uploads(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('uploads')
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, shape in enumerate(((120, 160, 3), (90, 200, 3), (150, 110, 3))):
+        path = str(folder / f'image{i}.png')
+        Image.fromarray(rng.integers(30, 220, shape, dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_parallel_renders_match_serial(app_module, uploads):
+    processors = [app_module.process_rgb_channels, app_module.process_grayscale_stretch,
+                  app_module.process_color_stretch, app_module.process_color_spaces]
+    jobs = [(processor, path) for processor in processors for path in uploads]
+    serial = [processor(path) for processor, path in jobs]
+
+    # Every job several times over, interleaved, so threads share pooled templates and buffers
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [(i, pool.submit(processor, path))
+                   for _ in range(3) for i, (processor, path) in enumerate(jobs)]
+        for i, future in futures:
+            assert future.result() == serial[i]
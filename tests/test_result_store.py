@@ -0,0 +1,21 @@
+import os
+import time
+
+from result_store import LocalObjectStore, ObjectResultStore
+
+
+def test_object_store_enforces_retention_and_quota(tmp_path):
+    bucket = LocalObjectStore(str(tmp_path / 'bucket'))
+    store = ObjectResultStore(bucket, ttl=3600, max_bytes=250, janitor_interval=0)
+    now = time.time()
+    for i, age in enumerate((7200, 300, 200, 100)):
+        key = f'tile_{i}.png'
+        store.put(key, bytes(100))
+        os.utime(bucket._path(store.prefix + key), (now - age, now - age))
+    bucket.put_object('other/kept.png', bytes(1000))
+
+    # tile_0 expired; tile_1 is the oldest of the rest and goes to fit the quota
+    assert store.sweep() == 2
+    assert [store.get(f'tile_{i}.png') is not None for i in range(4)] == [False, False, True, True]
+    assert store.stats()['expired'] == 1 and store.stats()['evicted'] == 1
+    assert bucket.get_object('other/kept.png') is not None
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+
+from admission import Overloaded
+from single_flight import SingleFlight
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def _run_coalesced(flight, key, leader_compute, follower_compute, followers=3):
+    """Start a leader blocked in leader_compute, join followers to it, then let the leader finish"""
+    release = threading.Event()
+    results = {}
+
+    def call(name, compute):
+        try:
+            results[name] = flight.do(key, compute)
+        except Exception as e:
+            results[name] = e
+
+    def blocked_leader():
+        release.wait(5)
+        return leader_compute()
+
+    threads = [threading.Thread(target=call, args=('leader', blocked_leader))]
+    threads[0].start()
+    _wait_for(lambda: flight.stats()['in_flight'] == 1)
+    for i in range(followers):
+        threads.append(threading.Thread(target=call, args=(f'follower{i}', follower_compute)))
+        threads[-1].start()
+    _wait_for(lambda: flight.stats()['followers'] == followers)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight(lock_dir=None)
+    results = _run_coalesced(flight, 'key', lambda: b'result', lambda: b'not used')
+    assert set(results.values()) == {b'result'}
+
+
+def test_followers_recompute_when_the_leader_is_not_admitted():
+    flight = SingleFlight(lock_dir=None, retry_errors=(Overloaded,))
+
+    def rejected():
+        raise Overloaded(503, 1, 'Server is overloaded, please retry later')
+
+    results = _run_coalesced(flight, 'key', rejected, lambda: b'own result')
+    assert isinstance(results.pop('leader'), Overloaded)
+    assert set(results.values()) == {b'own result'}
+    assert flight.stats()['retried'] == 3
+
+
+def test_other_leader_errors_are_shared():
+    flight = SingleFlight(lock_dir=None, retry_errors=(Overloaded,))
+
+    def broken():
+        raise ValueError('Could not read image')
+
+    results = _run_coalesced(flight, 'key', broken, lambda: b'recomputed')
+    assert len(results) == 4
+    assert all(isinstance(result, ValueError) for result in results.values())
+
+
+def test_results_are_shared_across_workers_without_pickle(tmp_path):
+    lock_dir = str(tmp_path / 'inflight')
+    first, second = SingleFlight(lock_dir), SingleFlight(lock_dir)
+    result = (b'\x89PNG...', {'session_id': 'abc', 'pyramid': {'levels': 3}})
+    assert first.do('digest_color_stretch', lambda: result) == result
+    assert second.do('digest_color_stretch', lambda: (b'not used', {})) == result
+    assert second.stats()['shared_across_workers'] == 1
+    assert sorted(os.listdir(lock_dir)) == ['digest_color_stretch.json', 'digest_color_stretch.lock',
+                                            'digest_color_stretch.result']
+
+
+def test_tampered_results_are_not_shared(tmp_path):
+    lock_dir = str(tmp_path / 'inflight')
+    SingleFlight(lock_dir).do('key', lambda: (b'result', {}))
+    with open(os.path.join(lock_dir, 'key.result'), 'wb') as f:
+        f.write(b'planted')
+    assert SingleFlight(lock_dir).do('key', lambda: (b'recomputed', {})) == (b'recomputed', {})
+
+
+def test_directory_writable_by_others_is_refused(tmp_path):
+    lock_dir = tmp_path / 'inflight'
+    lock_dir.mkdir()
+    lock_dir.chmod(0o777)
+    with pytest.raises(PermissionError):
+        SingleFlight(str(lock_dir))
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+import pixel_backends
+from tuning_sessions import TuningSessionCache
+
+
+def _upload(tmp_path, shape=(1200, 1600, 3)):
+    image = np.random.default_rng(0).integers(30, 220, shape, dtype=np.uint8)
+    path = str(tmp_path / 'upload.png')
+    Image.fromarray(image).save(path)
+    return path, image
+
+
+def test_session_keeps_the_upload_file_and_only_small_arrays(tmp_path):
+    path, image = _upload(tmp_path)
+    size = os.path.getsize(path)
+    cache = TuningSessionCache(str(tmp_path / 'sessions'))
+    session_id = cache.create(path, image)
+
+    # The upload was moved, not re-encoded or copied
+    assert not os.path.exists(path)
+    assert [os.path.getsize(entry.path) for entry in os.scandir(cache.directory)] == [size]
+    session = cache.get(session_id)
+    assert cache.stats()['bytes'] == session.nbytes < image.nbytes
+
+    tuned, _ = session.render(full=True, gamma=2.0)
+    table, _ = session.lut(gamma=2.0)
+    np.testing.assert_array_equal(tuned, pixel_backends.apply_lut(image, table))
+
+
+def test_other_workers_load_the_session_from_the_shared_directory(tmp_path):
+    path, image = _upload(tmp_path, (120, 160))
+    directory = str(tmp_path / 'sessions')
+    session_id = TuningSessionCache(directory).create(path, image)
+
+    other = TuningSessionCache(directory)
+    session = other.get(session_id)
+    assert session.shape == image.shape and other.stats()['loaded'] == 1
+    np.testing.assert_array_equal(session.load(), image)
+
+
+def test_session_whose_file_was_swept_is_gone(tmp_path):
+    path, image = _upload(tmp_path)
+    cache = TuningSessionCache(str(tmp_path / 'sessions'))
+    session_id = cache.create(path, image)
+    for entry in os.scandir(cache.directory):
+        os.remove(entry.path)
+    assert cache.get(session_id) is None
+    assert cache.stats()['sessions'] == 0
@@ -0,0 +1,46 @@
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+import batch_stretch
+import watch_folder
+
+
+def crash_once(input_path, base, mode, histograms=False):
+    """process_file whose worker dies the first time it sees a file"""
+    marker = base + '.crashed'
+    if not os.path.exists(marker):
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, 'w').close()
+        os._exit(1)
+    return batch_stretch.process_file(input_path, base, mode, histograms)
+
+
+def test_file_is_retried_after_its_worker_crashes(tmp_path, monkeypatch, capsys):
+    watch_dir, output_dir = tmp_path / 'incoming', tmp_path / 'processed'
+    watch_dir.mkdir()
+    pixels = np.random.default_rng(0).integers(40, 200, (32, 48, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(watch_dir / 'frame.png')
+
+    passes = []
+
+    def sleep(seconds):
+        manifest_path = output_dir / watch_folder.MANIFEST_NAME
+        passes.append(json.loads(manifest_path.read_text()) if manifest_path.exists() else {})
+        if len(passes) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch_folder, 'process_file', crash_once)
+    monkeypatch.setattr(time, 'sleep', sleep)
+    watch_folder.watch(str(watch_dir), str(output_dir), workers=1, interval=0, settle_seconds=0)
+
+    # The crash is not recorded against the file...
+    assert passes[0] == {}
+    assert 'RETRY frame.png: BrokenProcessPool' in capsys.readouterr().err
+    # ...which is processed by a fresh pool on the next poll
+    entry = passes[1]['frame.png']
+    assert entry['error'] is None
+    assert all(os.path.exists(path) for path in entry['outputs'])
@@ -0,0 +1,108 @@
+"""
+Deep-zoom tile pyramids of large results
+
+The image is processed top to bottom in bands one tile high, the same way the
+pixel backends work in row blocks. Each band is mapped through the stretch
+table, cut into tiles, and halved into the band of the next coarser level,
+which emits its own tiles as soon as it has a full tile row. Only about one
+tile row per level is held in memory, so pyramids of memory-mapped scans can
+be built without materializing the stretched image.
+
+Levels follow the Deep Zoom convention: the full resolution is the highest
+level, every level below halves the size (rounding up), and level 0 is 1x1.
+"""
+
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+import pixel_backends
+
+
+TILE_FORMATS = {'jpeg': 'jpg', 'png': 'png'}
+
+
+def pyramid_levels(width, height):
+    """Number of levels of a pyramid for an image of this size"""
+    return math.ceil(math.log2(max(width, height, 1))) + 1
+
+
+def _halve(rows):
+    """2x2 box downsampling of an even number of rows (the last column is repeated for odd widths)"""
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    total = rows[0::2, 0::2].astype(np.uint16)
+    total += rows[0::2, 1::2]
+    total += rows[1::2, 0::2]
+    total += rows[1::2, 1::2]
+    return ((total + 2) >> 2).astype(np.uint8)
+
+
+class _Level:
+    """Rows of one level waiting for a full tile row, or for their pair to be halved"""
+
+    def __init__(self):
+        self.pending = None
+        self.carry = None
+        self.tile_row = 0
+
+
+def _concat(head, rows):
+    return rows if head is None or not len(head) else np.concatenate([head, rows])
+
+
+def build_pyramid(image, lut, put_tile, tile_size=256, tile_format='jpeg', quality=90):
+    """
+    Write an image, mapped through a lookup table, as a tile pyramid
+
+    Args:
+        image: uint8 array (H, W) or (H, W, C), possibly memory-mapped
+        lut: Table for pixel_backends.apply_lut, or None to tile the image as is
+        put_tile: Function (level, column, row, data) storing one encoded tile
+        tile_size: Tile width and height in pixels
+        tile_format: 'jpeg' or 'png'
+        quality: JPEG quality
+
+    Returns:
+        dict: Pyramid description (width, height, tile_size, levels, format)
+    """
+    height, width = image.shape[:2]
+    top = pyramid_levels(width, height) - 1
+    levels = [_Level() for _ in range(top + 1)]
+    save_args = {'format': 'JPEG', 'quality': quality} if tile_format == 'jpeg' else {'format': 'PNG'}
+
+    def write_strip(level, strip):
+        for col, x in enumerate(range(0, strip.shape[1], tile_size)):
+            buffer = io.BytesIO()
+            Image.fromarray(np.ascontiguousarray(strip[:, x:x + tile_size])).save(buffer, **save_args)
+            put_tile(level, col, levels[level].tile_row, buffer.getvalue())
+        levels[level].tile_row += 1
+
+    def push(level, rows, last):
+        state = levels[level]
+        pending = _concat(state.pending, rows)
+        while len(pending) >= tile_size or (last and len(pending)):
+            write_strip(level, pending[:tile_size])
+            pending = pending[tile_size:]
+        state.pending = pending
+        if level == 0:
+            return
+
+        source = _concat(state.carry, rows)
+        if last and len(source) % 2:
+            source = np.concatenate([source, source[-1:]])
+        even = len(source) // 2 * 2
+        state.carry = source[even:]
+        if even or last:
+            push(level - 1, _halve(source[:even]), last)
+
+    for start in range(0, height, tile_size):
+        band = image[start:start + tile_size]
+        if lut is not None:
+            band = pixel_backends.apply_lut(band, lut)
+        push(top, np.asarray(band), start + tile_size >= height)
+
+    return {'width': width, 'height': height, 'tile_size': tile_size, 'levels': top + 1,
+            'format': TILE_FORMATS[tile_format]}
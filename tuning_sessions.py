@@ -0,0 +1,338 @@
+"""
+Upload-once sessions for interactive contrast tuning
+
+A processed upload can be kept as a tuning session: the uploaded file is
+moved (not copied or re-encoded) into a shared directory, and its per-channel
+histograms plus a downscaled preview are cached in memory. New stretch
+parameters (clip points, gamma, channels) then only need a new 256-entry
+lookup table computed from the cached histograms, applied to the preview -
+no upload, decode or figure rendering. The full-resolution image is decoded
+from the file again only when a full-resolution result is requested.
+
+The in-memory cache is per worker process and bounded by session count and
+bytes (least recently used evicted first). A worker that misses a session
+another worker created decodes it from the shared directory and rebuilds the
+histograms and preview once. Sessions unused for ttl seconds are deleted,
+and the least recently used files go first when the directory would exceed
+its disk quota.
+"""
+
+import glob
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+import pixel_backends
+from helper_functions import load_image
+
+
+DEFAULT_SESSION_DIR = os.path.join(tempfile.gettempdir(), 'image_processing_sessions')
+
+# Longest side of the preview that tuning requests are applied to
+PREVIEW_MAX_SIZE = 1024
+
+# Channel letters accepted in the channel selection
+CHANNEL_NAMES = 'rgb'
+
+# Parameters that reproduce the regular histogram stretching
+DEFAULT_PARAMS = {'clip_low': 0.0, 'clip_high': 0.0, 'gamma': 1.0, 'channels': CHANNEL_NAMES}
+
+_SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def tone_lut(hist, clip_low=0.0, clip_high=0.0, gamma=1.0):
+    """
+    Stretch table for one channel with clipped tails and a gamma curve
+
+    The darkest clip_low percent of the pixels map to 0 and the brightest
+    clip_high percent to 255; values in between are stretched linearly and
+    then gamma corrected. With no clipping and gamma 1 the table equals
+    helper_functions.stretch_lut (the regular histogram stretching).
+
+    Args:
+        hist: 256-bin histogram of the channel
+        clip_low: Percent of pixels clipped to black
+        clip_high: Percent of pixels clipped to white
+        gamma: Gamma (> 1 brightens the mid-tones)
+
+    Returns:
+        tuple: (uint8 table, low input value, high input value)
+    """
+    cdf = np.cumsum(hist)
+    total = cdf[-1]
+    low = int(np.searchsorted(cdf, total * clip_low / 100.0, side='right'))
+    high = int(np.searchsorted(cdf, total * (1.0 - clip_high / 100.0), side='left'))
+    low, high = min(low, 255), min(high, 255)
+    if high <= low:
+        return np.arange(256, dtype=np.uint8), low, high
+
+    values = np.arange(256, dtype=np.float64)
+    lut = np.clip((values - low) * 255.0 / (high - low), 0, 255)
+    if gamma != 1.0:
+        lut = 255.0 * (lut / 255.0) ** (1.0 / gamma)
+    return lut.astype(np.uint8), low, high
+
+
+def stretch_tables(histograms, clip_low=0.0, clip_high=0.0, gamma=1.0, channels=CHANNEL_NAMES):
+    """
+    Lookup table for a set of parameters; channels left out of the selection
+    keep their values
+
+    Args:
+        histograms: (C, 256) histograms of the image
+
+    Returns:
+        tuple: (uint8 table (256,) or (256, C), list of (low, high) per channel)
+    """
+    count = len(histograms)
+    tables, ranges = [], []
+    for c in range(count):
+        if count == 1 or CHANNEL_NAMES[c] in channels:
+            table, low, high = tone_lut(histograms[c], clip_low, clip_high, gamma)
+        else:
+            table, low, high = np.arange(256, dtype=np.uint8), 0, 255
+        tables.append(table)
+        ranges.append((low, high))
+    return (tables[0] if count == 1 else np.stack(tables, axis=1)), ranges
+
+
+def _decode(path, mode):
+    image = load_image(path, mode=mode, as_array=True)
+    if image is None:
+        raise OSError(f"Could not read '{path}'")
+    return image
+
+
+class TuningSession:
+    """
+    An upload kept on disk, with its cached histograms and preview
+
+    Args:
+        path: The uploaded file
+        mode: Mode the upload is decoded in ('L' or 'RGB')
+        image: The decoded upload; only its shape is kept
+        histograms: Its (C, 256) histograms, if already computed
+    """
+
+    def __init__(self, path, mode, image, histograms=None):
+        self.path = path
+        self.mode = mode
+        self.shape = image.shape
+        if histograms is None:
+            histograms = pixel_backends.histogram_extrema(image)[0]
+        self.histograms = histograms
+        preview = Image.fromarray(np.asarray(image))
+        preview.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE))
+        self.preview = np.asarray(preview)
+
+    @property
+    def channels(self):
+        return 1 if len(self.shape) == 2 else self.shape[2]
+
+    @property
+    def nbytes(self):
+        """Memory held by the session (the full-resolution image is not kept)"""
+        return self.preview.nbytes + self.histograms.nbytes
+
+    def load(self):
+        """Decode the full-resolution image (memory-mapped for uncompressed files)"""
+        return _decode(self.path, self.mode)
+
+    def lut(self, **params):
+        """stretch_tables for this session's histograms"""
+        return stretch_tables(self.histograms, **params)
+
+    def render(self, full=False, **params):
+        """
+        Apply a set of parameters to the preview (or the full image)
+
+        Returns:
+            tuple: (uint8 array, list of (low, high) per channel)
+        """
+        table, ranges = self.lut(**params)
+        return pixel_backends.apply_lut(self.load() if full else self.preview, table), ranges
+
+
+class TuningSessionCache:
+    """
+    Tuning sessions of one worker, backed by a directory shared by all workers
+
+    Args:
+        directory: Where the uploaded files are kept
+        max_sessions: Sessions kept in memory
+        max_bytes: Memory budget of the cached sessions (images, previews, histograms)
+        ttl: Seconds a session survives without being used
+        max_disk_bytes: Quota of the shared directory (all workers together)
+    """
+
+    def __init__(self, directory=DEFAULT_SESSION_DIR, max_sessions=32, max_bytes=512 * 1024 * 1024,
+                 ttl=1800, max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'hits': 0, 'loaded': 0, 'misses': 0, 'evicted': 0, 'expired': 0,
+                       'over_quota': 0, 'too_large': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _find(self, session_id):
+        """Path and decode mode of a session's file, or None"""
+        paths = glob.glob(os.path.join(self.directory, session_id + '.*'))
+        if not paths:
+            return None
+        return paths[0], os.path.basename(paths[0]).split('.')[1]
+
+    def create(self, upload_path, image, histograms=None):
+        """
+        Start a session from a processed upload
+
+        The file is moved into the session directory, so the caller must not
+        use or remove upload_path afterwards.
+
+        Args:
+            upload_path: The uploaded file
+            image: The upload as decoded for processing (uint8 (H, W) or (H, W, 3))
+            histograms: Its (C, 256) histograms, if the caller already has them
+
+        Returns:
+            str: Session id, or None if the file alone exceeds the disk quota
+            (upload_path is then left in place)
+        """
+        size = os.path.getsize(upload_path)
+        if size > self.max_disk_bytes:
+            with self._lock:
+                self._stats['too_large'] += 1
+            return None
+        self.sweep(reserve=size)
+        session_id = uuid.uuid4().hex
+        mode = 'L' if image.ndim == 2 else 'RGB'
+        path = os.path.join(self.directory, f"{session_id}.{mode}{os.path.splitext(upload_path)[1].lower()}")
+        # A rename when both are on the same file system, which is the common case
+        shutil.move(upload_path, path)
+        self._insert(session_id, TuningSession(path, mode, image, histograms))
+        with self._lock:
+            self._stats['created'] += 1
+        return session_id
+
+    def _insert(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = (time.time(), session)
+            self._bytes += session.nbytes
+            while self._sessions and (len(self._sessions) > self.max_sessions or
+                                      self._bytes > self.max_bytes):
+                _, (_, evicted) = self._sessions.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self._stats['evicted'] += 1
+
+    def get(self, session_id):
+        """The session, or None if it expired or never existed"""
+        if not _SESSION_ID.match(session_id):
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._sessions.get(session_id)
+            if item is not None:
+                self._sessions[session_id] = (now, item[1])
+                self._sessions.move_to_end(session_id)
+                self._stats['hits'] += 1
+        if item is not None:
+            if self._touch(item[1].path):
+                return item[1]
+            # Another worker's sweep deleted the file
+            self._forget(session_id)
+            return None
+
+        # Created by another worker, or evicted from this one
+        found = self._find(session_id)
+        try:
+            if found is None:
+                raise FileNotFoundError(session_id)
+            path, mode = found
+            if now - os.stat(path).st_mtime > self.ttl:
+                return None
+            session = TuningSession(path, mode, _decode(path, mode))
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats['misses'] += 1
+            return None
+        self._touch(path)
+        self._insert(session_id, session)
+        with self._lock:
+            self._stats['loaded'] += 1
+        return session
+
+    @staticmethod
+    def _touch(path):
+        """Record use on the shared file so other workers' sweeps keep it; returns whether it exists"""
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _forget(self, session_id):
+        with self._lock:
+            item = self._sessions.pop(session_id, None)
+            if item is not None:
+                self._bytes -= item[1].nbytes
+
+    def sweep(self, reserve=0):
+        """
+        Forget sessions unused for ttl seconds, then delete the least recently
+        used files until the directory plus reserve bytes fits the disk quota
+
+        Returns:
+            int: Number of files removed
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (used, _) in self._sessions.items() if now - used > self.ttl]
+            for key in expired:
+                _, session = self._sessions.pop(key)
+                self._bytes -= session.nbytes
+            self._stats['expired'] += len(expired)
+        removed = 0
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(entry.path)
+                    removed += 1
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry))
+            except FileNotFoundError:
+                pass
+
+        used = sum(size for _, size, _ in files) + reserve
+        for _, size, entry in sorted(files, key=lambda item: item[0]):
+            if used <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            used -= size
+            self._forget(entry.name.split('.')[0])
+            with self._lock:
+                self._stats['over_quota'] += 1
+        return removed
+
+    def stats(self):
+        """Counters for /metrics"""
+        with self._lock:
+            return dict(self._stats, sessions=len(self._sessions), bytes=self._bytes,
+                        max_disk_bytes=self.max_disk_bytes)